@@ -3,15 +3,24 @@ Admin Routes for Experiment Platform
 
 This module provides the routes and functionality for the admin interface.
 Administrators can create experiments, generate keys, and view results.
+Everything is read and written through the app's storage backend, so the
+admin interface works the same with PostgreSQL and SQLite.
 """
 
+import io
+import csv
 import logging
 import json
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import (
+    Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, session,
+    stream_with_context
+)
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from auth.key_manager import create_keys_for_experiment, get_keys_for_experiment, revoke_key
+from app.admin.stats import get_dashboard_stats, get_admin_user, invalidate_dashboard_stats
+from app.storage import get_storage
+from app.db.cursor import query_log
+from app.metrics import render_metrics
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -19,6 +28,15 @@ logger = logging.getLogger(__name__)
 # Define blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Number of keys shown per page on the experiment details page
+KEYS_PAGE_SIZE = 100
+
+# Default number of queries shown on the query statistics page
+TOP_QUERIES = 20
+
+# Orderings offered on the query statistics page
+QUERY_ORDERINGS = ('total_time', 'mean_time', 'max_time', 'calls')
+
 # Middleware to check for admin authentication
 @admin_bp.before_request
 def check_admin_auth():
@@ -43,24 +61,17 @@ def login():
             flash('Please provide both username and password', 'error')
             return render_template('admin/login.html')
         
-        from app import get_db_connection
-        conn = get_db_connection()
         try:
-            cur = conn.cursor()
-            cur.execute('SELECT id, password_hash, role FROM users WHERE username = %s', (username,))
-            user = cur.fetchone()
+            storage = get_storage()
+            user = storage.find_user(username=username)
             
-            if user and check_password_hash(user[1], password):
+            if user and check_password_hash(user['password_hash'], password):
                 # Store user ID and role in session
-                session['admin_id'] = user[0]
-                session['admin_role'] = user[2]
+                session['admin_id'] = user['id']
+                session['admin_role'] = user['role']
                 
                 # Update last login time
-                cur.execute(
-                    'UPDATE users SET last_login = %s WHERE id = %s',
-                    (datetime.now(), user[0])
-                )
-                conn.commit()
+                storage.record_login(user['id'])
                 
                 return redirect(url_for('admin.dashboard'))
             else:
@@ -70,8 +81,6 @@ def login():
             logger.error(f"Error during login: {e}")
             flash('An error occurred during login', 'error')
             return render_template('admin/login.html')
-        finally:
-            conn.close()
     
     return render_template('admin/login.html')
 
@@ -87,40 +96,22 @@ def logout():
 @admin_bp.route('/')
 def dashboard():
     """Display the admin dashboard."""
-    from app import get_db_connection
-    conn = get_db_connection()
     try:
-        cur = conn.cursor()
-        
-        # Get all experiments
-        cur.execute('SELECT id, type, name, created_at FROM experiments ORDER BY created_at DESC')
-        experiments = cur.fetchall()
-        
-        # Get active participant count
-        cur.execute('SELECT COUNT(*) FROM participants WHERE completed_at IS NULL')
-        active_participants = cur.fetchone()[0]
-        
-        # Get total experiment count
-        cur.execute('SELECT COUNT(*) FROM experiments')
-        experiment_count = cur.fetchone()[0]
-        
-        # Get admin user info
-        cur.execute('SELECT username, role FROM users WHERE id = %s', (session['admin_id'],))
-        admin = cur.fetchone()
+        # Cached aggregates; the database is only queried when they expire
+        stats = get_dashboard_stats()
+        admin = get_admin_user(session['admin_id'])
         
         return render_template(
             'admin/dashboard.html',
-            experiments=experiments,
-            active_participants=active_participants,
-            experiment_count=experiment_count,
+            experiments=stats['experiments'],
+            active_participants=stats['active_participants'],
+            experiment_count=stats['experiment_count'],
             admin=admin
         )
     except Exception as e:
         logger.error(f"Error loading dashboard: {e}")
         flash('An error occurred while loading the dashboard', 'error')
         return render_template('admin/dashboard.html')
-    finally:
-        conn.close()
 
 # Create new experiment
 @admin_bp.route('/experiments/new', methods=['GET', 'POST'])
@@ -139,34 +130,24 @@ def new_experiment():
             flash('Invalid parameters JSON format', 'error')
             return render_template('admin/new_experiment.html')
         
-        from app import get_db_connection
-        conn = get_db_connection()
         try:
-            cur = conn.cursor()
+            storage = get_storage()
             
             # Insert new experiment
-            cur.execute(
-                'INSERT INTO experiments (type, name, description, parameters, created_at) '
-                'VALUES (%s, %s, %s, %s, %s) RETURNING id',
-                (exp_type, name, description, json.dumps(parameters), datetime.now())
-            )
-            experiment_id = cur.fetchone()[0]
-            conn.commit()
+            experiment_id = storage.create_experiment(exp_type, name, description, parameters)
+            invalidate_dashboard_stats()
             
             # Generate initial keys if specified
             key_count = request.form.get('key_count')
             if key_count and key_count.isdigit() and int(key_count) > 0:
-                create_keys_for_experiment(experiment_id, int(key_count), conn)
+                storage.create_keys(experiment_id, int(key_count))
             
             flash(f'Experiment "{name}" created successfully', 'success')
             return redirect(url_for('admin.view_experiment', experiment_id=experiment_id))
         except Exception as e:
             logger.error(f"Error creating experiment: {e}")
-            conn.rollback()
             flash('An error occurred while creating the experiment', 'error')
             return render_template('admin/new_experiment.html')
-        finally:
-            conn.close()
     
     # GET request - show form
     return render_template('admin/new_experiment.html')
@@ -174,50 +155,55 @@ def new_experiment():
 # View experiment details
 @admin_bp.route('/experiments/<int:experiment_id>')
 def view_experiment(experiment_id):
-    """View experiment details."""
-    from app import get_db_connection
-    conn = get_db_connection()
+    """
+    View experiment details.
+    
+    Keys are paged with ``?after=<last key id>`` and can be filtered with
+    ``?status=unused|used|revoked``.
+    """
     try:
-        cur = conn.cursor()
+        storage = get_storage()
         
         # Get experiment details
-        cur.execute(
-            'SELECT id, type, name, description, parameters, created_at FROM experiments WHERE id = %s',
-            (experiment_id,)
-        )
-        experiment = cur.fetchone()
+        experiment = storage.get_experiment(experiment_id)
         
         if not experiment:
             flash('Experiment not found', 'error')
             return redirect(url_for('admin.dashboard'))
         
         # Get participant count
-        cur.execute('SELECT COUNT(*) FROM participants WHERE experiment_id = %s', (experiment_id,))
-        participant_count = cur.fetchone()[0]
+        participant_count = storage.count_participants(experiment_id)
+        
+        # Get key counts and one page of keys
+        key_counts = storage.get_key_status_counts(experiment_id)
         
-        # Get keys
-        keys = get_keys_for_experiment(experiment_id, conn)
+        key_status = request.args.get('status') or None
+        after_id = request.args.get('after', type=int)
+        keys = storage.get_keys(experiment_id, status=key_status, after_id=after_id, limit=KEYS_PAGE_SIZE + 1)
+        
+        # Fetching one extra row tells us whether there is a next page
+        next_after = None
+        if len(keys) > KEYS_PAGE_SIZE:
+            keys = keys[:KEYS_PAGE_SIZE]
+            next_after = keys[-1]['id']
         
         # Get completed rounds
-        cur.execute(
-            'SELECT COUNT(*) FROM experiment_rounds WHERE experiment_id = %s AND status = %s',
-            (experiment_id, 'completed')
-        )
-        completed_rounds = cur.fetchone()[0]
+        completed_rounds = storage.count_completed_rounds(experiment_id)
         
         return render_template(
             'admin/view_experiment.html',
             experiment=experiment,
             participant_count=participant_count,
             keys=keys,
+            key_counts=key_counts,
+            key_status=key_status,
+            next_after=next_after,
             completed_rounds=completed_rounds
         )
     except Exception as e:
         logger.error(f"Error viewing experiment {experiment_id}: {e}")
         flash('An error occurred while loading the experiment details', 'error')
         return redirect(url_for('admin.dashboard'))
-    finally:
-        conn.close()
 
 # Generate keys for an experiment
 @admin_bp.route('/experiments/<int:experiment_id>/keys/generate', methods=['POST'])
@@ -232,7 +218,7 @@ def generate_keys(experiment_id):
     count = int(count)
     
     try:
-        keys = create_keys_for_experiment(experiment_id, count)
+        keys = get_storage().create_keys(experiment_id, count)
         flash(f'Generated {len(keys)} new keys successfully', 'success')
     except Exception as e:
         logger.error(f"Error generating keys: {e}")
@@ -245,7 +231,7 @@ def generate_keys(experiment_id):
 def revoke_key_route(key):
     """Revoke a specific key."""
     try:
-        if revoke_key(key):
+        if get_storage().revoke_key(key):
             flash('Key revoked successfully', 'success')
         else:
             flash('Key not found or already revoked', 'error')
@@ -255,84 +241,213 @@ def revoke_key_route(key):
     
     return redirect(request.referrer or url_for('admin.dashboard'))
 
+# Rows fetched per round trip by streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Column order of the CSV export for each record type
+CSV_COLUMNS = {
+    'rounds': ['id', 'round_number', 'started_at', 'completed_at', 'results'],
+    'participants': ['id', 'type', 'joined_at', 'completed_at', 'key'],
+}
+
+def _round_record(row):
+    """Convert a rounds row to a JSON-serializable dict."""
+    round_id, round_number, started_at, completed_at, results = row
+    return {
+        'id': round_id,
+        'round_number': round_number,
+        'started_at': started_at.isoformat() if started_at else None,
+        'completed_at': completed_at.isoformat() if completed_at else None,
+        'results': results
+    }
+
+def _participant_record(row):
+    """Convert a participants row to a JSON-serializable dict."""
+    p_id, p_type, joined_at, completed_at, key = row
+    return {
+        'id': p_id,
+        'type': p_type,
+        'joined_at': joined_at.isoformat() if joined_at else None,
+        'completed_at': completed_at.isoformat() if completed_at else None,
+        'key': key
+    }
+
+def _get_experiment_record(storage, experiment_id):
+    """Fetch the experiment details as a dict, or None if it does not exist."""
+    exp = storage.get_experiment(experiment_id)
+    if not exp:
+        return None
+    
+    return {
+        'id': experiment_id,
+        'type': exp['type'],
+        'name': exp['name'],
+        'description': exp['description'],
+        'parameters': exp['parameters'],
+        'created_at': exp['created_at'].isoformat() if exp['created_at'] else None
+    }
+
+def _iter_records(storage, record_type, experiment_id):
+    """Yield the rounds or participants of an experiment as records, EXPORT_CHUNK_SIZE rows at a time."""
+    if record_type == 'rounds':
+        rows, to_record = storage.iter_rounds(experiment_id, EXPORT_CHUNK_SIZE), _round_record
+    else:
+        rows, to_record = storage.iter_participants(experiment_id, EXPORT_CHUNK_SIZE), _participant_record
+    for row in rows:
+        yield to_record(row)
+
+def _stream_ndjson(storage, experiment, record_types):
+    """Yield the experiment, its rounds and its participants as NDJSON lines."""
+    yield json.dumps({'record': 'experiment', **experiment}, default=str) + '\n'
+    
+    if 'rounds' in record_types:
+        for record in _iter_records(storage, 'rounds', experiment['id']):
+            yield json.dumps({'record': 'round', **record}, default=str) + '\n'
+    
+    if 'participants' in record_types:
+        for record in _iter_records(storage, 'participants', experiment['id']):
+            yield json.dumps({'record': 'participant', **record}, default=str) + '\n'
+
+def _stream_csv(storage, experiment, record_type):
+    """Yield the rounds or participants of an experiment as CSV, one chunk at a time."""
+    columns = CSV_COLUMNS[record_type]
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    
+    for i, record in enumerate(_iter_records(storage, record_type, experiment['id']), 1):
+        if record.get('results') is not None:
+            record['results'] = json.dumps(record['results'], default=str)
+        writer.writerow([record[column] for column in columns])
+        
+        if i % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+def _stream_results(experiment_id, export_format):
+    """
+    Stream experiment results as NDJSON or CSV.
+    
+    Rows are read in chunks (through server-side cursors on PostgreSQL) and
+    written out as they arrive, so memory use does not depend on the size of
+    the experiment.
+    """
+    record_types = request.args.getlist('records') or ['rounds', 'participants']
+    if any(r not in CSV_COLUMNS for r in record_types):
+        return jsonify({'error': 'records must be "rounds" or "participants"'}), 400
+    if export_format == 'csv' and len(record_types) != 1:
+        return jsonify({'error': 'CSV export needs exactly one records type'}), 400
+    
+    storage = get_storage()
+    experiment = _get_experiment_record(storage, experiment_id)
+    if not experiment:
+        return jsonify({'error': 'Experiment not found'}), 404
+    
+    def generate():
+        try:
+            if export_format == 'csv':
+                yield from _stream_csv(storage, experiment, record_types[0])
+            else:
+                yield from _stream_ndjson(storage, experiment, record_types)
+        except Exception as e:
+            logger.error(f"Error streaming experiment results: {e}")
+            raise
+    
+    if export_format == 'csv':
+        mimetype = 'text/csv'
+        filename = f'experiment_{experiment_id}_{record_types[0]}.csv'
+    else:
+        mimetype = 'application/x-ndjson'
+        filename = f'experiment_{experiment_id}_results.ndjson'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 # API endpoint to get experiment results
 @admin_bp.route('/api/experiments/<int:experiment_id>/results')
 def experiment_results_api(experiment_id):
-    """API endpoint to get experiment results."""
-    from app import get_db_connection
-    conn = get_db_connection()
+    """
+    API endpoint to get experiment results.
+    
+    ``?format=ndjson`` or ``?format=csv`` streams the results instead of
+    building one JSON document; ``?records=rounds`` or
+    ``?records=participants`` selects what to export.
+    """
+    export_format = request.args.get('format', 'json')
+    if export_format in ('ndjson', 'csv'):
+        return _stream_results(experiment_id, export_format)
+    if export_format != 'json':
+        return jsonify({'error': f'Unsupported format: {export_format}'}), 400
+    
     try:
-        cur = conn.cursor()
-        
-        # Get all rounds for this experiment
-        cur.execute(
-            'SELECT er.id, er.round_number, er.started_at, er.completed_at, rr.results '
-            'FROM experiment_rounds er '
-            'LEFT JOIN round_results rr ON er.id = rr.round_id '
-            'WHERE er.experiment_id = %s '
-            'ORDER BY er.round_number',
-            (experiment_id,)
-        )
-        
-        rounds = []
-        for row in cur.fetchall():
-            round_id, round_number, started_at, completed_at, results = row
-            rounds.append({
-                'id': round_id,
-                'round_number': round_number,
-                'started_at': started_at.isoformat() if started_at else None,
-                'completed_at': completed_at.isoformat() if completed_at else None,
-                'results': results
-            })
-        
-        # Get participant information
-        cur.execute(
-            'SELECT p.id, p.participant_type, p.joined_at, p.completed_at, pk.key_value '
-            'FROM participants p '
-            'JOIN participant_keys pk ON p.key_id = pk.id '
-            'WHERE p.experiment_id = %s',
-            (experiment_id,)
-        )
-        
-        participants = []
-        for row in cur.fetchall():
-            p_id, p_type, joined_at, completed_at, key = row
-            participants.append({
-                'id': p_id,
-                'type': p_type,
-                'joined_at': joined_at.isoformat() if joined_at else None,
-                'completed_at': completed_at.isoformat() if completed_at else None,
-                'key': key
-            })
+        storage = get_storage()
         
         # Get experiment details
-        cur.execute(
-            'SELECT type, name, description, parameters, created_at FROM experiments WHERE id = %s',
-            (experiment_id,)
-        )
-        exp = cur.fetchone()
-        if not exp:
+        experiment = _get_experiment_record(storage, experiment_id)
+        if not experiment:
             return jsonify({'error': 'Experiment not found'}), 404
         
-        experiment = {
-            'id': experiment_id,
-            'type': exp[0],
-            'name': exp[1],
-            'description': exp[2],
-            'parameters': exp[3],
-            'created_at': exp[4].isoformat() if exp[4] else None
-        }
-        
         return jsonify({
             'experiment': experiment,
-            'rounds': rounds,
-            'participants': participants
+            'rounds': list(_iter_records(storage, 'rounds', experiment_id)),
+            'participants': list(_iter_records(storage, 'participants', experiment_id))
         })
     except Exception as e:
         logger.error(f"Error fetching experiment results: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+
+# Prometheus metrics for this worker process
+@admin_bp.route('/metrics')
+def metrics():
+    """Expose request and database metrics in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Most expensive queries seen by this worker process
+@admin_bp.route('/queries')
+def query_stats():
+    """
+    Show the top-N normalized queries by total time.
+    
+    ``?order=`` picks another ordering (see QUERY_ORDERINGS), ``?n=`` the
+    number of queries and ``?format=json`` returns the data as JSON.
+    """
+    order_by = request.args.get('order', 'total_time')
+    if order_by not in QUERY_ORDERINGS:
+        order_by = 'total_time'
+    # At least one: [-0:] would return the whole buffer
+    limit = max(1, request.args.get('n', TOP_QUERIES, type=int))
+    
+    queries = query_log.top(limit, order_by=order_by)
+    recent = list(query_log.recent)[-limit:]
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'queries': queries,
+            'recent': [record._asdict() for record in recent],
+        })
+    
+    return render_template(
+        'admin/queries.html',
+        queries=queries,
+        recent=reversed(recent),
+        order_by=order_by,
+        orderings=QUERY_ORDERINGS,
+        limit=limit,
+    )
+
+@admin_bp.route('/queries/reset', methods=['POST'])
+def reset_query_stats():
+    """Clear the recorded query statistics."""
+    query_log.reset()
+    flash('Query statistics cleared')
+    return redirect(url_for('admin.query_stats'))
 
 # Register admin user (restricted to existing admins)
 @admin_bp.route('/users/register', methods=['GET', 'POST'])
@@ -360,41 +475,28 @@ def register_user():
         # Hash password
         password_hash = generate_password_hash(password)
         
-        from app import get_db_connection
-        conn = get_db_connection()
         try:
-            cur = conn.cursor()
+            storage = get_storage()
             
             # Check if username already exists
-            cur.execute('SELECT 1 FROM users WHERE username = %s', (username,))
-            if cur.fetchone():
+            if storage.find_user(username=username):
                 flash('Username already exists', 'error')
                 return render_template('admin/register_user.html')
             
             # Check if email already exists (if provided)
-            if email:
-                cur.execute('SELECT 1 FROM users WHERE email = %s', (email,))
-                if cur.fetchone():
-                    flash('Email already exists', 'error')
-                    return render_template('admin/register_user.html')
+            if email and storage.find_user(email=email):
+                flash('Email already exists', 'error')
+                return render_template('admin/register_user.html')
             
             # Insert new user
-            cur.execute(
-                'INSERT INTO users (username, password_hash, email, role, created_at) '
-                'VALUES (%s, %s, %s, %s, %s)',
-                (username, password_hash, email, role, datetime.now())
-            )
-            conn.commit()
+            storage.create_user(username, password_hash, email, role)
             
             flash(f'User {username} registered successfully', 'success')
             return redirect(url_for('admin.dashboard'))
         except Exception as e:
             logger.error(f"Error registering user: {e}")
-            conn.rollback()
             flash('An error occurred while registering the user', 'error')
             return render_template('admin/register_user.html')
-        finally:
-            conn.close()
     
     # GET request - show form
     return render_template('admin/register_user.html')
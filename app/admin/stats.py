@@ -0,0 +1,143 @@
+"""
+Aggregate Statistics for the Admin Dashboard
+
+This module serves the numbers shown on the admin dashboard, read through
+the app's storage backend. On PostgreSQL, active participants are counted
+from the partial index idx_participants_active, which holds only
+participants that have not completed, so the count is an index-only scan
+rather than a scan of the participants table. Counting on
+read keeps participant writes free of shared counter rows that concurrent
+redemptions would contend on. Results are held in a short-TTL in-process
+cache, so a dashboard that several researchers keep open costs at most one
+query per worker per TTL period.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from app.storage import get_storage
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Seconds a cached dashboard value stays fresh
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', 5))
+
+# Most values the cache holds (one per admin user seen, plus the statistics)
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv('DASHBOARD_CACHE_MAX_ENTRIES', 1000))
+
+
+class TTLCache:
+    """
+    A small thread-safe cache whose entries expire after ``ttl`` seconds.
+
+    Once it holds more than ``max_entries`` values, expired entries are
+    swept out, and then the least recently stored ones.
+    """
+
+    def __init__(self, ttl, max_entries=DASHBOARD_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, compute):
+        """
+        Return the cached value for ``key``, computing it if missing or expired.
+
+        Args:
+            key: Cache key
+            compute (callable): Called without arguments to produce the value
+
+        Returns:
+            The cached or freshly computed value
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        value = compute()
+        with self._lock:
+            # Re-inserted, so the dict stays in storage order
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, value)
+            if len(self._entries) > self.max_entries:
+                self._sweep(now)
+        return value
+
+    def _sweep(self, now):
+        """Drop expired entries, then the oldest ones. The caller holds the lock."""
+        for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry if no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+
+def get_dashboard_stats(storage=None):
+    """
+    Get the experiment list and participant totals for the dashboard.
+
+    Everything comes from one query over experiments and their active
+    participant counts.
+
+    Args:
+        storage (StorageBackend, optional): Storage backend (default: the
+            current app's), only used when the cached value has expired
+
+    Returns:
+        dict: 'experiments' as (id, type, name, created_at) tuples, newest
+            first, plus 'experiment_count' and 'active_participants'
+    """
+    return _cache.get_or_set('dashboard', lambda: _load_dashboard_stats(storage or get_storage()))
+
+
+def _load_dashboard_stats(storage):
+    """Read the dashboard statistics from the storage backend."""
+    overview = storage.get_experiment_overview()
+    return {
+        'experiments': [(e['id'], e['type'], e['name'], e['created_at']) for e in overview],
+        'experiment_count': len(overview),
+        'active_participants': sum(e['active_participants'] for e in overview),
+    }
+
+
+def get_admin_user(user_id, storage=None):
+    """
+    Get the username and role of an admin user, cached like the statistics.
+
+    Args:
+        user_id (int): ID of the user
+        storage (StorageBackend, optional): Storage backend (default: the
+            current app's)
+
+    Returns:
+        tuple: (username, role), or None if the user does not exist
+    """
+    def load():
+        user = (storage or get_storage()).get_user(user_id)
+        return (user['username'], user['role']) if user else None
+
+    return _cache.get_or_set(('admin_user', user_id), load)
+
+
+def invalidate_dashboard_stats():
+    """Forget the cached statistics, e.g. after this worker created an experiment."""
+    _cache.invalidate('dashboard')
@@ -7,7 +7,6 @@ including routes, authentication, and experiment module loading.
 
 import os
 import logging
-import psycopg2
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
 from dotenv import load_dotenv
 from datetime import datetime
@@ -22,17 +21,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Database connection function
-def get_db_connection():
-    """Create and return a connection to the PostgreSQL database."""
-    conn = psycopg2.connect(
-        host=os.getenv('DB_HOST', 'db'),
-        database=os.getenv('DB_NAME', 'experiment_db'),
-        user=os.getenv('DB_USER', 'user'),
-        password=os.getenv('DB_PASSWORD', 'password')
-    )
-    conn.autocommit = True
-    return conn
+# Database connections come from the shared pool
+from app.db.pool import get_db_connection
 
 def create_app(test_config=None):
     """Create and configure the Flask application using the factory pattern."""
@@ -45,6 +35,15 @@ def create_app(test_config=None):
         DATABASE_NAME=os.getenv('DB_NAME', 'experiment_db'),
         DATABASE_USER=os.getenv('DB_USER', 'user'),
         DATABASE_PASSWORD=os.getenv('DB_PASSWORD', 'password'),
+        DATABASE_POOL_MIN=int(os.getenv('DB_POOL_MIN', 2)),
+        DATABASE_POOL_MAX=int(os.getenv('DB_POOL_MAX', 20)),
+        DATABASE_POOL_TIMEOUT=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        DATABASE_POOL_MAX_IDLE=float(os.getenv('DB_POOL_MAX_IDLE', 60)),
+        STORAGE_BACKEND=os.getenv('STORAGE_BACKEND', 'postgres'),
+        SQLITE_PATH=os.getenv('SQLITE_PATH', 'instance/experiment.db'),
+        SESSION_BACKEND=os.getenv('SESSION_BACKEND', 'server'),
+        EXPERIMENT_LOADING=os.getenv('EXPERIMENT_LOADING', 'eager'),
+        EXPERIMENT_MANIFEST=os.getenv('EXPERIMENT_MANIFEST'),
     )
     
     if test_config:
@@ -57,14 +56,36 @@ def create_app(test_config=None):
     except OSError:
         pass
     
+    # Record request latency, DB usage and response size for /admin/metrics
+    from app import metrics
+    metrics.init_app(app)
+    
+    # Set up the request-scoped database connection pool
+    from app.db import pool
+    pool.init_app(app)
+    
+    # Set up the configured storage backend
+    from app import storage
+    storage.init_app(app)
+    
+    # Keep participant sessions on the server; the cookie holds only an ID
+    from app import sessions
+    sessions.init_app(app)
+    
+    # Register the key filter commands
+    from app.auth import key_filter
+    key_filter.init_app(app)
+    
     # Register the admin blueprint
     from app.admin import register_admin_routes
     register_admin_routes(app)
     
     # Register experiment modules dynamically
-    from app.experiments import get_available_experiments, register_experiment_routes
+    from app import experiments
+    from app.experiments import get_available_experiments, get_experiment_plugin, register_experiment_routes
     available_experiments = get_available_experiments()
     register_experiment_routes(app)
+    experiments.init_app(app)
     
     # Template context processor to add current year to all templates
     @app.context_processor
@@ -87,45 +108,31 @@ def create_app(test_config=None):
             flash('Please enter a key', 'error')
             return redirect(url_for('home'))
         
-        # Import key validation function
-        from app.auth import validate_key, mark_key_as_used
+        # Import the storage backend accessor
+        from app.storage import get_storage
         
-        # Validate the key
-        key_data = validate_key(key)
+        # Claim the key and create the participant record atomically
+        try:
+            redemption = get_storage().redeem_key(key)
+        except Exception as e:
+            logger.error(f"Error creating participant record: {e}")
+            flash('An error occurred. Please try again.', 'error')
+            return redirect(url_for('home'))
         
-        if not key_data:
+        if not redemption:
             flash('Invalid key', 'error')
             return redirect(url_for('home'))
         
-        if key_data['status'] != 'unused':
+        if redemption['participant_id'] is None:
             flash('This key has already been used', 'error')
             return redirect(url_for('home'))
         
-        # Mark key as used
-        mark_key_as_used(key_data['id'])
+        # Store in session
+        session['participant_id'] = redemption['participant_id']
+        session['experiment_id'] = redemption['experiment_id']
+        session['experiment_type'] = redemption['experiment_type']
         
-        # Create participant record
-        conn = get_db_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                'INSERT INTO participants (key_id, experiment_id, joined_at) VALUES (%s, %s, %s) RETURNING id',
-                (key_data['id'], key_data['experiment_id'], datetime.now())
-            )
-            participant_id = cur.fetchone()[0]
-            
-            # Store in session
-            session['participant_id'] = participant_id
-            session['experiment_id'] = key_data['experiment_id']
-            session['experiment_type'] = key_data['experiment_type']
-            
-            return redirect(url_for('experiment_start', exp_type=key_data['experiment_type']))
-        except Exception as e:
-            logger.error(f"Error creating participant record: {e}")
-            flash('An error occurred. Please try again.', 'error')
-            return redirect(url_for('home'))
-        finally:
-            conn.close()
+        return redirect(url_for('experiment_start', exp_type=redemption['experiment_type']))
     
     # Experiment start route - redirects to the specific experiment module
     @app.route('/experiment/start/<exp_type>')
@@ -135,6 +142,14 @@ def create_app(test_config=None):
             flash('Please enter a valid experiment key to begin', 'error')
             return redirect(url_for('home'))
         
+        # Lazy plugins are imported here, on the first start of their type
+        if app.config['EXPERIMENT_LOADING'] == 'lazy':
+            plugin = get_experiment_plugin(exp_type)
+            start_url = plugin.url_for(app, 'start') if plugin else None
+            if not start_url:
+                return render_template('error.html', message='Experiment not found')
+            return redirect(start_url)
+        
         if exp_type not in available_experiments:
             return render_template('error.html', message='Experiment not found')
         
@@ -162,6 +177,13 @@ if __name__ == '__main__':
     from app.db.init_db import init_db
     init_db()
     
-    # Create and run the application
+    # Create the application and open the pooled connections up front
     app = create_app()
+    from app.db import warm_pool
+    from app.auth.key_filter import start_key_filter_refresher, warm_key_filter
+    warm_pool()
+    warm_key_filter()
+    start_key_filter_refresher()
+    from app.storage.decision_log import start_decision_log
+    start_decision_log(app.extensions['storage'])
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=True)
\ No newline at end of file
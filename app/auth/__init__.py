@@ -9,7 +9,9 @@ from .key_manager import (
     generate_key,
     create_keys_for_experiment,
     validate_key,
+    redeem_key,
     mark_key_as_used,
     revoke_key,
-    get_keys_for_experiment
+    get_keys_for_experiment,
+    get_key_status_counts
 )
\ No newline at end of file
@@ -0,0 +1,392 @@
+"""
+Key Filter for Experiment Platform
+
+This module keeps a per-worker Bloom filter of every issued participant
+key, so that keys which were never issued (typos, guessing) are rejected
+without touching the database.
+
+A Bloom filter never gives false negatives for keys it was told about, and
+gives false positives at a configurable rate (KEY_FILTER_ERROR_RATE,
+default 0.1%): roughly 1 in 1000 bogus keys still reaches the database,
+where it is rejected as before. At that rate the filter needs about 14.4
+bits per key, i.e. ~1.8 MB per million keys; 1% needs ~1.2 MB and 0.01%
+~2.4 MB per million keys.
+
+Checking a key never touches the database. Keys created in this worker
+are added to its filter as they are stored; keys created in another worker
+are picked up by a background thread that refreshes the filter every
+KEY_FILTER_REFRESH_SECONDS, so they are accepted after at most that delay.
+A refresh re-reads the last KEY_FILTER_OVERLAP_IDS ids as well: ids are
+handed out when a key batch is inserted, not when it commits, so a batch
+with lower ids can become visible after a later one. An idle refresh is a
+single COUNT over that id range.
+
+The filter is built at startup, either from a snapshot written by
+``flask key-filter rebuild`` (KEY_FILTER_PATH) or from participant_keys.
+Keys are read through the app's storage backend, so the filter works the
+same with PostgreSQL and SQLite.
+"""
+
+import os
+import math
+import struct
+import hashlib
+import logging
+import threading
+
+import click
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Whether /validate_key consults the filter at all
+KEY_FILTER_ENABLED = os.getenv('KEY_FILTER_ENABLED', 'True').lower() in ('true', '1', 't')
+
+# Target false-positive rate of the filter
+KEY_FILTER_ERROR_RATE = float(os.getenv('KEY_FILTER_ERROR_RATE', 0.001))
+
+# Snapshot written by the rebuild command and loaded at startup
+KEY_FILTER_PATH = os.getenv('KEY_FILTER_PATH', 'instance/key_filter.bin')
+
+# Smallest capacity a filter is sized for, and headroom for keys added later
+KEY_FILTER_MIN_CAPACITY = 100000
+KEY_FILTER_GROWTH = 2
+
+# Rows fetched per round trip when loading keys
+KEY_FILTER_CHUNK_SIZE = 50000
+
+# Seconds between background refreshes of each worker's filter
+KEY_FILTER_REFRESH_SECONDS = float(os.getenv('KEY_FILTER_REFRESH_SECONDS', 5))
+
+# Ids below the high-water mark that every refresh reads again, to catch
+# key batches that committed after a batch with higher ids (two batches of
+# KEY_BATCH_SIZE keys in flight at once by default)
+KEY_FILTER_OVERLAP_IDS = int(os.getenv('KEY_FILTER_OVERLAP_IDS', 20000))
+
+# Snapshot header: magic, number of bits, number of hashes, capacity, count, max key id
+_SNAPSHOT_HEADER = struct.Struct('<4sQIQQQ')
+_SNAPSHOT_MAGIC = b'KBF1'
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings.
+
+    The bit array is sized for ``capacity`` items at ``error_rate``; the
+    ``k`` bit positions of an item are derived from one 128-bit BLAKE2b
+    digest by double hashing. Writers hold a lock, since setting a bit is a
+    read-modify-write of its byte and a lost bit would reject a valid key.
+    """
+
+    def __init__(self, capacity, error_rate=KEY_FILTER_ERROR_RATE, num_bits=None, num_hashes=None):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError(f"Invalid filter parameters: capacity={capacity}, error_rate={error_rate}")
+
+        self.capacity = capacity
+        self.num_bits = num_bits or math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Add a key to the filter."""
+        self.update((key,))
+
+    def update(self, keys):
+        """
+        Add several keys to the filter.
+
+        Keys that are already in the filter (re-read by a refresh) are not
+        counted again.
+        """
+        positions = [self._positions(key) for key in keys]
+        bits = self.bits
+        with self._lock:
+            for key_positions in positions:
+                added = False
+                for pos in key_positions:
+                    mask = 1 << (pos & 7)
+                    if not bits[pos >> 3] & mask:
+                        bits[pos >> 3] |= mask
+                        added = True
+                self.count += added
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def error_rate(self):
+        """Expected false-positive rate at the current number of keys."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    @property
+    def memory_bytes(self):
+        """Size of the bit array in bytes."""
+        return len(self.bits)
+
+
+class KeyFilter:
+    """
+    The per-worker set of issued keys, backed by a BloomFilter.
+
+    Until it has been built the filter lets every key through, so the
+    database stays the source of truth.
+    """
+
+    def __init__(self, error_rate=KEY_FILTER_ERROR_RATE):
+        self.error_rate = error_rate
+        self.bloom = None
+        self.max_id = 0
+        # Storage backend the keys are read from (set by init_app)
+        self.source = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # (from id, count, max id) of the overlap range at the last refresh
+        self._tail = None
+        self._refresher = None
+        self._refresher_pid = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self):
+        """Whether the filter has been built."""
+        return self.bloom is not None
+
+    def _source(self):
+        """Get the storage backend keys are read from (PostgreSQL unless set)."""
+        if self.source is None:
+            from app.storage.postgres import PostgresStorage
+            self.source = PostgresStorage()
+        return self.source
+
+    def build(self):
+        """
+        Build the filter from every key in participant_keys.
+
+        Returns:
+            BloomFilter: The new filter
+        """
+        source = self._source()
+        total, _ = source.count_keys()
+
+        bloom = BloomFilter(max(total * KEY_FILTER_GROWTH, KEY_FILTER_MIN_CAPACITY), self.error_rate)
+        max_id = _load_keys(source, bloom, 0)
+
+        with self._lock:
+            self.bloom = bloom
+            self.max_id = max_id
+            self._tail = None
+
+        logger.info(
+            f"Built key filter: {bloom.count} keys, {bloom.memory_bytes / 1e6:.1f} MB, "
+            f"expected false-positive rate {bloom.error_rate:.4%}"
+        )
+        return bloom
+
+    def refresh(self):
+        """
+        Add the keys created since the last build or refresh.
+
+        The last KEY_FILTER_OVERLAP_IDS ids are read again, unless their
+        count and maximum are the same as at the last refresh. Rebuilds the
+        filter instead when it has outgrown its capacity.
+
+        Returns:
+            bool: True if keys were read
+        """
+        # One refresh at a time, so keys are not loaded twice
+        with self._refresh_lock:
+            with self._lock:
+                bloom, known_id, last_tail = self.bloom, self.max_id, self._tail
+            if bloom is None:
+                self.build()
+                return True
+
+            source = self._source()
+            after_id = max(0, known_id - KEY_FILTER_OVERLAP_IDS)
+            count, latest_id = source.count_keys(after_id)
+            tail = (after_id, count, latest_id or 0)
+            if tail == last_tail:
+                return False
+
+            max_id = _load_keys(source, bloom, after_id)
+
+            with self._lock:
+                if self.bloom is bloom:
+                    self.max_id = max(self.max_id, max_id)
+                    self._tail = tail
+
+            if bloom.count > bloom.capacity:
+                logger.info("Key filter is over capacity, rebuilding")
+                self.build()
+            return True
+
+    def start_refresher(self, interval=KEY_FILTER_REFRESH_SECONDS):
+        """
+        Refresh the filter in a background thread every ``interval`` seconds.
+
+        Threads do not survive fork(), so each worker starts its own; calling
+        this again in the same process does nothing.
+        """
+        if self._refresher is not None and self._refresher_pid == os.getpid() and self._refresher.is_alive():
+            return
+        self._stop = threading.Event()
+        self._refresher = threading.Thread(
+            target=self._refresh_periodically, args=(interval, self._stop),
+            name='key-filter-refresher', daemon=True
+        )
+        self._refresher_pid = os.getpid()
+        self._refresher.start()
+
+    def stop_refresher(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+        if self._refresher is not None and self._refresher_pid == os.getpid():
+            self._refresher.join(timeout=5)
+        self._refresher = None
+
+    def _refresh_periodically(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing key filter: {e}")
+
+    def add_keys(self, keys):
+        """Add newly issued keys (no-op until the filter has been built)."""
+        bloom = self.bloom
+        if bloom is None:
+            return
+        bloom.update(keys)
+
+    def might_contain(self, key):
+        """
+        Check whether a key may have been issued, without database access.
+
+        Returns:
+            bool: False only if the key was never issued, or was issued by
+                another worker since this worker's last refresh
+        """
+        bloom = self.bloom
+        return bloom is None or key in bloom
+
+    def save(self, path=KEY_FILTER_PATH):
+        """Write the filter to a snapshot file."""
+        bloom = self.bloom
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_SNAPSHOT_HEADER.pack(
+                _SNAPSHOT_MAGIC, bloom.num_bits, bloom.num_hashes, bloom.capacity, bloom.count, self.max_id
+            ))
+            f.write(bloom.bits)
+        os.replace(tmp_path, path)
+
+    def load(self, path=KEY_FILTER_PATH):
+        """
+        Load a snapshot written by save().
+
+        Returns:
+            bool: True if a snapshot was loaded
+        """
+        try:
+            with open(path, 'rb') as f:
+                magic, num_bits, num_hashes, capacity, count, max_id = _SNAPSHOT_HEADER.unpack(
+                    f.read(_SNAPSHOT_HEADER.size)
+                )
+                if magic != _SNAPSHOT_MAGIC:
+                    logger.warning(f"Ignoring key filter snapshot with unknown format: {path}")
+                    return False
+                bloom = BloomFilter(capacity, self.error_rate, num_bits=num_bits, num_hashes=num_hashes)
+                f.readinto(bloom.bits)
+                bloom.count = count
+        except FileNotFoundError:
+            return False
+
+        with self._lock:
+            self.bloom = bloom
+            self.max_id = max_id
+            self._tail = None
+        return True
+
+
+def _load_keys(source, bloom, after_id):
+    """
+    Add every key with an id above ``after_id`` to ``bloom``.
+
+    Keys are streamed from the storage backend in chunks.
+
+    Returns:
+        int: The highest key id seen (``after_id`` if there were none)
+    """
+    max_id = after_id
+    for rows in source.iter_key_values(after_id, KEY_FILTER_CHUNK_SIZE):
+        bloom.update(key_value for _, key_value in rows)
+        max_id = rows[-1][0]
+    return max_id
+
+
+# The filter of this worker process
+key_filter = KeyFilter()
+
+
+def is_key_possibly_valid(key):
+    """
+    Check a submitted key against the filter.
+
+    Returns:
+        bool: False if the key can be rejected without a database lookup
+    """
+    if not KEY_FILTER_ENABLED:
+        return True
+    return key_filter.might_contain(key)
+
+
+def start_key_filter_refresher():
+    """Keep this worker's filter current from a background thread."""
+    if KEY_FILTER_ENABLED:
+        key_filter.start_refresher()
+
+
+def warm_key_filter():
+    """Build this worker's filter from the snapshot or the database."""
+    if not KEY_FILTER_ENABLED:
+        return
+    if key_filter.load():
+        logger.info(f"Loaded key filter snapshot with {key_filter.bloom.count} keys")
+        key_filter.refresh()
+    else:
+        key_filter.build()
+
+
+@click.group('key-filter')
+def key_filter_cli():
+    """Manage the in-memory filter of issued keys."""
+
+
+@key_filter_cli.command('rebuild')
+@click.option('--path', default=KEY_FILTER_PATH, show_default=True, help='Snapshot file to write')
+def rebuild_command(path):
+    """Rebuild the key filter from the database and write a snapshot."""
+    bloom = key_filter.build()
+    key_filter.save(path)
+    click.echo(
+        f"Key filter rebuilt: {bloom.count} keys, {bloom.memory_bytes / 1e6:.1f} MB, "
+        f"expected false-positive rate {bloom.error_rate:.4%}, written to {path}"
+    )
+
+
+def init_app(app):
+    """
+    Read keys from the app's storage backend and register the key filter
+    CLI commands with the Flask app.
+    """
+    key_filter.source = app.extensions['storage']
+    app.cli.add_command(key_filter_cli)
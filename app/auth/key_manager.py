@@ -12,9 +12,18 @@ import hashlib
 import psycopg2
 from datetime import datetime
 
+from app.db.pool import get_db_connection
+from app.auth.key_filter import key_filter, is_key_possibly_valid
+
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Number of keys written per INSERT when generating keys in bulk
+KEY_BATCH_SIZE = 10000
+
+# How often a batch is retried when its keys collide with existing ones
+KEY_BATCH_MAX_RETRIES = 10
+
 def generate_key(length=16):
     """
     Generate a cryptographically secure random key.
@@ -27,52 +36,54 @@ def generate_key(length=16):
     """
     return secrets.token_hex(length)
 
-def create_keys_for_experiment(experiment_id, count, conn=None):
+def create_keys_for_experiment(experiment_id, count, conn=None, batch_size=KEY_BATCH_SIZE,
+                               progress=None):
     """
     Generate and store multiple keys for an experiment.
     
+    Keys are generated in memory and written in batches with a single
+    ``INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING`` statement
+    per batch. Keys that collide with existing ones are regenerated and
+    retried, so only the colliding keys cost another round trip. Each batch
+    is committed as it is written.
+    
     Args:
         experiment_id (int): ID of the experiment
         count (int): Number of keys to generate
         conn (psycopg2.connection, optional): Database connection
+        batch_size (int): Number of keys written per statement
+        progress (callable, optional): Called as ``progress(stored, count)``
+            after every batch (default: log the progress)
         
     Returns:
         list: List of generated keys
     """
-    generated_keys = []
     close_conn = False
     
     if conn is None:
-        from app import get_db_connection
         conn = get_db_connection()
         close_conn = True
     
     try:
         cur = conn.cursor()
+        created_at = datetime.now()
         
-        # Generate and store each key
-        for _ in range(count):
-            key = generate_key()
-            
-            # Check if key already exists (extremely unlikely but good practice)
-            cur.execute('SELECT 1 FROM participant_keys WHERE key_value = %s', (key,))
-            if cur.fetchone():
-                # In the highly unlikely event of a collision, try again
-                continue
-                
-            # Store the key in the database
+        def insert(keys):
             cur.execute(
                 'INSERT INTO participant_keys (experiment_id, key_value, created_at) '
-                'VALUES (%s, %s, %s)',
-                (experiment_id, key, datetime.now())
+                'SELECT %s, key_value, %s FROM unnest(%s::varchar[]) AS key_value '
+                'ON CONFLICT (key_value) DO NOTHING '
+                'RETURNING key_value',
+                (experiment_id, created_at, keys)
             )
-            
-            generated_keys.append(key)
+            return [row[0] for row in cur.fetchall()]
         
-        conn.commit()
-        logger.info(f"Generated {len(generated_keys)} keys for experiment {experiment_id}")
+        def write_batch(batch_count):
+            stored = generate_unique_keys(insert, batch_count)
+            conn.commit()
+            return stored
         
-        return generated_keys
+        return store_keys_in_batches(experiment_id, count, write_batch, batch_size, progress)
         
     except Exception as e:
         logger.error(f"Error generating keys: {e}")
@@ -82,6 +93,73 @@ def create_keys_for_experiment(experiment_id, count, conn=None):
         if close_conn:
             conn.close()
 
+def store_keys_in_batches(experiment_id, count, write_batch, batch_size=KEY_BATCH_SIZE, progress=None):
+    """
+    Create ``count`` keys in batches, whatever the storage backend.
+    
+    Every stored batch is added to this worker's key filter, so the new keys
+    are accepted right away.
+    
+    Args:
+        experiment_id (int): ID of the experiment
+        count (int): Number of keys to generate
+        write_batch (callable): Stores and commits ``batch_count`` new keys,
+            called as ``write_batch(batch_count)``; returns the stored keys
+        batch_size (int): Number of keys per batch
+        progress (callable, optional): Called as ``progress(stored, count)``
+            after every batch (default: log the progress)
+        
+    Returns:
+        list: List of generated keys
+    """
+    if progress is None:
+        progress = _log_key_progress(experiment_id)
+    
+    generated_keys = []
+    while len(generated_keys) < count:
+        stored = write_batch(min(batch_size, count - len(generated_keys)))
+        generated_keys.extend(stored)
+        key_filter.add_keys(stored)
+        progress(len(generated_keys), count)
+    
+    logger.info(f"Generated {len(generated_keys)} keys for experiment {experiment_id}")
+    return generated_keys
+
+def generate_unique_keys(insert, batch_count):
+    """
+    Store ``batch_count`` new keys, regenerating any that collide.
+    
+    Args:
+        insert (callable): Inserts a list of keys, skipping existing ones,
+            and returns the keys it stored
+        batch_count (int): Number of keys to store
+    
+    Returns:
+        list: The keys that were stored
+    """
+    stored = []
+    
+    for _ in range(KEY_BATCH_MAX_RETRIES):
+        # A set drops the (astronomically unlikely) duplicates within the batch
+        pending = set()
+        while len(pending) < batch_count - len(stored):
+            pending.add(generate_key())
+        
+        stored.extend(insert(list(pending)))
+        
+        if len(stored) == batch_count:
+            return stored
+        
+        logger.warning(f"Regenerating {batch_count - len(stored)} colliding keys")
+    
+    raise RuntimeError(f"Could not generate unique keys after {KEY_BATCH_MAX_RETRIES} attempts")
+
+def _log_key_progress(experiment_id):
+    """Return a progress callback that logs each stored batch."""
+    def progress(stored, count):
+        logger.info(f"Stored {stored}/{count} keys for experiment {experiment_id}")
+    return progress
+
 def validate_key(key, conn=None):
     """
     Validate if a key exists and is unused.
@@ -93,10 +171,14 @@ def validate_key(key, conn=None):
     Returns:
         tuple: (valid, experiment_id, key_id) tuple or (False, None, None) if invalid
     """
+    # Keys that were never issued are rejected without a database lookup
+    if not is_key_possibly_valid(key):
+        logger.warning(f"Invalid key attempted: {key}")
+        return (False, None, None)
+    
     close_conn = False
     
     if conn is None:
-        from app import get_db_connection
         conn = get_db_connection()
         close_conn = True
     
@@ -130,6 +212,87 @@ def validate_key(key, conn=None):
         if close_conn:
             conn.close()
 
+def redeem_key(key, conn=None):
+    """
+    Claim an unused key and create its participant in a single statement.
+    
+    The conditional ``UPDATE ... WHERE status = 'unused'`` only succeeds for
+    one caller, so two browsers submitting the same key at the same time
+    cannot both redeem it.
+    
+    Args:
+        key (str): The key to redeem
+        conn (psycopg2.connection, optional): Database connection
+        
+    Returns:
+        dict: Key and participant details with id, experiment_id,
+            experiment_type, status and participant_id (None if the key was
+            not unused), or None if the key does not exist
+    """
+    # Keys that were never issued are rejected without a database lookup
+    if not is_key_possibly_valid(key):
+        logger.warning(f"Invalid key attempted: {key}")
+        return None
+    
+    close_conn = False
+    
+    if conn is None:
+        conn = get_db_connection()
+        close_conn = True
+    
+    try:
+        cur = conn.cursor()
+        now = datetime.now()
+        
+        # Claim the key, insert the participant and read back the key, all in one round trip.
+        # The final SELECT sees the key as it was before the statement.
+        cur.execute(
+            'WITH claimed AS ('
+            '    UPDATE participant_keys SET status = %s, used_at = %s '
+            '    WHERE key_value = %s AND status = %s '
+            '    RETURNING id, experiment_id'
+            '), participant AS ('
+            '    INSERT INTO participants (key_id, experiment_id, joined_at) '
+            '    SELECT id, experiment_id, %s FROM claimed '
+            '    RETURNING id, key_id'
+            ') '
+            'SELECT pk.id, pk.experiment_id, e.type, pk.status, participant.id '
+            'FROM participant_keys pk '
+            'JOIN experiments e ON e.id = pk.experiment_id '
+            'LEFT JOIN participant ON participant.key_id = pk.id '
+            'WHERE pk.key_value = %s',
+            ('used', now, key, 'unused', now, key)
+        )
+        result = cur.fetchone()
+        conn.commit()
+        
+        if not result:
+            logger.warning(f"Invalid key attempted: {key}")
+            return None
+        
+        key_id, experiment_id, experiment_type, status, participant_id = result
+        
+        if participant_id is None:
+            logger.warning(f"Used key attempted: {key}")
+        else:
+            status = 'used'
+        
+        return {
+            'id': key_id,
+            'experiment_id': experiment_id,
+            'experiment_type': experiment_type,
+            'status': status,
+            'participant_id': participant_id
+        }
+        
+    except Exception as e:
+        logger.error(f"Error redeeming key: {e}")
+        conn.rollback()
+        raise
+    finally:
+        if close_conn:
+            conn.close()
+
 def mark_key_as_used(key_id, conn=None):
     """
     Mark a key as used after successful validation.
@@ -144,7 +307,6 @@ def mark_key_as_used(key_id, conn=None):
     close_conn = False
     
     if conn is None:
-        from app import get_db_connection
         conn = get_db_connection()
         close_conn = True
     
@@ -186,7 +348,6 @@ def revoke_key(key, conn=None):
     close_conn = False
     
     if conn is None:
-        from app import get_db_connection
         conn = get_db_connection()
         close_conn = True
     
@@ -195,8 +356,8 @@ def revoke_key(key, conn=None):
         
         # Update key status to revoked
         cur.execute(
-            'UPDATE participant_keys SET status = %s WHERE key_value = %s',
-            ('revoked', key)
+            'UPDATE participant_keys SET status = %s, revoked_at = %s WHERE key_value = %s',
+            ('revoked', datetime.now(), key)
         )
         
         if cur.rowcount == 0:
@@ -215,13 +376,20 @@ def revoke_key(key, conn=None):
         if close_conn:
             conn.close()
 
-def get_keys_for_experiment(experiment_id, conn=None):
+def get_keys_for_experiment(experiment_id, conn=None, status=None, after_id=None, limit=None):
     """
-    Get all keys for a specific experiment.
+    Get the keys for a specific experiment, optionally one page at a time.
+    
+    Keys are ordered by id. To page through them, pass the id of the last
+    key of the previous page as ``after_id`` (keyset pagination), which
+    stays fast however deep the page is.
     
     Args:
         experiment_id (int): ID of the experiment
         conn (psycopg2.connection, optional): Database connection
+        status (str, optional): Only return keys with this status
+        after_id (int, optional): Only return keys with an id greater than this
+        limit (int, optional): Maximum number of keys to return
         
     Returns:
         list: List of key dictionaries with id, value, status, and timestamps
@@ -229,18 +397,33 @@ def get_keys_for_experiment(experiment_id, conn=None):
     close_conn = False
     
     if conn is None:
-        from app import get_db_connection
         conn = get_db_connection()
         close_conn = True
     
     try:
         cur = conn.cursor()
         
-        cur.execute(
-            'SELECT id, key_value, status, created_at, used_at FROM participant_keys '
-            'WHERE experiment_id = %s',
-            (experiment_id,)
+        query = (
+            'SELECT id, key_value, status, created_at, used_at, revoked_at FROM participant_keys '
+            'WHERE experiment_id = %s'
         )
+        params = [experiment_id]
+        
+        if status is not None:
+            query += ' AND status = %s'
+            params.append(status)
+        
+        if after_id is not None:
+            query += ' AND id > %s'
+            params.append(after_id)
+        
+        query += ' ORDER BY id'
+        
+        if limit is not None:
+            query += ' LIMIT %s'
+            params.append(limit)
+        
+        cur.execute(query, tuple(params))
         
         keys = []
         for row in cur.fetchall():
@@ -249,7 +432,8 @@ def get_keys_for_experiment(experiment_id, conn=None):
                 'key': row[1],
                 'status': row[2],
                 'created_at': row[3],
-                'used_at': row[4]
+                'used_at': row[4],
+                'revoked_at': row[5]
             })
         
         return keys
@@ -259,4 +443,112 @@ def get_keys_for_experiment(experiment_id, conn=None):
         return []
     finally:
         if close_conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+def get_key_status_counts(experiment_id, conn=None):
+    """
+    Count the keys of an experiment by status with a single GROUP BY.
+    
+    Args:
+        experiment_id (int): ID of the experiment
+        conn (psycopg2.connection, optional): Database connection
+        
+    Returns:
+        dict: Counts for 'unused', 'used' and 'revoked' (plus any other
+            status present), and their 'total'
+    """
+    close_conn = False
+    
+    if conn is None:
+        conn = get_db_connection()
+        close_conn = True
+    
+    try:
+        cur = conn.cursor()
+        
+        cur.execute(
+            'SELECT status, COUNT(*) FROM participant_keys '
+            'WHERE experiment_id = %s GROUP BY status',
+            (experiment_id,)
+        )
+        
+        counts = {'unused': 0, 'used': 0, 'revoked': 0}
+        for status, count in cur.fetchall():
+            counts[status] = count
+        counts['total'] = sum(counts.values())
+        
+        return counts
+        
+    except Exception as e:
+        logger.error(f"Error counting keys for experiment {experiment_id}: {e}")
+        return {'unused': 0, 'used': 0, 'revoked': 0, 'total': 0}
+    finally:
+        if close_conn:
+            conn.close()
+
+def count_keys(after_id=0, conn=None):
+    """
+    Count the keys of every experiment with an id above ``after_id``.
+    
+    Args:
+        after_id (int): Only count keys with a higher id
+        conn (psycopg2.connection, optional): Database connection
+        
+    Returns:
+        tuple: (count, highest id or None if there are no such keys)
+    """
+    close_conn = False
+    
+    if conn is None:
+        conn = get_db_connection()
+        close_conn = True
+    
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT COUNT(*), MAX(id) FROM participant_keys WHERE id > %s', (after_id,))
+        return cur.fetchone()
+    finally:
+        if close_conn:
+            conn.close()
+
+def iter_key_values(after_id, chunk_size, conn=None):
+    """
+    Stream the values of every key with an id above ``after_id``, in id order.
+    
+    Keys are read through a server-side cursor in one read-only transaction,
+    ``chunk_size`` rows per round trip.
+    
+    Args:
+        after_id (int): Only read keys with a higher id
+        chunk_size (int): Number of keys fetched per round trip
+        conn (psycopg2.connection, optional): Database connection
+        
+    Yields:
+        list: Up to ``chunk_size`` (id, key_value) pairs
+    """
+    close_conn = False
+    
+    if conn is None:
+        conn = get_db_connection()
+        close_conn = True
+    
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        cur = conn.cursor(name='key_values')
+        cur.itersize = chunk_size
+        cur.execute(
+            'SELECT id, key_value FROM participant_keys WHERE id > %s ORDER BY id',
+            (after_id,)
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    finally:
+        conn.rollback()
+        conn.autocommit = autocommit
+        if close_conn:
+            conn.close()
@@ -5,7 +5,6 @@ This script creates the initial admin user for the Experiment Platform.
 Run this script after setting up the database.
 """
 
-import os
 import logging
 import argparse
 from datetime import datetime
@@ -17,20 +16,10 @@ logging.basicConfig(level=logging.INFO,
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables
+# Load environment variables before the pool reads its settings
 load_dotenv()
 
-def get_db_connection():
-    """Create and return a connection to the PostgreSQL database."""
-    import psycopg2
-    conn = psycopg2.connect(
-        host=os.getenv('DB_HOST', 'db'),
-        database=os.getenv('DB_NAME', 'experiment_db'),
-        user=os.getenv('DB_USER', 'user'),
-        password=os.getenv('DB_PASSWORD', 'password')
-    )
-    conn.autocommit = True
-    return conn
+from app.db.pool import get_db_connection
 
 def create_admin_user(username, password, email=None):
     """
@@ -79,7 +68,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
     
     # Ensure database tables exist
-    from db.init_db import init_db
+    from app.db.init_db import init_db
     init_db()
     
     # Create the admin user
@@ -4,5 +4,6 @@ Database package initialization.
 This package contains modules for database access and initialization.
 """
 
-# Import init_db to make it available when importing the package
+# Import init_db and the connection pool to make them available when importing the package
+from .pool import get_db_connection, init_app, warm_pool, close_pool
 from .init_db import init_db
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+Instrumented database cursor.
+
+Every connection opened by the pool uses InstrumentedCursor, which times
+each ``execute``/``executemany`` call. Inside a request the number of
+queries and their total duration are added to ``g`` so the metrics
+middleware can report them per route.
+
+Each query is also recorded in ``query_log``: the normalized SQL text
+(literals and placeholders replaced by ``?``), parameter count, duration
+and row count go into a ring buffer of recent queries and into per-
+statement totals shown on the admin query page. Queries slower than
+SLOW_QUERY_MS are logged together with their EXPLAIN plan.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+from functools import lru_cache
+
+from psycopg2 import extensions, sql
+from flask import g, has_app_context
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Number of recent queries kept in the ring buffer
+QUERY_LOG_SIZE = int(os.getenv('QUERY_LOG_SIZE', 1000))
+
+# Queries slower than this many milliseconds are logged with their plan (0 disables)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+
+QueryRecord = namedtuple('QueryRecord', 'sql params duration rows at')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_VALUE_LIST = re.compile(r'\b(IN|VALUES)\s*\(\s*\?(?:\s*,\s*\?)+\s*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """
+    Reduce a query to its shape so that executions can be grouped.
+
+    Args:
+        query (str): SQL text as passed to ``execute``
+
+    Returns:
+        str: The query with literals and placeholders replaced by ``?``,
+            IN/VALUES lists collapsed to ``(...)`` and whitespace collapsed
+    """
+    text = _STRING_LITERAL.sub('?', query)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _VALUE_LIST.sub(r'\1 (...)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _param_count(vars):
+    """Number of parameters passed with a query."""
+    if vars is None:
+        return 0
+    try:
+        return len(vars)
+    except TypeError:
+        return 1
+
+
+class QueryLog:
+    """
+    Recent queries in a ring buffer plus running totals per normalized query.
+
+    Totals are kept separately from the ring buffer so that the top-N view
+    covers every query since the process started (or since ``reset``), not
+    just the last ``size`` ones.
+    """
+
+    def __init__(self, size=QUERY_LOG_SIZE):
+        self.recent = deque(maxlen=size)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, normalized, params, duration, rows):
+        """Add one executed query."""
+        self.recent.append(QueryRecord(normalized, params, duration, rows, time.time()))
+        with self._lock:
+            totals = self._totals.get(normalized)
+            if totals is None:
+                totals = self._totals[normalized] = [0, 0.0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] = max(totals[2], duration)
+            totals[3] += max(rows, 0)
+
+    def top(self, n=20, order_by='total_time'):
+        """
+        Return the ``n`` most expensive normalized queries.
+
+        Args:
+            n (int): Number of queries to return
+            order_by (str): 'total_time', 'calls', 'mean_time' or 'max_time'
+
+        Returns:
+            list: Dicts with sql, calls, total_time, mean_time, max_time and rows
+        """
+        with self._lock:
+            items = [(query, list(totals)) for query, totals in self._totals.items()]
+
+        stats = [
+            {
+                'sql': query,
+                'calls': calls,
+                'total_time': total,
+                'mean_time': total / calls,
+                'max_time': longest,
+                'rows': rows,
+            }
+            for query, (calls, total, longest, rows) in items
+        ]
+        stats.sort(key=lambda s: s[order_by], reverse=True)
+        return stats[:n]
+
+    def reset(self):
+        """Forget every recorded query."""
+        self.recent.clear()
+        with self._lock:
+            self._totals.clear()
+
+
+query_log = QueryLog()
+
+
+def _record_query(duration):
+    """Add one query and its duration to the current request's totals."""
+    if has_app_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + duration
+
+
+class InstrumentedCursor(extensions.cursor):
+    """A psycopg2 cursor that records how many queries it ran and for how long."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            self._record(query, vars, time.perf_counter() - start, failed)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            self._record(query, vars_list, time.perf_counter() - start, failed, explain=False)
+
+    def _query_text(self, query):
+        if isinstance(query, sql.Composable):
+            return query.as_string(self)
+        if isinstance(query, bytes):
+            return query.decode('utf-8', 'replace')
+        return query
+
+    def _record(self, query, vars, duration, failed, explain=True):
+        _record_query(duration)
+        try:
+            text = self._query_text(query)
+            normalized = normalize_sql(text)
+            query_log.record(normalized, _param_count(vars), duration, self.rowcount)
+
+            if not failed and SLOW_QUERY_MS > 0 and duration * 1000 >= SLOW_QUERY_MS:
+                plan = self._explain(text, vars) if explain else None
+                logger.warning(
+                    f"Slow query ({duration * 1000:.1f} ms, {self.rowcount} rows): {normalized}"
+                    + (f"\n{plan}" if plan else '')
+                )
+        except Exception as e:
+            logger.error(f"Error recording query: {e}")
+
+    def _explain(self, text, vars):
+        """
+        Return the plan of a query that just ran, or None if it can't be explained.
+
+        A plain cursor is used so the EXPLAIN itself is not recorded. Inside
+        an open transaction the EXPLAIN runs under a savepoint so that a
+        failure cannot abort the caller's transaction.
+        """
+        conn = self.connection
+        status = conn.get_transaction_status()
+        if status == extensions.TRANSACTION_STATUS_INERROR:
+            return None
+        in_transaction = status == extensions.TRANSACTION_STATUS_INTRANS
+
+        with conn.cursor(cursor_factory=extensions.cursor) as cur:
+            try:
+                if in_transaction:
+                    cur.execute('SAVEPOINT explain_slow_query')
+                cur.execute('EXPLAIN ' + text, vars)
+                plan = '\n'.join(row[0] for row in cur.fetchall())
+                if in_transaction:
+                    cur.execute('RELEASE SAVEPOINT explain_slow_query')
+                return plan
+            except Exception as e:
+                logger.debug(f"Could not explain slow query: {e}")
+                if in_transaction:
+                    cur.execute('ROLLBACK TO SAVEPOINT explain_slow_query')
+                elif not conn.autocommit:
+                    conn.rollback()
+                return None
@@ -0,0 +1,365 @@
+"""
+Versioned schema migrations.
+
+Each migration is a numbered list of SQL statements. Applied versions are
+recorded in the ``schema_migrations`` table, so running the migrations again
+only applies the ones that are new. Every statement is written to be
+idempotent as well (``IF NOT EXISTS``), which lets the runner adopt databases
+created by the old ``init_db()`` without failing on existing objects.
+
+To change the schema, append a new migration with the next version number.
+Never edit a migration that has already been released.
+"""
+
+import logging
+from datetime import datetime
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Key for the advisory lock that keeps concurrent workers from migrating at once
+MIGRATION_LOCK_ID = 727300
+
+# (version, name, statements)
+MIGRATIONS = [
+    (1, 'initial_schema', [
+        # Users table for admin access
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            email VARCHAR(100),
+            is_admin BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Experiments table
+        '''
+        CREATE TABLE IF NOT EXISTS experiments (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            description TEXT,
+            parameters JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER REFERENCES users(id),
+            active BOOLEAN DEFAULT TRUE
+        )
+        ''',
+        # Participant keys table
+        '''
+        CREATE TABLE IF NOT EXISTS participant_keys (
+            id SERIAL PRIMARY KEY,
+            experiment_id INTEGER REFERENCES experiments(id) ON DELETE CASCADE,
+            key_value VARCHAR(50) UNIQUE NOT NULL,
+            status VARCHAR(20) DEFAULT 'unused',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER REFERENCES users(id),
+            used_at TIMESTAMP,
+            revoked_at TIMESTAMP,
+            revoked_by INTEGER REFERENCES users(id)
+        )
+        ''',
+        # Participants table
+        '''
+        CREATE TABLE IF NOT EXISTS participants (
+            id SERIAL PRIMARY KEY,
+            key_id INTEGER REFERENCES participant_keys(id),
+            experiment_id INTEGER REFERENCES experiments(id),
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+        ''',
+        # Experiment sessions table
+        '''
+        CREATE TABLE IF NOT EXISTS experiment_sessions (
+            id SERIAL PRIMARY KEY,
+            participant_id INTEGER REFERENCES participants(id),
+            experiment_id INTEGER REFERENCES experiments(id),
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            data JSONB
+        )
+        ''',
+        # Experiment results table
+        '''
+        CREATE TABLE IF NOT EXISTS experiment_results (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER REFERENCES experiment_sessions(id),
+            participant_id INTEGER REFERENCES participants(id),
+            experiment_id INTEGER REFERENCES experiments(id),
+            result_data JSONB,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, 'hot_query_indexes', [
+        # Participant counts and listings per experiment
+        'CREATE INDEX IF NOT EXISTS idx_participants_experiment '
+        'ON participants (experiment_id)',
+        # Active participants only: the dashboard counts these on every load
+        'CREATE INDEX IF NOT EXISTS idx_participants_active '
+        'ON participants (experiment_id) WHERE completed_at IS NULL',
+        'CREATE INDEX IF NOT EXISTS idx_participants_completed_at '
+        'ON participants (completed_at) WHERE completed_at IS NOT NULL',
+        # Key listings and status counts per experiment
+        'CREATE INDEX IF NOT EXISTS idx_participant_keys_experiment_status '
+        'ON participant_keys (experiment_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_experiment_results_experiment '
+        'ON experiment_results (experiment_id)',
+        'CREATE INDEX IF NOT EXISTS idx_experiment_sessions_participant '
+        'ON experiment_sessions (participant_id)',
+    ]),
+    (3, 'admin_user_columns', [
+        # Columns the admin login and registration routes rely on
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS role VARCHAR(20) DEFAULT 'researcher'",
+        'ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login TIMESTAMP',
+        "UPDATE users SET role = 'admin' WHERE is_admin AND role = 'researcher'",
+        # Column read by the experiment results API
+        "ALTER TABLE participants ADD COLUMN IF NOT EXISTS participant_type VARCHAR(20) DEFAULT 'human'",
+    ]),
+    (4, 'experiment_rounds', [
+        '''
+        CREATE TABLE IF NOT EXISTS experiment_rounds (
+            id SERIAL PRIMARY KEY,
+            experiment_id INTEGER REFERENCES experiments(id) ON DELETE CASCADE,
+            round_number INTEGER NOT NULL,
+            status VARCHAR(20) DEFAULT 'pending',
+            started_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            UNIQUE (experiment_id, round_number)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS round_results (
+            id SERIAL PRIMARY KEY,
+            round_id INTEGER REFERENCES experiment_rounds(id) ON DELETE CASCADE,
+            results JSONB,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_experiment_rounds_experiment_status '
+        'ON experiment_rounds (experiment_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_round_results_round '
+        'ON round_results (round_id)',
+    ]),
+    (5, 'participant_keys_keyset_indexes', [
+        # Keyset pagination of key listings, with and without a status filter.
+        # (experiment_id, status, id) also serves the status counts, so it
+        # replaces the index from migration 2.
+        'CREATE INDEX IF NOT EXISTS idx_participant_keys_experiment_id '
+        'ON participant_keys (experiment_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_participant_keys_experiment_status_id '
+        'ON participant_keys (experiment_id, status, id)',
+        'DROP INDEX IF EXISTS idx_participant_keys_experiment_status',
+    ]),
+    # Versions 6 and 11 are not used: trigger-maintained per-experiment
+    # counters were added and withdrawn before release. Their numbers are
+    # not reused, since development databases may have recorded them.
+    (7, 'participant_sessions', [
+        '''
+        CREATE TABLE IF NOT EXISTS participant_sessions (
+            id VARCHAR(64) PRIMARY KEY,
+            data TEXT NOT NULL,
+            generation INTEGER NOT NULL DEFAULT 1,
+            expires_at TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_participant_sessions_expires ON participant_sessions (expires_at)',
+    ]),
+    (8, 'participant_decisions', [
+        '''
+        CREATE TABLE IF NOT EXISTS participant_decisions (
+            id SERIAL PRIMARY KEY,
+            decision_uid UUID NOT NULL UNIQUE,
+            participant_id INTEGER REFERENCES participants(id),
+            experiment_id INTEGER REFERENCES experiments(id),
+            round_number INTEGER NOT NULL,
+            decision VARCHAR(20) NOT NULL,
+            metadata JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_participant_decisions_participant '
+        'ON participant_decisions (participant_id, round_number)',
+    ]),
+    # Round data as one row per round instead of a growing rounds_data array
+    # in experiment_sessions.data; the view rebuilds the full document
+    (9, 'experiment_session_rounds', [
+        '''
+        CREATE TABLE IF NOT EXISTS experiment_session_rounds (
+            session_id INTEGER NOT NULL REFERENCES experiment_sessions(id) ON DELETE CASCADE,
+            round_number INTEGER NOT NULL,
+            data JSONB NOT NULL,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, round_number)
+        )
+        ''',
+        '''
+        INSERT INTO experiment_session_rounds (session_id, round_number, data, recorded_at)
+        SELECT s.id, r.round_number, r.data, COALESCE(s.completed_at, s.started_at)
+        FROM experiment_sessions s
+        CROSS JOIN LATERAL jsonb_array_elements(s.data->'rounds_data') WITH ORDINALITY AS r(data, round_number)
+        WHERE jsonb_typeof(s.data->'rounds_data') = 'array'
+        ON CONFLICT DO NOTHING
+        ''',
+        "UPDATE experiment_sessions SET data = data - 'rounds_data' WHERE data ? 'rounds_data'",
+        '''
+        CREATE OR REPLACE VIEW experiment_session_documents AS
+        SELECT s.id, s.participant_id, s.experiment_id, s.started_at, s.completed_at,
+               CASE WHEN r.rounds IS NULL THEN COALESCE(s.data, '{}'::jsonb)
+                    ELSE COALESCE(s.data, '{}'::jsonb) || jsonb_build_object('rounds_data', r.rounds)
+               END AS data
+        FROM experiment_sessions s
+        LEFT JOIN LATERAL (
+            SELECT jsonb_agg(data ORDER BY round_number) AS rounds
+            FROM experiment_session_rounds
+            WHERE session_id = s.id
+        ) r ON true
+        ''',
+    ]),
+    # Compact, typed decisions: the decision is coded as a SMALLINT (see
+    # app.storage.base.DECISIONS), round_number is a SMALLINT, and columns are
+    # ordered widest first so no alignment padding is wasted. A row with NULL
+    # metadata takes 40 bytes of data instead of 48-56 (plus the 24-byte tuple
+    # header either way). The table is append-only in time order, which makes
+    # a BRIN index on created_at a few pages in size.
+    #
+    # The rebuild only runs while participant_decisions still has the VARCHAR
+    # decision column, and the indexes use IF NOT EXISTS, so the migration can
+    # be re-run against a database that already has the compact table.
+    (10, 'compact_participant_decisions', [
+        # An unknown decision string fails the migration (NOT NULL) rather
+        # than being dropped silently
+        '''
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'participant_decisions'
+                  AND column_name = 'decision' AND data_type = 'character varying'
+            ) THEN
+                DROP TABLE IF EXISTS participant_decisions_compact;
+                CREATE TABLE participant_decisions_compact (
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    decision_uid UUID NOT NULL,
+                    id INTEGER GENERATED BY DEFAULT AS IDENTITY,
+                    participant_id INTEGER REFERENCES participants(id),
+                    experiment_id INTEGER REFERENCES experiments(id),
+                    round_number SMALLINT NOT NULL,
+                    decision SMALLINT NOT NULL,
+                    metadata JSONB,
+                    CONSTRAINT participant_decisions_compact_pkey PRIMARY KEY (id),
+                    CONSTRAINT participant_decisions_compact_uid_key UNIQUE (decision_uid)
+                );
+
+                INSERT INTO participant_decisions_compact
+                    (created_at, decision_uid, id, participant_id, experiment_id, round_number, decision, metadata)
+                SELECT COALESCE(created_at, CURRENT_TIMESTAMP), decision_uid, id, participant_id, experiment_id,
+                       round_number,
+                       CASE decision WHEN 'cooperate' THEN 0 WHEN 'defect' THEN 1 END,
+                       NULLIF(metadata, 'null'::jsonb)
+                FROM participant_decisions
+                ORDER BY id;
+
+                PERFORM setval(pg_get_serial_sequence('participant_decisions_compact', 'id'),
+                               COALESCE((SELECT MAX(id) FROM participant_decisions_compact), 0) + 1, false);
+
+                DROP TABLE participant_decisions;
+                ALTER TABLE participant_decisions_compact RENAME TO participant_decisions;
+                ALTER INDEX participant_decisions_compact_pkey RENAME TO participant_decisions_pkey;
+                ALTER INDEX participant_decisions_compact_uid_key RENAME TO participant_decisions_decision_uid_key;
+            END IF;
+        END
+        $$
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_participant_decisions_participant '
+        'ON participant_decisions (participant_id, round_number)',
+        # Per-round aggregates are answered by index-only scans
+        'CREATE INDEX IF NOT EXISTS idx_participant_decisions_experiment_round '
+        'ON participant_decisions (experiment_id, round_number) INCLUDE (decision)',
+        'CREATE INDEX IF NOT EXISTS idx_participant_decisions_created_brin '
+        'ON participant_decisions USING brin (created_at)',
+    ]),
+    # Decisions inserted without the decision log (manual fixes, imports)
+    # get a UUID too. gen_random_uuid() is built into PostgreSQL 13 and later.
+    (12, 'participant_decisions_uid_default', [
+        'ALTER TABLE participant_decisions ALTER COLUMN decision_uid SET DEFAULT gen_random_uuid()',
+    ]),
+]
+
+
+def get_applied_versions(cur):
+    """
+    Get the migration versions already applied to the database.
+
+    Args:
+        cur: Database cursor
+
+    Returns:
+        set: Applied version numbers
+    """
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cur.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cur.fetchall()}
+
+
+def run_migrations(conn, migrations=None):
+    """
+    Apply every migration that has not been applied yet, in version order.
+
+    Each migration runs in its own transaction together with its
+    ``schema_migrations`` row, so a failed migration leaves no trace and is
+    retried on the next run.
+
+    Args:
+        conn (psycopg2.connection): Database connection
+        migrations (list, optional): Migrations to apply (default: MIGRATIONS)
+
+    Returns:
+        list: Versions applied by this run
+    """
+    migrations = sorted(migrations or MIGRATIONS, key=lambda m: m[0])
+    applied_now = []
+    autocommit = conn.autocommit
+
+    cur = conn.cursor()
+    conn.autocommit = True
+    cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_ID,))
+    try:
+        applied = get_applied_versions(cur)
+        conn.autocommit = False
+
+        for version, name, statements in migrations:
+            if version in applied:
+                continue
+
+            logger.info(f"Applying migration {version:04d}_{name}")
+            try:
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    'INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)',
+                    (version, name, datetime.now())
+                )
+                conn.commit()
+            except Exception as e:
+                logger.error(f"Migration {version:04d}_{name} failed: {e}")
+                conn.rollback()
+                raise
+
+            applied_now.append(version)
+    finally:
+        conn.autocommit = True
+        cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+        conn.autocommit = autocommit
+
+    return applied_now
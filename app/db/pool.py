@@ -0,0 +1,364 @@
+"""
+Database connection pool.
+
+This module provides a single process-wide pool of PostgreSQL connections.
+Inside a Flask request the connection is checked out once, bound to ``g``
+and returned to the pool on teardown, so every query made while handling a
+request reuses the same connection. Outside a request (scripts, CLI
+commands) each call checks out a connection that goes back to the pool
+when it is closed.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+import psycopg2
+import psycopg2.pool
+from psycopg2 import extensions
+from flask import g, has_app_context
+
+from app.db.cursor import InstrumentedCursor
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Connection settings, taken from the environment and overridden by init_app()
+_settings = {
+    'host': os.getenv('DB_HOST', 'db'),
+    'database': os.getenv('DB_NAME', 'experiment_db'),
+    'user': os.getenv('DB_USER', 'user'),
+    'password': os.getenv('DB_PASSWORD', 'password'),
+    'minconn': int(os.getenv('DB_POOL_MIN', 2)),
+    'maxconn': int(os.getenv('DB_POOL_MAX', 20)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 60)),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of PostgreSQL connections.
+
+    Unlike ``psycopg2.pool.ThreadedConnectionPool`` this pool keeps every
+    idle connection instead of closing those above ``minconn``, and blocks
+    for up to ``timeout`` seconds when all ``maxconn`` connections are in use
+    rather than failing immediately. Connections are health-checked on
+    checkout: broken ones are discarded, and ones that sat idle for longer
+    than ``max_idle`` seconds are pinged before being handed out.
+    """
+
+    def __init__(self, minconn=2, maxconn=20, timeout=30.0, max_idle=60.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+        self.pid = os.getpid()
+        self.closed = False
+        self.connections_opened = 0
+
+        self._idle = deque()  # (connection, returned_at) pairs
+        self._size = 0  # Connections currently open, idle or checked out
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        """Open a new connection configured like the rest of the platform."""
+        conn = psycopg2.connect(cursor_factory=InstrumentedCursor, **self.connect_kwargs)
+        conn.autocommit = True
+        self.connections_opened += 1
+        return conn
+
+    def warm(self):
+        """Open connections until at least ``minconn`` are idle in the pool."""
+        with self._cond:
+            missing = min(self.minconn - len(self._idle), self.maxconn - self._size)
+            self._size += max(missing, 0)
+
+        opened = 0
+        try:
+            for _ in range(max(missing, 0)):
+                conn = self._connect()
+                opened += 1
+                with self._cond:
+                    self._idle.append((conn, time.monotonic()))
+                    self._cond.notify()
+        finally:
+            if opened < missing:
+                with self._cond:
+                    self._size -= missing - opened
+                    self._cond.notify()
+
+        logger.info(f"Connection pool warmed with {opened} new connections")
+        return opened
+
+    def _is_healthy(self, conn, idle_for):
+        """Check whether an idle connection can be handed out."""
+        if conn.closed:
+            return False
+
+        status = conn.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        if idle_for > self.max_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+            except psycopg2.Error:
+                return False
+
+        return True
+
+    def _discard(self, conn):
+        """Close a connection and free its slot."""
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        """
+        Check out a connection, opening a new one if the pool is not full.
+
+        Returns:
+            psycopg2.connection: A healthy connection in autocommit mode
+
+        Raises:
+            PoolTimeout: If no connection is available within ``timeout``
+        """
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            with self._cond:
+                if self.closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"({self.maxconn} in use)"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    conn, returned_at = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, time.monotonic() - returned_at):
+                return conn
+
+            logger.warning("Discarding broken pooled database connection")
+            self._discard(conn)
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn (psycopg2.connection): Connection obtained from getconn()
+            discard (bool): Close the connection instead of keeping it
+        """
+        if self.closed or discard or conn.closed:
+            self._discard(conn)
+            return
+
+        try:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if not conn.autocommit:
+                conn.autocommit = True
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self):
+        """Return the current pool occupancy."""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'opened': self.connections_opened,
+                'min': self.minconn,
+                'max': self.maxconn,
+            }
+
+
+class PooledConnection:
+    """
+    Proxy around a pooled connection.
+
+    Calling ``close()`` returns the connection to the pool instead of closing
+    it. Request-scoped connections ignore ``close()`` altogether; they are
+    released by the app-context teardown once the request is finished.
+    Everything else is forwarded to the underlying psycopg2 connection.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_request_scoped', request_scoped)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def close(self):
+        """Give the connection back to the pool (no-op when request-scoped)."""
+        if self._request_scoped:
+            return
+        self.release()
+
+    def release(self, discard=False):
+        """Return the underlying connection to the pool."""
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._pool.putconn(conn, discard=discard)
+
+
+def init_app(app):
+    """
+    Configure the pool from the app config and register the teardown hook.
+
+    Args:
+        app: The Flask application instance
+    """
+    _settings.update(
+        host=app.config['DATABASE_HOST'],
+        database=app.config['DATABASE_NAME'],
+        user=app.config['DATABASE_USER'],
+        password=app.config['DATABASE_PASSWORD'],
+        minconn=app.config['DATABASE_POOL_MIN'],
+        maxconn=app.config['DATABASE_POOL_MAX'],
+        timeout=app.config['DATABASE_POOL_TIMEOUT'],
+        max_idle=app.config['DATABASE_POOL_MAX_IDLE'],
+    )
+    app.teardown_appcontext(release_db_connection)
+
+
+def get_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    A pool inherited through ``fork()`` is never reused: its sockets belong
+    to the parent, so the child builds a fresh one.
+    """
+    global _pool
+
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid() and not pool.closed:
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid() or _pool.closed:
+            settings = dict(_settings)
+            _pool = ConnectionPool(
+                minconn=settings.pop('minconn'),
+                maxconn=settings.pop('maxconn'),
+                timeout=settings.pop('timeout'),
+                max_idle=settings.pop('max_idle'),
+                **settings
+            )
+        return _pool
+
+
+def warm_pool():
+    """Pre-open the minimum number of pooled connections."""
+    return get_pool().warm()
+
+
+def close_pool():
+    """Close the process-wide pool, e.g. on shutdown."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def get_db_connection():
+    """
+    Get a connection to the PostgreSQL database from the pool.
+
+    Within an application context the same connection is returned for the
+    whole request and released on teardown. Otherwise a new checkout is
+    made, which must be closed by the caller to return it to the pool.
+
+    Returns:
+        PooledConnection: Connection proxy in autocommit mode
+    """
+    if has_app_context():
+        conn = g.get('db_conn')
+        if conn is None:
+            pool = get_pool()
+            conn = g.db_conn = PooledConnection(pool, pool.getconn(), request_scoped=True)
+        return conn
+
+    pool = get_pool()
+    return PooledConnection(pool, pool.getconn())
+
+
+def release_db_connection(exception=None):
+    """Return the request-scoped connection to the pool, if one was used."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
@@ -3,12 +3,19 @@ Experiments package initialization.
 
 This module provides functions to discover and register experiment modules.
 Experiment modules are dynamically loaded and registered with the Flask app.
+Built-in modules and installed entry-point plugins are listed in a cached
+manifest (see manifest.py).
 """
 
 import os
+import ast
 import importlib
 import logging
-from flask import Blueprint
+import threading
+
+import click
+from flask import Flask, Blueprint, current_app, request, has_request_context
+from flask.cli import with_appcontext
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -16,6 +23,9 @@ logger = logging.getLogger(__name__)
 # Dictionary to store registered experiment modules
 _experiments = {}
 
+# Experiment plugins known by their metadata, by experiment type (lazy mode)
+_plugins = {}
+
 def register_experiment(experiment_type, module):
     """
     Register an experiment module.
@@ -39,28 +49,47 @@ def get_available_experiments():
     """
     return _experiments
 
-def register_experiment_routes(app):
+def get_experiment_manifest(app, rebuild=False):
+    """
+    Get the plugin manifest of the app, rebuilding it if packages changed.
+    
+    Args:
+        app: The Flask application instance
+        rebuild (bool): Rebuild even if the cached manifest is current
+        
+    Returns:
+        dict: The manifest (see app/experiments/manifest.py)
+    """
+    from app.experiments.manifest import MANIFEST_NAME, load_manifest
+    path = app.config.get('EXPERIMENT_MANIFEST') or os.path.join(app.instance_path, MANIFEST_NAME)
+    return load_manifest(path, rebuild=rebuild)
+
+def register_experiment_routes(app, plugins=None):
     """
     Register all experiment routes with the Flask app.
     
+    Experiments are taken from the cached plugin manifest, which covers the
+    built-in modules and installed entry-point plugins.
+    
     Args:
         app: The Flask application instance
+        plugins (list): Plugin metadata dicts (default: from the manifest)
     """
-    logger.info("Registering experiment routes...")
+    if plugins is None:
+        plugins = get_experiment_manifest(app)['plugins']
     
-    experiments_path = os.path.dirname(__file__)
+    if app.config.get('EXPERIMENT_LOADING') == 'lazy':
+        register_lazy_experiment_routes(app, plugins)
+        return
     
-    # Loop through all Python modules in the experiments directory
-    for filename in os.listdir(experiments_path):
-        # Skip __init__.py and non-Python files
-        if filename == "__init__.py" or not filename.endswith(".py"):
-            continue
-        
-        module_name = filename[:-3]  # Remove .py extension
+    logger.info("Registering experiment routes...")
+    
+    for plugin in plugins:
+        module_name = plugin['module_name']
         
         try:
             # Import the module
-            module = importlib.import_module(f"experiments.{module_name}")
+            module = importlib.import_module(module_name)
             
             # Check if the module has the required register_blueprint function
             if hasattr(module, "register_blueprint"):
@@ -69,14 +98,7 @@ def register_experiment_routes(app):
                 if isinstance(blueprint, Blueprint):
                     # Register the blueprint with the app
                     app.register_blueprint(blueprint)
-                    
-                    # Register the experiment type if it defines one
-                    if hasattr(module, "EXPERIMENT_TYPE"):
-                        register_experiment(module.EXPERIMENT_TYPE, module)
-                    else:
-                        # Use the module name as the experiment type
-                        register_experiment(module_name, module)
-                        
+                    register_experiment(plugin['experiment_type'], module)
                     logger.info(f"Registered experiment blueprint: {module_name}")
                 else:
                     logger.warning(f"Module {module_name} register_blueprint() didn't return a Blueprint")
@@ -86,4 +108,239 @@ def register_experiment_routes(app):
         except Exception as e:
             logger.error(f"Error registering experiment module {module_name}: {e}")
     
-    logger.info(f"Registered {len(_experiments)} experiment modules")
\ No newline at end of file
+    logger.info(f"Registered {len(_experiments)} experiment modules")
+
+def read_plugin_metadata(path, package=__name__, default_type=None):
+    """
+    Read an experiment module's metadata without importing it.
+    
+    Module-level string constants EXPERIMENT_TYPE and URL_PREFIX are read
+    from the source. The type defaults to ``default_type`` or the module
+    name, and the prefix to ``/<type>``.
+    
+    Args:
+        path (str): Path of the module's source file
+        package (str): Package the module is imported from
+        default_type (str): Experiment type if the module doesn't set one
+        
+    Returns:
+        dict: experiment_type, url_prefix and module_name
+    """
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    metadata = {'EXPERIMENT_TYPE': default_type or module_name, 'URL_PREFIX': None}
+    
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or not isinstance(node.value, ast.Constant):
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name) and target.id in metadata and isinstance(node.value.value, str):
+                metadata[target.id] = node.value.value
+    
+    experiment_type = metadata['EXPERIMENT_TYPE']
+    return {
+        'experiment_type': experiment_type,
+        'url_prefix': (metadata['URL_PREFIX'] or f'/{experiment_type}').rstrip('/'),
+        'module_name': f"{package}.{module_name}",
+    }
+
+
+class ExperimentPlugin:
+    """
+    An experiment module whose import is deferred until first use.
+    
+    Only the metadata read by read_plugin_metadata() is held until the
+    first request under ``url_prefix``; that request imports the module and
+    builds a Flask app serving just the experiment's blueprint.
+    """
+    
+    def __init__(self, experiment_type, url_prefix, module_name, version=None, distribution=None):
+        self.experiment_type = experiment_type
+        self.url_prefix = url_prefix
+        self.module_name = module_name
+        self.version = version
+        self.distribution = distribution
+        self.app = None
+        self.blueprint = None
+        self.error = None
+        self._lock = threading.Lock()
+    
+    def matches(self, path):
+        """Check whether a request path belongs to this experiment."""
+        return path == self.url_prefix or path.startswith(self.url_prefix + '/')
+    
+    def load(self, parent):
+        """
+        Import the module and build its app, once.
+        
+        Args:
+            parent: The platform's Flask app, whose configuration, extensions,
+                request hooks and error handlers the experiment app shares
+                
+        Returns:
+            Flask: The experiment app, or None if the module failed to load
+        """
+        if self.app is not None or self.error is not None:
+            return self.app
+        
+        with self._lock:
+            if self.app is None and self.error is None:
+                try:
+                    module = importlib.import_module(self.module_name)
+                    blueprint = module.register_blueprint()
+                    if not isinstance(blueprint, Blueprint):
+                        raise TypeError('register_blueprint() did not return a Blueprint')
+                    self.app = _create_experiment_app(parent, blueprint)
+                    self.blueprint = blueprint
+                    register_experiment(self.experiment_type, module)
+                except Exception as e:
+                    self.error = e
+                    logger.error(f"Error loading experiment module {self.module_name}: {e}")
+        return self.app
+    
+    def url_for(self, parent, endpoint, **values):
+        """
+        Build a URL for one of the experiment's endpoints, loading it if needed.
+        
+        Args:
+            parent: The platform's Flask app
+            endpoint (str): Endpoint within the blueprint, e.g. 'start'
+            
+        Returns:
+            str: The URL, or None if the experiment could not be loaded
+        """
+        app = self.load(parent)
+        if app is None:
+            return None
+        script_name = request.script_root if has_request_context() else '/'
+        adapter = app.url_map.bind('localhost', script_name=script_name or '/')
+        return adapter.build(f'{self.blueprint.name}.{endpoint}', values)
+
+
+def _create_experiment_app(parent, blueprint):
+    """Build a Flask app for one blueprint that behaves like ``parent``."""
+    app = Flask(parent.import_name, root_path=parent.root_path, instance_path=parent.instance_path)
+    app.config.update(parent.config)
+    app.extensions.update(parent.extensions)
+    app.session_interface = parent.session_interface
+    app.json = parent.json
+    
+    # Share app-wide hooks (pool teardown, metrics, context processors, error pages)
+    app.before_request_funcs.setdefault(None, []).extend(parent.before_request_funcs.get(None, []))
+    app.after_request_funcs.setdefault(None, []).extend(parent.after_request_funcs.get(None, []))
+    app.teardown_request_funcs.setdefault(None, []).extend(parent.teardown_request_funcs.get(None, []))
+    app.teardown_appcontext_funcs.extend(parent.teardown_appcontext_funcs)
+    app.template_context_processors[None].extend(
+        f for f in parent.template_context_processors[None] if f not in app.template_context_processors[None]
+    )
+    for code, handlers in parent.error_handler_spec.get(None, {}).items():
+        app.error_handler_spec[None][code].update(handlers)
+    
+    # The experiment app only has the blueprint's routes; build URLs for the
+    # platform's own endpoints (url_for('home') etc.) from the parent's url_map
+    app.url_build_error_handlers.append(
+        lambda error, endpoint, values: _build_parent_url(parent, endpoint, values)
+    )
+    
+    app.register_blueprint(blueprint)
+    return app
+
+
+def _build_parent_url(parent, endpoint, values):
+    """
+    Build a URL for an endpoint of the platform app.
+    
+    Args:
+        parent: The platform's Flask app
+        endpoint (str): The endpoint that the experiment app could not build
+        values (dict): The url_for arguments, including _anchor, _method,
+            _scheme and _external
+        
+    Returns:
+        str: The URL (raises BuildError if the parent has no such endpoint)
+    """
+    values = dict(values)
+    anchor = values.pop('_anchor', None)
+    method = values.pop('_method', None)
+    scheme = values.pop('_scheme', None)
+    external = values.pop('_external', None)
+    
+    adapter = parent.create_url_adapter(request if has_request_context() else None)
+    parent.inject_url_defaults(endpoint, values)
+    url = adapter.build(endpoint, values, method=method, url_scheme=scheme, force_external=external)
+    if anchor is not None:
+        url = f"{url}#{anchor}"
+    return url
+
+
+class LazyExperimentDispatcher:
+    """
+    WSGI middleware sending requests under an experiment's URL prefix to
+    that experiment's app, which is built on the first such request.
+    """
+    
+    def __init__(self, app, wsgi_app, plugins):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.plugins = plugins
+    
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        for plugin in self.plugins:
+            if plugin.matches(path):
+                experiment_app = plugin.load(self.app)
+                if experiment_app is not None:
+                    return experiment_app.wsgi_app(environ, start_response)
+                break
+        return self.wsgi_app(environ, start_response)
+
+
+def register_lazy_experiment_routes(app, plugins):
+    """
+    Register experiment metadata now and defer module imports to first use.
+    
+    Args:
+        app: The Flask application instance
+        plugins (list): Plugin metadata dicts from the manifest
+    """
+    for metadata in plugins:
+        experiment_type = metadata['experiment_type']
+        if experiment_type in _plugins:
+            logger.warning(f"Experiment type '{experiment_type}' already registered. Overwriting.")
+        _plugins[experiment_type] = ExperimentPlugin(**metadata)
+        logger.info(f"Registered lazy experiment plugin: {experiment_type} at {metadata['url_prefix']}")
+    
+    app.wsgi_app = LazyExperimentDispatcher(app, app.wsgi_app, list(_plugins.values()))
+    logger.info(f"Registered {len(_plugins)} lazy experiment plugins")
+
+
+def get_experiment_plugin(experiment_type):
+    """
+    Get the lazily loaded plugin for an experiment type.
+    
+    Returns:
+        ExperimentPlugin: The plugin, or None if the type is unknown
+    """
+    return _plugins.get(experiment_type)
+
+
+@click.group('experiments')
+def experiments_cli():
+    """Manage experiment plugins."""
+
+
+@experiments_cli.command('list')
+@click.option('--rebuild', is_flag=True, help='Rediscover plugins even if the manifest is current')
+@with_appcontext
+def list_command(rebuild):
+    """List the experiment plugins in the manifest."""
+    for plugin in get_experiment_manifest(current_app, rebuild=rebuild)['plugins']:
+        source = f"{plugin['distribution']} {plugin['version']}" if plugin['distribution'] else 'built-in'
+        click.echo(f"{plugin['experiment_type']}\t{plugin['url_prefix']}\t{plugin['module_name']}\t{source}")
+
+
+def init_app(app):
+    """Register the experiment CLI commands with the Flask app."""
+    app.cli.add_command(experiments_cli)
@@ -0,0 +1,182 @@
+"""
+Experiment Plugin Manifest
+
+Experiment modules are found in two places: the built-in modules of the
+app.experiments package, and installed distributions that declare an entry
+point in the ``umdad_platform.experiments`` group, e.g. in pyproject.toml:
+
+    [project.entry-points."umdad_platform.experiments"]
+    public_goods = "umdad_public_goods.game"
+
+The entry point's name is the experiment type and its value the module.
+Discovering plugins means reading package metadata and every module's
+source, so the result is written to a JSON manifest in the instance folder
+and reused until the installed packages change. Changes are detected from
+the modification times of the directories on sys.path and of the built-in
+experiments package: one stat call per directory, none per plugin.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import importlib.util
+from importlib import metadata
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Entry point group third-party experiment packages register under
+ENTRY_POINT_GROUP = 'umdad_platform.experiments'
+
+# File name of the manifest in the instance folder
+MANIFEST_NAME = 'experiment_plugins.json'
+
+# Bump when the manifest format changes
+MANIFEST_VERSION = 1
+
+# Package and directory of the built-in experiment modules
+BUILTIN_PACKAGE = 'app.experiments'
+BUILTIN_PATH = os.path.dirname(__file__)
+
+
+def installed_fingerprint(builtin_path=BUILTIN_PATH):
+    """
+    Fingerprint the set of installed packages and built-in experiments.
+
+    Installing, upgrading or removing a distribution changes the mtime of
+    its site-packages directory, and adding a built-in module changes the
+    mtime of the experiments directory.
+
+    Returns:
+        str: A hex digest
+    """
+    digest = hashlib.sha1(f'{MANIFEST_VERSION}:{sys.version}'.encode())
+    for path in [builtin_path] + sys.path:
+        try:
+            mtime = os.stat(path or '.').st_mtime_ns
+        except OSError:
+            continue
+        digest.update(f'{path}:{mtime}\n'.encode())
+    return digest.hexdigest()
+
+
+def _entry_points():
+    """Entry points of the experiment group (Python 3.9 and 3.10+ APIs)."""
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))
+
+
+def scan_builtin(path=BUILTIN_PATH, package=BUILTIN_PACKAGE):
+    """
+    Read the metadata of the experiment modules in a package directory.
+
+    Returns:
+        list: Plugin metadata dicts
+    """
+    from app.experiments import read_plugin_metadata
+
+    plugins = []
+    for filename in sorted(os.listdir(path)):
+        if filename.startswith('_') or not filename.endswith('.py') or filename == 'manifest.py':
+            continue
+        try:
+            plugin = read_plugin_metadata(os.path.join(path, filename), package)
+        except Exception as e:
+            logger.error(f"Error reading experiment module {filename}: {e}")
+            continue
+        plugin.update(version=None, distribution=None)
+        plugins.append(plugin)
+    return plugins
+
+
+def scan_entry_points():
+    """
+    Read the metadata of experiments registered through entry points.
+
+    Locating an entry point's module imports its parent package, so this
+    only runs when the manifest is rebuilt.
+
+    Returns:
+        list: Plugin metadata dicts
+    """
+    from app.experiments import read_plugin_metadata
+
+    plugins = []
+    for entry_point in _entry_points():
+        module_name = entry_point.value.split(':')[0].strip()
+        dist = getattr(entry_point, 'dist', None)
+        try:
+            spec = importlib.util.find_spec(module_name)
+            if spec is None or not spec.origin or not spec.origin.endswith('.py'):
+                raise ImportError(f"no source file for module {module_name}")
+            # The entry point name is the type unless the module sets one itself
+            plugin = read_plugin_metadata(spec.origin, default_type=entry_point.name)
+        except Exception as e:
+            logger.error(f"Error reading experiment plugin {entry_point.name}: {e}")
+            continue
+
+        plugin.update(
+            module_name=module_name,
+            version=dist.version if dist else None,
+            distribution=dist.metadata['Name'] if dist else None,
+        )
+        plugins.append(plugin)
+    return plugins
+
+
+def build_manifest(builtin_path=BUILTIN_PATH, builtin_package=BUILTIN_PACKAGE):
+    """
+    Discover every experiment plugin.
+
+    Installed plugins come after built-in modules, so they take precedence
+    when both declare the same experiment type.
+
+    Returns:
+        dict: The manifest, with its fingerprint and plugin list
+    """
+    return {
+        'version': MANIFEST_VERSION,
+        'fingerprint': installed_fingerprint(builtin_path),
+        'plugins': scan_builtin(builtin_path, builtin_package) + scan_entry_points(),
+    }
+
+
+def load_manifest(path, builtin_path=BUILTIN_PATH, builtin_package=BUILTIN_PACKAGE, rebuild=False):
+    """
+    Load the cached manifest, rebuilding it if installed packages changed.
+
+    Args:
+        path (str): Manifest file
+        rebuild (bool): Rebuild even if the cached manifest is current
+
+    Returns:
+        dict: The manifest
+    """
+    fingerprint = installed_fingerprint(builtin_path)
+
+    if not rebuild:
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION and manifest.get('fingerprint') == fingerprint:
+                return manifest
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable experiment manifest {path}: {e}")
+
+    manifest = build_manifest(builtin_path, builtin_package)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+        logger.info(f"Wrote experiment manifest with {len(manifest['plugins'])} plugins to {path}")
+    except OSError as e:
+        logger.warning(f"Could not write experiment manifest {path}: {e}")
+    return manifest
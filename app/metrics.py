@@ -0,0 +1,248 @@
+"""
+Request Metrics
+
+This module records per-request measurements and renders them in the
+Prometheus text exposition format:
+
+    umdad_http_requests_total             requests by route, method and status
+    umdad_http_request_duration_seconds   latency histogram by route and method
+    umdad_http_response_size_bytes        response size histogram by route
+    umdad_db_queries_per_request          histogram of queries issued per request
+    umdad_db_query_seconds_total          time spent in the database by route
+    umdad_db_connections_opened_total     connections opened by the pool
+    umdad_db_pool_connections             pool connections by state
+
+Query counts and times come from the pool's InstrumentedCursor (see
+app/db/cursor.py). Metrics live in process memory, so with several worker
+processes every worker reports its own totals.
+"""
+
+import time
+import bisect
+import logging
+import threading
+
+from flask import g, request
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Label used for requests that matched no route (404s, static misses)
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def _format_labels(names, values):
+    """Render a label set as ``{name="value",...}``."""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects."""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield self.name, self.labels, label_values, value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        labels = self.labels + ('le',)
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', labels, label_values + (_format_value(bound),), cumulative
+            yield self.name + '_bucket', labels, label_values + ('+Inf',), count
+            yield self.name + '_sum', self.labels, label_values, total
+            yield self.name + '_count', self.labels, label_values, count
+
+
+class Gauge:
+    """
+    A value read from a callback at render time.
+
+    ``kind`` can be set to 'counter' for totals that are owned elsewhere,
+    such as the pool's count of opened connections.
+    """
+
+    def __init__(self, name, help_text, labels, collect, kind='gauge'):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        for label_values, value in self.collect():
+            yield self.name, self.labels, label_values, value
+
+
+class Registry:
+    """An ordered collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+            str: The exposition text
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                for name, label_names, label_values, value in metric.samples():
+                    lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+def _pool_samples():
+    """Pool connection counts by state, or nothing before the pool exists."""
+    from app.db import pool
+    if pool._pool is None:
+        return []
+    stats = pool._pool.stats()
+    return [(('idle',), stats['idle']), (('in_use',), stats['in_use'])]
+
+
+def _connections_opened():
+    from app.db import pool
+    if pool._pool is None:
+        return []
+    return [((), pool._pool.connections_opened)]
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    'umdad_http_requests_total', 'HTTP requests handled.', ('route', 'method', 'status')))
+request_duration = registry.register(Histogram(
+    'umdad_http_request_duration_seconds', 'Time spent handling a request.', ('route', 'method')))
+response_size = registry.register(Histogram(
+    'umdad_http_response_size_bytes', 'Size of response bodies with a known length.', ('route',),
+    buckets=SIZE_BUCKETS))
+db_queries = registry.register(Histogram(
+    'umdad_db_queries_per_request', 'Database queries issued per request.', ('route',),
+    buckets=QUERY_COUNT_BUCKETS))
+db_time = registry.register(Counter(
+    'umdad_db_query_seconds_total', 'Time spent executing database queries.', ('route',)))
+registry.register(Gauge(
+    'umdad_db_connections_opened_total', 'Connections opened by this process\'s pool.', (),
+    _connections_opened, kind='counter'))
+registry.register(Gauge(
+    'umdad_db_pool_connections', 'Pooled connections by state.', ('state',), _pool_samples))
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def _record_request(response):
+    """Record the finished request; never lets a metrics error break a response."""
+    try:
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+
+        route = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+        method = request.method
+
+        requests_total.inc(1, route, method, str(response.status_code))
+        request_duration.observe(time.perf_counter() - start, route, method)
+        db_queries.observe(g.get('db_queries', 0), route)
+        db_time.inc(g.get('db_time', 0.0), route)
+
+        # Streamed responses have no length up front and are left out
+        if not response.is_streamed:
+            response_size.observe(response.calculate_content_length() or 0, route)
+    except Exception as e:
+        logger.error(f"Error recording request metrics: {e}")
+    return response
+
+
+def init_app(app):
+    """
+    Record metrics for every request handled by the app.
+
+    Args:
+        app: Flask application
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+
+
+def render_metrics():
+    """Return all metrics in the Prometheus text format."""
+    return registry.render()
@@ -0,0 +1,119 @@
+"""
+Production Server
+
+Runs the platform under gunicorn's pre-forking server instead of the
+single-threaded Werkzeug development server:
+
+    python run.py serve --workers 4 --threads 8
+
+The app is created once in the master process (``preload_app``) so that
+workers fork with the application and the key filter already in memory.
+The master closes its database pool before forking and every worker opens
+its own after the fork. Workers are recycled after ``max_requests``
+requests (with jitter, so they do not all restart at once), and SIGTERM
+lets in-flight requests finish for up to ``graceful_timeout`` seconds.
+"""
+
+import os
+import logging
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def default_options():
+    """
+    Server options from environment variables.
+
+    Returns:
+        dict: gunicorn settings
+    """
+    return {
+        'bind': f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}",
+        'workers': int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1)),
+        'threads': int(os.getenv('WEB_THREADS', 4)),
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', 1000)),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', 100)),
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30)),
+        'timeout': int(os.getenv('WEB_TIMEOUT', 60)),
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', 5)),
+    }
+
+
+def when_ready(server):
+    """Close the master's connections so no worker inherits a socket."""
+    from app.db import close_pool
+    close_pool()
+
+
+def post_fork(server, worker):
+    """Give the new worker its own database pool, key filter refresher and decision log."""
+    from app.db import close_pool, warm_pool
+    from app.auth.key_filter import start_key_filter_refresher
+    from app.storage.decision_log import start_decision_log
+    # The inherited pool belongs to the master's pid, so this only drops it
+    close_pool()
+    try:
+        warm_pool()
+    except Exception as e:
+        logger.warning(f"Worker {worker.pid} could not pre-warm the database pool: {e}")
+    # Picks up keys created by other workers; threads do not survive the fork
+    start_key_filter_refresher()
+    # Replays decisions a crashed worker left behind, before any request
+    start_decision_log(worker.app.application.extensions['storage'])
+
+
+def worker_exit(server, worker):
+    """Flush buffered decisions and close the pool once the worker has drained."""
+    from app.db import close_pool
+    from app.storage.decision_log import close_decision_log
+    close_decision_log()
+    close_pool()
+
+
+class PlatformServer(BaseApplication):
+    """A gunicorn application serving an already created Flask app."""
+
+    def __init__(self, app, options=None):
+        self.application = app
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        config = dict(self.options)
+        config.setdefault('preload_app', True)
+        config.setdefault('when_ready', when_ready)
+        config.setdefault('post_fork', post_fork)
+        config.setdefault('worker_exit', worker_exit)
+
+        # Threads only take effect with the threaded worker class
+        if config.get('threads', 1) > 1:
+            config.setdefault('worker_class', 'gthread')
+
+        for key, value in config.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+
+def serve(app, **options):
+    """
+    Serve ``app`` under gunicorn until the master is stopped.
+
+    Args:
+        app: Flask application, created before the workers fork
+        **options: gunicorn settings overriding default_options()
+    """
+    config = default_options()
+    config.update({key: value for key, value in options.items() if value is not None})
+
+    logger.info(
+        f"Starting Experiment Platform on {config['bind']} with {config['workers']} workers "
+        f"x {config['threads']} threads"
+    )
+    PlatformServer(app, config).run()
@@ -0,0 +1,294 @@
+"""
+Server-Side Sessions
+
+Flask's default session is a signed cookie holding the whole session, so
+every request uploads, verifies and re-serializes the participant's full
+round history, and long experiments outgrow the 4KB cookie limit. This
+session interface keeps session data on the server instead:
+
+- The cookie holds only an opaque token: a random session ID plus a
+  generation number that goes up on every write.
+- Each worker keeps recently used sessions in an in-process LRU cache,
+  keyed by session ID and valid for the generation the cookie names or a
+  later one. A worker whose copy is older than the cookie therefore
+  reloads from the database instead of serving stale data.
+- A cookie that is behind the stored generation (concurrent requests, a
+  second tab, a response that never arrived) still loads the session, at
+  its stored generation, and the response brings the cookie up to date.
+- Saves are optimistic: a write only succeeds if the stored session is
+  still at the generation it was loaded at. A request that lost the race
+  to a concurrent one does not overwrite it; its changes are dropped.
+- The session ID is rotated whenever the identity the session carries
+  (participant_id or admin_id) changes, and the old row is deleted, so an
+  ID planted before key redemption or admin login is worthless afterwards.
+- Sessions are stored through the storage backend (participant_sessions).
+- Writes are dirty-tracked by comparing a digest of the serialized session
+  with the one it was loaded with, which also catches nested changes such
+  as appending to ``rounds_data``. Unchanged sessions are not written,
+  except to extend their expiry once half of their lifetime has passed.
+"""
+
+import os
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Sessions each worker keeps in memory
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 10000))
+
+# Session keys identifying who the session belongs to; changing any of
+# them issues a new session ID
+IDENTITY_KEYS = ('participant_id', 'admin_id')
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+
+def _identity(data):
+    return tuple(data.get(key) for key in IDENTITY_KEYS)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """A session whose data lives on the server."""
+
+    def __init__(self, initial=None, sid=None, generation=0, digest=None, expires_at=None,
+                 cookie_generation=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.generation = generation
+        self.digest = digest
+        self.expires_at = expires_at
+        # Generation named by the request's cookie, if older than the session
+        self.cookie_generation = cookie_generation if cookie_generation is not None else generation
+        # Identity the session was loaded with, compared on save
+        self.identity = _identity(initial or {})
+        self.modified = False
+        self.accessed = False
+
+    # Track reads like Flask's cookie session, so untouched sessions are skipped
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class SessionCache:
+    """A thread-safe LRU cache of serialized sessions."""
+
+    def __init__(self, capacity=SESSION_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid, generation):
+        """
+        Get a cached session if it is at the given generation or a later one.
+
+        Returns:
+            tuple: (data, generation, expires_at) or None
+        """
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None or entry[0] < generation:
+                return None
+            self._entries.move_to_end(sid)
+            return entry[1], entry[0], entry[2]
+
+    def put(self, sid, generation, data, expires_at):
+        with self._lock:
+            self._entries[sid] = (generation, data, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ServerSessionInterface(SessionInterface):
+    """Stores sessions through the app's storage backend."""
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, cache_size=SESSION_CACHE_SIZE):
+        self.cache = SessionCache(cache_size)
+
+    def _storage(self, app):
+        return app.extensions['storage']
+
+    def _parse_cookie(self, value):
+        """Split a cookie value into (sid, generation), or None if malformed."""
+        sid, _, generation = (value or '').partition('.')
+        if not sid or not generation.isdigit():
+            return None
+        return sid, int(generation)
+
+    def _load(self, app, sid, generation):
+        """Get (data, generation, expires_at) from the cache or the database."""
+        cached = self.cache.get(sid, generation)
+        if cached is not None:
+            data, cached_generation, expires_at = cached
+            if expires_at > datetime.now():
+                return data, cached_generation, expires_at
+            self.cache.discard(sid)
+            return None
+
+        # A cookie behind storage loads the stored generation
+        stored = self._storage(app).load_participant_session(sid)
+        if stored is None:
+            return None
+        self.cache.put(sid, stored['generation'], stored['data'], stored['expires_at'])
+        return stored['data'], stored['generation'], stored['expires_at']
+
+    def open_session(self, app, request):
+        cookie = self._parse_cookie(request.cookies.get(self.get_cookie_name(app)))
+        if cookie is None:
+            return self.session_class()
+
+        sid, cookie_generation = cookie
+        try:
+            loaded = self._load(app, sid, cookie_generation)
+        except Exception as e:
+            logger.error(f"Error loading session: {e}")
+            loaded = None
+
+        if loaded is None:
+            return self.session_class()
+
+        data, generation, expires_at = loaded
+        try:
+            initial = self.serializer.loads(data)
+        except Exception as e:
+            logger.error(f"Error decoding session {sid}: {e}")
+            return self.session_class()
+        return self.session_class(initial, sid=sid, generation=generation, digest=_digest(data),
+                                  expires_at=expires_at, cookie_generation=cookie_generation)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Emptied session: forget it on both sides
+        if not session:
+            if session.sid is not None:
+                self.cache.discard(session.sid)
+                try:
+                    self._storage(app).delete_participant_session(session.sid)
+                except Exception as e:
+                    logger.error(f"Error deleting session {session.sid}: {e}")
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.accessed and not session.modified:
+            return
+
+        data = self.serializer.dumps(dict(session))
+        digest = _digest(data)
+        lifetime = app.permanent_session_lifetime
+        # Unchanged sessions are only rewritten to extend their expiry, once
+        # less than half of their lifetime is left
+        if digest == session.digest and session.expires_at - datetime.now() > lifetime / 2:
+            if session.cookie_generation != session.generation:
+                self._set_cookie(app, session, response)
+            return
+
+        # New sessions get an ID; sessions whose identity changed get a new one
+        old_sid = session.sid
+        rotate = old_sid is not None and _identity(session) != session.identity
+        sid = secrets.token_urlsafe(32) if old_sid is None or rotate else old_sid
+        generation = session.generation + 1
+        expires_at = datetime.now() + lifetime
+        try:
+            saved = self._storage(app).save_participant_session(sid, data, generation, expires_at)
+        except Exception as e:
+            logger.error(f"Error saving session {sid}: {e}")
+            return
+        if not saved:
+            # Another request wrote the session since it was loaded; its
+            # write stands and the client picks it up on the next request
+            logger.warning(f"Dropped write to session {sid}: changed by a concurrent request")
+            self.cache.discard(sid)
+            return
+        if rotate:
+            # The old row only holds the previous identity; it expires if this fails
+            self.cache.discard(old_sid)
+            try:
+                self._storage(app).delete_participant_session(old_sid)
+            except Exception as e:
+                logger.error(f"Error deleting session {old_sid}: {e}")
+        self.cache.put(sid, generation, data, expires_at)
+        session.identity = _identity(session)
+        session.sid, session.generation, session.digest = sid, generation, digest
+        self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        """Point the session cookie at the session's current generation."""
+        session.cookie_generation = session.generation
+        response.set_cookie(
+            self.get_cookie_name(app),
+            f'{session.sid}.{session.generation}',
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+@click.group('sessions')
+def sessions_cli():
+    """Manage server-side participant sessions."""
+
+
+@sessions_cli.command('purge')
+@with_appcontext
+def purge_command():
+    """Delete expired participant sessions."""
+    count = current_app.extensions['storage'].purge_expired_sessions()
+    click.echo(f"Deleted {count} expired sessions")
+
+
+def init_app(app):
+    """
+    Use server-side sessions unless SESSION_BACKEND is 'cookie'.
+
+    Args:
+        app: Flask application
+    """
+    app.cli.add_command(sessions_cli)
+    if app.config.get('SESSION_BACKEND', 'server') == 'server':
+        app.session_interface = ServerSessionInterface(app.config.get('SESSION_CACHE_SIZE', SESSION_CACHE_SIZE))
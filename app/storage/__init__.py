@@ -0,0 +1,56 @@
+"""
+Storage package initialization.
+
+This package contains the pluggable storage backends. The backend is chosen
+with the STORAGE_BACKEND setting: 'postgres' (default) for a PostgreSQL
+server, or 'sqlite' for an embedded database at SQLITE_PATH.
+"""
+
+from flask import current_app
+
+from .base import StorageBackend
+from .postgres import PostgresStorage
+from .sqlite import SQLiteStorage
+from .decision_log import log_decision
+
+# Available backends by STORAGE_BACKEND name
+BACKENDS = {
+    PostgresStorage.name: PostgresStorage,
+    SQLiteStorage.name: SQLiteStorage,
+}
+
+
+def create_storage(backend, sqlite_path=':memory:'):
+    """
+    Create a storage backend by name.
+
+    Args:
+        backend (str): 'postgres' or 'sqlite'
+        sqlite_path (str): Database file for the SQLite backend
+
+    Returns:
+        StorageBackend: The new backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}'")
+    if backend == SQLiteStorage.name:
+        return SQLiteStorage(sqlite_path)
+    return BACKENDS[backend]()
+
+
+def init_app(app):
+    """
+    Create the configured storage backend and attach it to the Flask app.
+
+    The embedded SQLite schema is created right away; the PostgreSQL schema
+    is managed by the migrations run from init_db.
+    """
+    storage = create_storage(app.config['STORAGE_BACKEND'], app.config['SQLITE_PATH'])
+    if isinstance(storage, SQLiteStorage):
+        storage.init_schema()
+    app.extensions['storage'] = storage
+
+
+def get_storage():
+    """Get the storage backend of the current Flask app."""
+    return current_app.extensions['storage']
@@ -0,0 +1,462 @@
+"""
+Storage backend interface.
+
+Every storage backend implements the operations the participant-facing
+parts of the platform need: key management, participants, experiment
+sessions, decisions, results and the server-side participant sessions. Backends return plain dicts and lists so callers do
+not depend on the database driver.
+"""
+
+from abc import ABC, abstractmethod
+
+
+# Decisions as stored: the position in this tuple is the SMALLINT code.
+# Only ever append, so existing codes keep their meaning.
+DECISIONS = ('cooperate', 'defect')
+
+_DECISION_CODES = {decision: code for code, decision in enumerate(DECISIONS)}
+
+
+def encode_decision(decision):
+    """
+    Get the stored code of a decision.
+
+    Raises:
+        ValueError: If the decision is not one of DECISIONS
+    """
+    try:
+        return _DECISION_CODES[decision]
+    except KeyError:
+        raise ValueError(f"Unknown decision '{decision}'") from None
+
+
+def decode_decision(code):
+    """Get the decision a stored code stands for."""
+    return DECISIONS[code]
+
+
+# Column ranges of participant_decisions: INTEGER ids, SMALLINT round numbers
+ID_MAX = 2 ** 31 - 1
+ROUND_NUMBER_MAX = 2 ** 15 - 1
+
+
+def check_decision(participant_id, experiment_id, round_number, decision):
+    """
+    Check that a decision fits the participant_decisions columns.
+
+    Raises:
+        ValueError: If an ID or the round number is not an integer in range,
+            or the decision is not one of DECISIONS
+    """
+    for field, value, low, high in (
+        ('participant_id', participant_id, 1, ID_MAX),
+        ('experiment_id', experiment_id, 1, ID_MAX),
+        ('round_number', round_number, 0, ROUND_NUMBER_MAX),
+    ):
+        if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+            raise ValueError(f"Invalid {field} {value!r}: must be an integer from {low} to {high}")
+    encode_decision(decision)
+
+
+def split_rounds_data(data):
+    """
+    Separate a session document from its per-round data.
+
+    Args:
+        data (dict): Session data, possibly with a ``rounds_data`` list
+
+    Returns:
+        tuple: (document without rounds_data, list of rounds or None)
+    """
+    document = dict(data or {})
+    rounds = document.pop('rounds_data', None)
+    return document, rounds
+
+
+class StorageBackend(ABC):
+    """Abstract base class for storage backends."""
+
+    # Short name used in the STORAGE_BACKEND setting
+    name = None
+
+    # Errors after which a write may succeed if retried (lost connection,
+    # timeout, locked database); any other error is a problem with the data
+    transient_errors = (ConnectionError, TimeoutError)
+
+    @abstractmethod
+    def init_schema(self):
+        """Create or upgrade the tables the backend needs."""
+
+    def close(self):
+        """Release the resources held by the backend."""
+
+    # Experiments
+
+    @abstractmethod
+    def create_experiment(self, exp_type, name, description=None, parameters=None):
+        """
+        Create an experiment.
+
+        Args:
+            exp_type (str): Experiment type, e.g. 'prisoners_dilemma'
+            name (str): Display name
+            description (str, optional): Description
+            parameters (dict, optional): Experiment parameters
+
+        Returns:
+            int: ID of the new experiment
+        """
+
+    @abstractmethod
+    def get_experiment(self, experiment_id):
+        """
+        Get an experiment.
+
+        Returns:
+            dict: id, type, name, description, parameters and created_at,
+                or None if the experiment does not exist
+        """
+
+    # Keys
+
+    @abstractmethod
+    def create_keys(self, experiment_id, count, batch_size=None, progress=None):
+        """
+        Generate and store keys for an experiment.
+
+        Args:
+            experiment_id (int): ID of the experiment
+            count (int): Number of keys to generate
+            batch_size (int, optional): Number of keys written per statement
+            progress (callable, optional): Called as ``progress(stored, count)``
+
+        Returns:
+            list: The generated keys
+        """
+
+    @abstractmethod
+    def redeem_key(self, key):
+        """
+        Claim an unused key and create its participant atomically.
+
+        Returns:
+            dict: id, experiment_id, experiment_type, status and
+                participant_id (None if the key was not unused), or None if
+                the key does not exist
+        """
+
+    @abstractmethod
+    def revoke_key(self, key):
+        """
+        Revoke a key to prevent its use.
+
+        Returns:
+            bool: True if the key was found
+        """
+
+    @abstractmethod
+    def get_keys(self, experiment_id, status=None, after_id=None, limit=None):
+        """
+        Get the keys of an experiment ordered by id, optionally one page at a time.
+
+        Returns:
+            list: Key dicts with id, key, status, created_at and used_at
+        """
+
+    @abstractmethod
+    def get_key_status_counts(self, experiment_id):
+        """
+        Count the keys of an experiment by status.
+
+        Returns:
+            dict: Counts for 'unused', 'used', 'revoked' and their 'total'
+        """
+
+    @abstractmethod
+    def count_keys(self, after_id=0):
+        """
+        Count the keys of every experiment with an id above ``after_id``.
+
+        Returns:
+            tuple: (count, highest id or None if there are no such keys)
+        """
+
+    @abstractmethod
+    def iter_key_values(self, after_id, chunk_size):
+        """
+        Stream the values of every key with an id above ``after_id``, in id order.
+
+        Used to build the key filter, so it must not load every key at once.
+
+        Yields:
+            list: Up to ``chunk_size`` (id, key_value) pairs
+        """
+
+    # Participants
+
+    @abstractmethod
+    def get_participant(self, participant_id):
+        """
+        Get a participant.
+
+        Returns:
+            dict: id, key_id, experiment_id, joined_at and completed_at, or
+                None if the participant does not exist
+        """
+
+    @abstractmethod
+    def complete_participant(self, participant_id):
+        """
+        Mark a participant as having completed the experiment.
+
+        Returns:
+            bool: True if the participant was found
+        """
+
+    # Experiment sessions
+
+    @abstractmethod
+    def start_session(self, participant_id, experiment_id, data=None):
+        """
+        Start an experiment session.
+
+        Returns:
+            int: ID of the new session
+        """
+
+    @abstractmethod
+    def get_session(self, session_id):
+        """
+        Get an experiment session.
+
+        ``data`` is rebuilt from the session document and its round rows,
+        with the rounds in order under ``rounds_data``.
+
+        Returns:
+            dict: id, participant_id, experiment_id, started_at,
+                completed_at and data, or None if the session does not exist
+        """
+
+    @abstractmethod
+    def update_session(self, session_id, data):
+        """
+        Replace the data of an experiment session.
+
+        A ``rounds_data`` list in ``data`` replaces the session's round rows.
+        Rounds that did not change are not rewritten, but recording a new
+        round with record_session_round() is cheaper still.
+
+        Returns:
+            bool: True if the session was found
+        """
+
+    @abstractmethod
+    def record_session_round(self, session_id, round_number, data):
+        """
+        Store (or replace) the data of one round of an experiment session.
+
+        Only the round's own row is written, so recording round n costs the
+        same as recording round 1.
+
+        Args:
+            session_id (int): ID of the session
+            round_number (int): Round number, starting at 1
+            data (dict): The round's data
+        """
+
+    @abstractmethod
+    def complete_session(self, session_id):
+        """
+        Mark an experiment session as completed.
+
+        Returns:
+            bool: True if the session was found
+        """
+
+    # Results
+
+    @abstractmethod
+    def record_result(self, participant_id, experiment_id, result_data, session_id=None):
+        """
+        Store the result of a participant.
+
+        Returns:
+            int: ID of the new result
+        """
+
+    @abstractmethod
+    def get_results(self, experiment_id):
+        """
+        Get the results of an experiment in the order they were recorded.
+
+        Returns:
+            list: Result dicts with id, session_id, participant_id,
+                result_data and recorded_at
+        """
+
+    # Decisions
+
+    @abstractmethod
+    def record_decisions(self, decisions):
+        """
+        Store round decisions in bulk, skipping any already stored.
+
+        Args:
+            decisions (list): Dicts with uid, participant_id, experiment_id,
+                round_number, decision, metadata and created_at (ISO 8601)
+
+        Returns:
+            int: Number of decisions inserted
+        """
+
+    @abstractmethod
+    def get_decisions(self, participant_id):
+        """
+        Get a participant's decisions in round order.
+
+        Returns:
+            list: Dicts with round_number, decision, metadata and created_at
+        """
+
+    @abstractmethod
+    def get_decision_counts(self, experiment_id):
+        """
+        Count an experiment's decisions per round.
+
+        Returns:
+            dict: {round_number: {decision: count}} for every decision in
+                DECISIONS
+        """
+
+    # Participant sessions (server-side Flask sessions)
+
+    @abstractmethod
+    def load_participant_session(self, session_id):
+        """
+        Get a stored participant session that has not expired.
+
+        Returns:
+            dict: data (the serialized session), generation and expires_at,
+                or None if there is no such session
+        """
+
+    @abstractmethod
+    def save_participant_session(self, session_id, data, generation, expires_at):
+        """
+        Create a participant session, or replace it if it is still at the
+        previous generation.
+
+        The generation check makes saves optimistic: of two requests that
+        loaded the same generation, only the first to save succeeds.
+
+        Args:
+            session_id (str): Opaque session ID
+            data (str): Serialized session
+            generation (int): Write counter, incremented on every save
+            expires_at (datetime): When the session expires
+
+        Returns:
+            bool: True if the session was written, False if the stored
+                session is not at ``generation - 1``
+        """
+
+    @abstractmethod
+    def delete_participant_session(self, session_id):
+        """
+        Delete a participant session.
+
+        Returns:
+            bool: True if the session was found
+        """
+
+    @abstractmethod
+    def purge_expired_sessions(self):
+        """
+        Delete every expired participant session.
+
+        Returns:
+            int: Number of sessions deleted
+        """
+
+    # Administration
+
+    @abstractmethod
+    def get_user(self, user_id):
+        """
+        Get an admin user.
+
+        Returns:
+            dict: id, username, password_hash, email and role, or None if
+                the user does not exist
+        """
+
+    @abstractmethod
+    def find_user(self, username=None, email=None):
+        """
+        Get the admin user with a username or email address.
+
+        Returns:
+            dict: As for get_user(), or None if no user matches
+        """
+
+    @abstractmethod
+    def create_user(self, username, password_hash, email=None, role='researcher'):
+        """
+        Create an admin user.
+
+        Returns:
+            int: ID of the new user
+        """
+
+    @abstractmethod
+    def record_login(self, user_id):
+        """Set the last login time of an admin user to now."""
+
+    @abstractmethod
+    def get_experiment_overview(self):
+        """
+        List every experiment with its number of active participants.
+
+        Returns:
+            list: Dicts with id, type, name, created_at and
+                active_participants (joined, not completed), newest first
+        """
+
+    @abstractmethod
+    def count_participants(self, experiment_id):
+        """
+        Count the participants of an experiment.
+
+        Returns:
+            int: Number of participants
+        """
+
+    @abstractmethod
+    def count_completed_rounds(self, experiment_id):
+        """
+        Count the completed rounds of an experiment.
+
+        Returns:
+            int: Number of rounds with status 'completed'
+        """
+
+    @abstractmethod
+    def iter_rounds(self, experiment_id, chunk_size):
+        """
+        Stream the rounds of an experiment with their results, in round order.
+
+        Rows are fetched ``chunk_size`` at a time, so memory use does not
+        depend on the size of the experiment.
+
+        Yields:
+            tuple: (id, round_number, started_at, completed_at, results)
+        """
+
+    @abstractmethod
+    def iter_participants(self, experiment_id, chunk_size):
+        """
+        Stream the participants of an experiment with their keys.
+
+        Yields:
+            tuple: (id, participant_type, joined_at, completed_at, key_value)
+        """
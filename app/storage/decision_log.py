@@ -0,0 +1,423 @@
+"""
+Write-behind decision log.
+
+Round decisions are the most frequent write of a running session. Instead
+of one INSERT per decision inside the request, ``log_decision`` appends the
+decision to a local append-only file and an in-memory buffer, and returns
+as soon as the append has reached the file. A background thread bulk-
+inserts the buffer through the storage backend every DECISION_FLUSH_MS
+milliseconds, or sooner once DECISION_FLUSH_ROWS decisions are waiting.
+
+The file is split into segments. Every flush starts a new segment, and a
+segment is deleted once all of its decisions are stored. Each process holds
+an exclusive lock on the segments it still owns. Any segment left behind by
+a process that crashed or was killed is therefore unlocked, and the next
+process to start replays it. Every decision carries a UUID, and the
+database ignores UUIDs it already has, so replaying a segment that was
+partly stored is harmless.
+
+Decisions are checked against the column ranges when they are appended.
+If a batch still fails with an error that retrying cannot fix (say, a
+participant that was deleted meanwhile), it is split until the rejected
+decisions are isolated, and those are moved to a dead-letter file
+(dead-*.jsonl, never replayed) so they cannot hold up the rest of the log.
+Only transient errors, such as a lost database connection, leave a segment
+in place to be retried whole.
+"""
+
+import os
+import json
+import uuid
+import glob
+import fcntl
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from app.storage.base import StorageBackend, check_decision
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Directory of the log segments
+DECISION_LOG_DIR = os.getenv('DECISION_LOG_DIR', 'instance/decision_log')
+
+# Flush at least this often (milliseconds) ...
+DECISION_FLUSH_MS = int(os.getenv('DECISION_FLUSH_MS', 200))
+
+# ... or as soon as this many decisions are buffered
+DECISION_FLUSH_ROWS = int(os.getenv('DECISION_FLUSH_ROWS', 500))
+
+# fsync every append: survives power loss, not just process crashes, at a
+# cost of one disk sync per decision
+DECISION_LOG_FSYNC = os.getenv('DECISION_LOG_FSYNC', 'false').lower() in ('true', '1', 't')
+
+_log = None
+_log_lock = threading.Lock()
+
+
+class Segment:
+    """One locked, append-only file of the log."""
+
+    def __init__(self, path, create=True):
+        self.path = path
+        flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+        fd = os.open(path, flags, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise
+        self.file = os.fdopen(fd, 'a', encoding='utf-8')
+
+    def append(self, line, sync=False):
+        self.file.write(line)
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        """Delete the segment, then release its lock."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.close()
+
+
+def read_segment(path):
+    """
+    Read the decisions in a segment file.
+
+    A torn last line, left by a crash in the middle of an append, is
+    skipped.
+
+    Returns:
+        list: Decision dicts
+    """
+    decisions = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                decisions.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping unreadable decision log line in {path}")
+    return decisions
+
+
+class DecisionLog:
+    """
+    A buffer of decisions backed by local segment files, flushed in bulk.
+
+    Args:
+        writer (callable): Stores a list of decisions, e.g.
+            StorageBackend.record_decisions
+        directory (str): Where the segment files live
+        flush_ms (int): Maximum time between flushes
+        flush_rows (int): Buffered decisions that trigger an early flush
+        fsync (bool): Sync every append to disk
+        transient_errors (tuple): Writer errors after which a batch is kept
+            and retried whole, e.g. StorageBackend.transient_errors
+    """
+
+    def __init__(self, writer, directory=DECISION_LOG_DIR, flush_ms=DECISION_FLUSH_MS,
+                 flush_rows=DECISION_FLUSH_ROWS, fsync=DECISION_LOG_FSYNC,
+                 transient_errors=StorageBackend.transient_errors):
+        self.writer = writer
+        self.transient_errors = tuple(transient_errors)
+        self.directory = directory
+        self.flush_interval = flush_ms / 1000
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self._token = uuid.uuid4().hex[:8]
+
+        self._buffer = []
+        self._pending = []  # segments whose decisions are not all stored yet
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.dead_letter_path = os.path.join(directory, f'dead-{self.pid}-{self._token}.jsonl')
+        self._segment = self._open_segment()
+        self._thread = None
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f'decisions-{datetime.now():%Y%m%d%H%M%S}-{self.pid}-{self._token}-{self._sequence:06d}.jsonl'
+        return Segment(os.path.join(self.directory, name))
+
+    def start(self):
+        """Start the background flusher."""
+        self._thread = threading.Thread(target=self._run, name='decision-log-flusher', daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, participant_id, experiment_id, round_number, decision, metadata=None):
+        """
+        Log a decision; returns once it is in the local file.
+
+        Returns:
+            str: The decision's UUID
+
+        Raises:
+            ValueError: If a value does not fit its column (see check_decision)
+        """
+        # Rejected here rather than at flush time, where it would fail the batch
+        check_decision(participant_id, experiment_id, round_number, decision)
+        record = {
+            'uid': str(uuid.uuid4()),
+            'participant_id': participant_id,
+            'experiment_id': experiment_id,
+            'round_number': round_number,
+            'decision': decision,
+            'metadata': metadata,
+            'created_at': datetime.now().isoformat(),
+        }
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError('Decision log is closed')
+            self._segment.append(line, self.fsync)
+            self._buffer.append(record)
+            buffered = len(self._buffer)
+
+        if buffered >= self.flush_rows:
+            self._wakeup.set()
+        return record['uid']
+
+    def flush(self):
+        """
+        Store every buffered decision now.
+
+        Segments are written oldest first; a transient error stops the
+        flush and leaves the remaining segments for the next one.
+
+        Returns:
+            int: Number of decisions written to storage
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer and not self._pending:
+                    return 0
+                if self._buffer:
+                    self._pending.append((self._segment, self._buffer))
+                    self._segment = self._open_segment()
+                    self._buffer = []
+                pending = list(self._pending)
+
+            stored = 0
+            for segment, records in pending:
+                try:
+                    stored += self._store(records)
+                except self.transient_errors as e:
+                    # Keep the segment; the next flush retries it
+                    logger.error(f"Error flushing {len(records)} decisions: {e}")
+                    break
+                with self._lock:
+                    self._pending.pop(0)
+                segment.remove()
+            return stored
+
+    def _store(self, decisions):
+        """
+        Write decisions, setting aside the ones storage rejects.
+
+        A batch that fails with a non-transient error is split in halves
+        until the failing decisions are isolated; those go to the
+        dead-letter file.
+
+        Returns:
+            int: Number of decisions stored
+
+        Raises:
+            Exception: One of transient_errors; nothing was set aside for it
+        """
+        if not decisions:
+            return 0
+        try:
+            self.writer(decisions)
+            return len(decisions)
+        except self.transient_errors:
+            raise
+        except Exception as e:
+            if len(decisions) == 1:
+                self._dead_letter(decisions[0], e)
+                return 0
+            middle = len(decisions) // 2
+            return self._store(decisions[:middle]) + self._store(decisions[middle:])
+
+    def _dead_letter(self, record, error):
+        """Move a decision storage rejected to the dead-letter file."""
+        logger.error(f"Decision {record.get('uid')} rejected, moved to {self.dead_letter_path}: {error}")
+        line = json.dumps(dict(record, error=str(error)), separators=(',', ':')) + '\n'
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Decision log flusher error: {e}")
+
+    def recover(self):
+        """
+        Replay segments left behind by processes that are gone.
+
+        Returns:
+            int: Number of decisions replayed
+        """
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, 'decisions-*.jsonl'))):
+            if path == self._segment.path or any(path == s.path for s, _ in self._pending):
+                continue
+            try:
+                segment = Segment(path, create=False)
+            except BlockingIOError:
+                continue  # still owned by a live process
+            except FileNotFoundError:
+                continue  # replayed by another process meanwhile
+
+            try:
+                decisions = read_segment(path)
+                stored = self._store(decisions)
+                segment.remove()
+                replayed += stored
+                logger.info(f"Replayed {stored} of {len(decisions)} decisions from {path}")
+            except Exception as e:
+                segment.close()
+                logger.error(f"Error replaying decision log {path}: {e}")
+        return replayed
+
+    def close(self):
+        """Stop the flusher and store what is left."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self._lock:
+            if not self._buffer and not self._pending:
+                self._segment.remove()
+                return
+            # Left for the next process to replay
+            self._segment.close()
+            for segment, _ in self._pending:
+                segment.close()
+
+    def abandon(self):
+        """
+        Close an inherited log's files in a forked child.
+
+        Locks belong to the open file and would otherwise be held by the
+        child for as long as it lives; the parent still owns the segments.
+        """
+        self._stopped = True
+        self._segment.close()
+        for segment, _ in self._pending:
+            segment.close()
+
+
+def _open_log(storage, recover):
+    """Replace this process's decision log with a new one. The caller holds _log_lock."""
+    global _log
+
+    if _log is not None:
+        if _log.pid == os.getpid():
+            _log.close()
+        else:
+            _log.abandon()
+    if storage is None:
+        from app.storage import get_storage
+        storage = get_storage()
+    _log = DecisionLog(storage.record_decisions, DECISION_LOG_DIR, transient_errors=storage.transient_errors)
+    if recover:
+        try:
+            _log.recover()
+        except Exception as e:
+            logger.error(f"Error recovering the decision log: {e}")
+    return _log.start()
+
+
+def start_decision_log(storage):
+    """
+    Start this process's decision log and replay segments left behind by
+    processes that are gone.
+
+    Servers call this once per process at startup (gunicorn workers in
+    post_fork), so recovery never runs inside a participant's request.
+
+    Args:
+        storage: Storage backend to flush into
+    """
+    with _log_lock:
+        return _open_log(storage, recover=True)
+
+
+def get_decision_log(storage=None):
+    """
+    Get this process's decision log, starting it on first use.
+
+    A log started here does not replay old segments; that is left to
+    start_decision_log() at process startup.
+
+    Args:
+        storage: Storage backend to flush into (default: the current app's)
+    """
+    log = _log
+    if log is not None and log.pid == os.getpid():
+        return log
+
+    with _log_lock:
+        if _log is None or _log.pid != os.getpid():
+            return _open_log(storage, recover=False)
+        return _log
+
+
+def log_decision(participant_id, experiment_id, round_number, decision, metadata=None):
+    """
+    Record a round decision without waiting for the database.
+
+    Args:
+        participant_id (int): ID of the participant
+        experiment_id (int): ID of the experiment
+        round_number (int): Round the decision was made in
+        decision (str): The decision, e.g. 'cooperate'
+        metadata (dict, optional): Extra data stored with the decision
+
+    Returns:
+        str: The decision's UUID
+    """
+    return get_decision_log().append(participant_id, experiment_id, round_number, decision, metadata)
+
+
+def close_decision_log():
+    """Flush and close this process's decision log, e.g. on shutdown."""
+    global _log
+
+    with _log_lock:
+        if _log is not None:
+            if _log.pid == os.getpid():
+                _log.close()
+            else:
+                _log.abandon()
+        _log = None
+
+
+atexit.register(close_decision_log)
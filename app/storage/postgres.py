@@ -0,0 +1,380 @@
+"""
+PostgreSQL storage backend.
+
+Uses the shared connection pool; inside a request every call reuses the
+request's connection. Key management delegates to app.auth.key_manager so
+both paths share the same queries, including the key filter.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+import psycopg2
+import psycopg2.pool
+
+from app.auth import key_manager
+from app.db.pool import get_db_connection
+from app.storage.base import (
+    DECISIONS, StorageBackend, decode_decision, encode_decision, split_rounds_data
+)
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class PostgresStorage(StorageBackend):
+    """Storage backend for a PostgreSQL server."""
+
+    name = 'postgres'
+    transient_errors = StorageBackend.transient_errors + (
+        psycopg2.OperationalError, psycopg2.InterfaceError, psycopg2.pool.PoolError
+    )
+
+    def _fetchone(self, query, params):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchone()
+        finally:
+            conn.close()
+
+    def _fetchall(self, query, params):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.fetchall()
+        finally:
+            conn.close()
+
+    def _execute(self, query, params):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            return cur.rowcount
+        finally:
+            conn.close()
+
+    def init_schema(self):
+        from app.db.migrations import run_migrations
+
+        conn = get_db_connection()
+        try:
+            run_migrations(conn)
+        finally:
+            conn.close()
+
+    # Experiments
+
+    def create_experiment(self, exp_type, name, description=None, parameters=None):
+        row = self._fetchone(
+            'INSERT INTO experiments (type, name, description, parameters, created_at) '
+            'VALUES (%s, %s, %s, %s, %s) RETURNING id',
+            (exp_type, name, description, json.dumps(parameters or {}), datetime.now())
+        )
+        return row[0]
+
+    def get_experiment(self, experiment_id):
+        row = self._fetchone(
+            'SELECT id, type, name, description, parameters, created_at FROM experiments WHERE id = %s',
+            (experiment_id,)
+        )
+        if not row:
+            return None
+        return dict(zip(('id', 'type', 'name', 'description', 'parameters', 'created_at'), row))
+
+    # Keys
+
+    def create_keys(self, experiment_id, count, batch_size=None, progress=None):
+        return key_manager.create_keys_for_experiment(
+            experiment_id, count, batch_size=batch_size or key_manager.KEY_BATCH_SIZE, progress=progress
+        )
+
+    def redeem_key(self, key):
+        return key_manager.redeem_key(key)
+
+    def revoke_key(self, key):
+        return key_manager.revoke_key(key)
+
+    def get_keys(self, experiment_id, status=None, after_id=None, limit=None):
+        return key_manager.get_keys_for_experiment(
+            experiment_id, status=status, after_id=after_id, limit=limit
+        )
+
+    def get_key_status_counts(self, experiment_id):
+        return key_manager.get_key_status_counts(experiment_id)
+
+    def count_keys(self, after_id=0):
+        return key_manager.count_keys(after_id)
+
+    def iter_key_values(self, after_id, chunk_size):
+        return key_manager.iter_key_values(after_id, chunk_size)
+
+    # Participants
+
+    def get_participant(self, participant_id):
+        row = self._fetchone(
+            'SELECT id, key_id, experiment_id, joined_at, completed_at FROM participants WHERE id = %s',
+            (participant_id,)
+        )
+        if not row:
+            return None
+        return dict(zip(('id', 'key_id', 'experiment_id', 'joined_at', 'completed_at'), row))
+
+    def complete_participant(self, participant_id):
+        return self._execute(
+            'UPDATE participants SET completed_at = %s WHERE id = %s',
+            (datetime.now(), participant_id)
+        ) > 0
+
+    # Experiment sessions
+
+    def start_session(self, participant_id, experiment_id, data=None):
+        document, rounds = split_rounds_data(data)
+        row = self._fetchone(
+            'INSERT INTO experiment_sessions (participant_id, experiment_id, started_at, data) '
+            'VALUES (%s, %s, %s, %s) RETURNING id',
+            (participant_id, experiment_id, datetime.now(), json.dumps(document))
+        )
+        if rounds:
+            self.update_session(row[0], data)
+        return row[0]
+
+    def get_session(self, session_id):
+        row = self._fetchone(
+            'SELECT id, participant_id, experiment_id, started_at, completed_at, data '
+            'FROM experiment_session_documents WHERE id = %s',
+            (session_id,)
+        )
+        if not row:
+            return None
+        return dict(zip(('id', 'participant_id', 'experiment_id', 'started_at', 'completed_at', 'data'), row))
+
+    def update_session(self, session_id, data):
+        document, rounds = split_rounds_data(data)
+        if rounds is None:
+            return self._execute(
+                'UPDATE experiment_sessions SET data = %s WHERE id = %s',
+                (json.dumps(document), session_id)
+            ) > 0
+
+        # One statement, so the document and its rounds change atomically
+        row = self._fetchone(
+            'WITH doc AS ('
+            '    UPDATE experiment_sessions SET data = %s WHERE id = %s RETURNING id'
+            '), upserted AS ('
+            '    INSERT INTO experiment_session_rounds (session_id, round_number, data, recorded_at) '
+            '    SELECT doc.id, r.round_number, r.data, %s '
+            '    FROM doc, unnest(%s::jsonb[]) WITH ORDINALITY AS r(data, round_number) '
+            '    ON CONFLICT (session_id, round_number) DO UPDATE SET data = EXCLUDED.data '
+            '    WHERE experiment_session_rounds.data IS DISTINCT FROM EXCLUDED.data'
+            '), trimmed AS ('
+            '    DELETE FROM experiment_session_rounds '
+            '    WHERE session_id IN (SELECT id FROM doc) AND round_number > %s'
+            ') SELECT COUNT(*) FROM doc',
+            (json.dumps(document), session_id, datetime.now(), [json.dumps(r) for r in rounds], len(rounds))
+        )
+        return row[0] > 0
+
+    def record_session_round(self, session_id, round_number, data):
+        self._execute(
+            'INSERT INTO experiment_session_rounds (session_id, round_number, data, recorded_at) '
+            'VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (session_id, round_number) DO UPDATE SET data = EXCLUDED.data, '
+            'recorded_at = EXCLUDED.recorded_at',
+            (session_id, round_number, json.dumps(data), datetime.now())
+        )
+
+    def complete_session(self, session_id):
+        return self._execute(
+            'UPDATE experiment_sessions SET completed_at = %s WHERE id = %s',
+            (datetime.now(), session_id)
+        ) > 0
+
+    # Results
+
+    def record_result(self, participant_id, experiment_id, result_data, session_id=None):
+        row = self._fetchone(
+            'INSERT INTO experiment_results (session_id, participant_id, experiment_id, result_data, recorded_at) '
+            'VALUES (%s, %s, %s, %s, %s) RETURNING id',
+            (session_id, participant_id, experiment_id, json.dumps(result_data), datetime.now())
+        )
+        return row[0]
+
+    def get_results(self, experiment_id):
+        rows = self._fetchall(
+            'SELECT id, session_id, participant_id, result_data, recorded_at '
+            'FROM experiment_results WHERE experiment_id = %s ORDER BY id',
+            (experiment_id,)
+        )
+        return [
+            dict(zip(('id', 'session_id', 'participant_id', 'result_data', 'recorded_at'), row))
+            for row in rows
+        ]
+
+    # Decisions
+
+    def record_decisions(self, decisions):
+        if not decisions:
+            return 0
+        return self._execute(
+            'INSERT INTO participant_decisions '
+            '(decision_uid, participant_id, experiment_id, round_number, decision, metadata, created_at) '
+            'SELECT * FROM unnest(%s::uuid[], %s::integer[], %s::integer[], %s::smallint[], '
+            '%s::smallint[], %s::jsonb[], %s::timestamp[]) '
+            'ON CONFLICT (decision_uid) DO NOTHING',
+            (
+                [d['uid'] for d in decisions],
+                [d['participant_id'] for d in decisions],
+                [d['experiment_id'] for d in decisions],
+                [d['round_number'] for d in decisions],
+                [encode_decision(d['decision']) for d in decisions],
+                [json.dumps(d['metadata']) if d.get('metadata') is not None else None for d in decisions],
+                [d['created_at'] for d in decisions],
+            )
+        )
+
+    def get_decisions(self, participant_id):
+        rows = self._fetchall(
+            'SELECT round_number, decision, metadata, created_at FROM participant_decisions '
+            'WHERE participant_id = %s ORDER BY round_number, id',
+            (participant_id,)
+        )
+        return [
+            {'round_number': row[0], 'decision': decode_decision(row[1]), 'metadata': row[2], 'created_at': row[3]}
+            for row in rows
+        ]
+
+    def get_decision_counts(self, experiment_id):
+        rows = self._fetchall(
+            'SELECT round_number, decision, COUNT(*) FROM participant_decisions '
+            'WHERE experiment_id = %s GROUP BY round_number, decision ORDER BY round_number',
+            (experiment_id,)
+        )
+        counts = {}
+        for round_number, code, count in rows:
+            counts.setdefault(round_number, dict.fromkeys(DECISIONS, 0))[decode_decision(code)] = count
+        return counts
+
+    # Participant sessions
+
+    def load_participant_session(self, session_id):
+        row = self._fetchone(
+            'SELECT data, generation, expires_at FROM participant_sessions '
+            'WHERE id = %s AND expires_at > %s',
+            (session_id, datetime.now())
+        )
+        if not row:
+            return None
+        return {'data': row[0], 'generation': row[1], 'expires_at': row[2]}
+
+    def save_participant_session(self, session_id, data, generation, expires_at):
+        return self._execute(
+            'INSERT INTO participant_sessions (id, data, generation, expires_at, updated_at) '
+            'VALUES (%s, %s, %s, %s, %s) '
+            'ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, generation = EXCLUDED.generation, '
+            'expires_at = EXCLUDED.expires_at, updated_at = EXCLUDED.updated_at '
+            'WHERE participant_sessions.generation = EXCLUDED.generation - 1',
+            (session_id, data, generation, expires_at, datetime.now())
+        ) > 0
+
+    def delete_participant_session(self, session_id):
+        return self._execute('DELETE FROM participant_sessions WHERE id = %s', (session_id,)) > 0
+
+    def purge_expired_sessions(self):
+        return self._execute('DELETE FROM participant_sessions WHERE expires_at <= %s', (datetime.now(),))
+
+    # Administration
+
+    def _iter_rows(self, name, query, params, chunk_size):
+        """Yield rows from a server-side cursor, which only lives inside a transaction."""
+        conn = get_db_connection()
+        autocommit = conn.autocommit
+        conn.autocommit = False
+        try:
+            cur = conn.cursor(name=name)
+            cur.itersize = chunk_size
+            cur.execute(query, params)
+            yield from cur
+            cur.close()
+        finally:
+            conn.rollback()
+            conn.autocommit = autocommit
+            conn.close()
+
+    def get_user(self, user_id):
+        row = self._fetchone(
+            'SELECT id, username, password_hash, email, role FROM users WHERE id = %s',
+            (user_id,)
+        )
+        if not row:
+            return None
+        return dict(zip(('id', 'username', 'password_hash', 'email', 'role'), row))
+
+    def find_user(self, username=None, email=None):
+        row = self._fetchone(
+            'SELECT id, username, password_hash, email, role FROM users '
+            'WHERE username = %s OR email = %s LIMIT 1',
+            (username, email)
+        )
+        if not row:
+            return None
+        return dict(zip(('id', 'username', 'password_hash', 'email', 'role'), row))
+
+    def create_user(self, username, password_hash, email=None, role='researcher'):
+        row = self._fetchone(
+            'INSERT INTO users (username, password_hash, email, role, created_at) '
+            'VALUES (%s, %s, %s, %s, %s) RETURNING id',
+            (username, password_hash, email, role, datetime.now())
+        )
+        return row[0]
+
+    def record_login(self, user_id):
+        self._execute('UPDATE users SET last_login = %s WHERE id = %s', (datetime.now(), user_id))
+
+    def get_experiment_overview(self):
+        # Active participants come from the partial index idx_participants_active
+        rows = self._fetchall(
+            'SELECT e.id, e.type, e.name, e.created_at, COALESCE(s.active_participants, 0) '
+            'FROM experiments e '
+            'LEFT JOIN ('
+            '    SELECT experiment_id, COUNT(*) AS active_participants FROM participants '
+            '    WHERE completed_at IS NULL GROUP BY experiment_id'
+            ') s ON s.experiment_id = e.id '
+            'ORDER BY e.created_at DESC',
+            ()
+        )
+        return [dict(zip(('id', 'type', 'name', 'created_at', 'active_participants'), row)) for row in rows]
+
+    def count_participants(self, experiment_id):
+        return self._fetchone('SELECT COUNT(*) FROM participants WHERE experiment_id = %s', (experiment_id,))[0]
+
+    def count_completed_rounds(self, experiment_id):
+        return self._fetchone(
+            'SELECT COUNT(*) FROM experiment_rounds WHERE experiment_id = %s AND status = %s',
+            (experiment_id, 'completed')
+        )[0]
+
+    def iter_rounds(self, experiment_id, chunk_size):
+        return self._iter_rows(
+            'export_rounds',
+            'SELECT er.id, er.round_number, er.started_at, er.completed_at, rr.results '
+            'FROM experiment_rounds er '
+            'LEFT JOIN round_results rr ON er.id = rr.round_id '
+            'WHERE er.experiment_id = %s '
+            'ORDER BY er.round_number',
+            (experiment_id,), chunk_size
+        )
+
+    def iter_participants(self, experiment_id, chunk_size):
+        return self._iter_rows(
+            'export_participants',
+            'SELECT p.id, p.participant_type, p.joined_at, p.completed_at, pk.key_value '
+            'FROM participants p '
+            'JOIN participant_keys pk ON p.key_id = pk.id '
+            'WHERE p.experiment_id = %s',
+            (experiment_id,), chunk_size
+        )
@@ -0,0 +1,710 @@
+"""
+Embedded SQLite storage backend.
+
+Intended for single-node lab deployments and the test suite: the database
+is a local file (or ``:memory:``), so no call ever leaves the process. The
+database runs in WAL mode so readers never block the writer, every thread
+gets its own connection, and all statements are constant parameterized
+strings so SQLite's statement cache keeps them prepared.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from app.auth.key_filter import is_key_possibly_valid
+from app.auth.key_manager import KEY_BATCH_SIZE, generate_unique_keys, store_keys_in_batches
+from app.storage.base import (
+    DECISIONS, StorageBackend, decode_decision, encode_decision, split_rounds_data
+)
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Number of prepared statements SQLite keeps per connection
+STATEMENT_CACHE_SIZE = 256
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        email TEXT,
+        role TEXT DEFAULT 'researcher',
+        created_at TEXT,
+        last_login TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS experiments (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        description TEXT,
+        parameters TEXT,
+        created_at TEXT,
+        active INTEGER DEFAULT 1
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS participant_keys (
+        id INTEGER PRIMARY KEY,
+        experiment_id INTEGER REFERENCES experiments(id) ON DELETE CASCADE,
+        key_value TEXT UNIQUE NOT NULL,
+        status TEXT DEFAULT 'unused',
+        created_at TEXT,
+        used_at TEXT,
+        revoked_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS participants (
+        id INTEGER PRIMARY KEY,
+        key_id INTEGER REFERENCES participant_keys(id),
+        experiment_id INTEGER REFERENCES experiments(id),
+        participant_type TEXT DEFAULT 'human',
+        joined_at TEXT,
+        completed_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS experiment_sessions (
+        id INTEGER PRIMARY KEY,
+        participant_id INTEGER REFERENCES participants(id),
+        experiment_id INTEGER REFERENCES experiments(id),
+        started_at TEXT,
+        completed_at TEXT,
+        data TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS experiment_session_rounds (
+        session_id INTEGER NOT NULL REFERENCES experiment_sessions(id) ON DELETE CASCADE,
+        round_number INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        recorded_at TEXT,
+        PRIMARY KEY (session_id, round_number)
+    )
+    ''',
+    '''
+    CREATE VIEW IF NOT EXISTS experiment_session_documents AS
+    SELECT s.id, s.participant_id, s.experiment_id, s.started_at, s.completed_at,
+           CASE WHEN NOT EXISTS (SELECT 1 FROM experiment_session_rounds WHERE session_id = s.id)
+                THEN COALESCE(s.data, '{}')
+                ELSE json_set(COALESCE(s.data, '{}'), '$.rounds_data', json(
+                    (SELECT json_group_array(json(r.data)) FROM (
+                        SELECT data FROM experiment_session_rounds WHERE session_id = s.id ORDER BY round_number
+                    ) r)
+                ))
+           END AS data
+    FROM experiment_sessions s
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS experiment_results (
+        id INTEGER PRIMARY KEY,
+        session_id INTEGER REFERENCES experiment_sessions(id),
+        participant_id INTEGER REFERENCES participants(id),
+        experiment_id INTEGER REFERENCES experiments(id),
+        result_data TEXT,
+        recorded_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS experiment_rounds (
+        id INTEGER PRIMARY KEY,
+        experiment_id INTEGER REFERENCES experiments(id) ON DELETE CASCADE,
+        round_number INTEGER NOT NULL,
+        status TEXT DEFAULT 'pending',
+        started_at TEXT,
+        completed_at TEXT,
+        UNIQUE (experiment_id, round_number)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS round_results (
+        id INTEGER PRIMARY KEY,
+        round_id INTEGER REFERENCES experiment_rounds(id) ON DELETE CASCADE,
+        results TEXT,
+        recorded_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS participant_decisions (
+        id INTEGER PRIMARY KEY,
+        decision_uid TEXT NOT NULL UNIQUE,
+        participant_id INTEGER REFERENCES participants(id),
+        experiment_id INTEGER REFERENCES experiments(id),
+        round_number INTEGER NOT NULL,
+        decision INTEGER NOT NULL,
+        metadata TEXT,
+        created_at TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS participant_sessions (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        generation INTEGER NOT NULL DEFAULT 1,
+        expires_at TEXT NOT NULL,
+        updated_at TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_participant_keys_experiment_status_id '
+    'ON participant_keys (experiment_id, status, id)',
+    'CREATE INDEX IF NOT EXISTS idx_participants_experiment ON participants (experiment_id)',
+    'CREATE INDEX IF NOT EXISTS idx_round_results_round ON round_results (round_id)',
+    'CREATE INDEX IF NOT EXISTS idx_experiment_sessions_participant ON experiment_sessions (participant_id)',
+    'CREATE INDEX IF NOT EXISTS idx_experiment_results_experiment ON experiment_results (experiment_id)',
+    'CREATE INDEX IF NOT EXISTS idx_participant_sessions_expires ON participant_sessions (expires_at)',
+    'CREATE INDEX IF NOT EXISTS idx_participant_decisions_participant '
+    'ON participant_decisions (participant_id, round_number)',
+    'CREATE INDEX IF NOT EXISTS idx_participant_decisions_experiment_round '
+    'ON participant_decisions (experiment_id, round_number, decision)',
+]
+
+
+def _to_db_time(value):
+    """Store timestamps as ISO 8601 text."""
+    return value.isoformat(sep=' ') if value else None
+
+
+def _from_db_time(value):
+    """Parse a timestamp stored by _to_db_time()."""
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteStorage(StorageBackend):
+    """Storage backend for an embedded SQLite database."""
+
+    name = 'sqlite'
+    # OperationalError covers "database is locked"
+    transient_errors = StorageBackend.transient_errors + (sqlite3.OperationalError,)
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+        # A private in-memory database is only visible to one connection, so
+        # name it and share its cache between this backend's threads
+        if path == ':memory:':
+            self._uri = f'file:umdad_{id(self)}?mode=memory&cache=shared'
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._uri = f'file:{path}'
+
+        # Keep one connection open for the lifetime of the backend, which also
+        # keeps a shared in-memory database alive
+        self._conn()
+
+    def _conn(self):
+        """Get this thread's connection, opening it on first use."""
+        if self._pid != os.getpid():
+            # SQLite connections must not cross a fork: drop (without closing)
+            # those inherited from the parent process and open new ones
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._connections = []
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._uri, uri=True, timeout=30, isolation_level=None,
+                cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False
+            )
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA foreign_keys = ON')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self, callback):
+        """Run ``callback(conn)`` in an immediate (write-locked) transaction."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = callback(conn)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def init_schema(self):
+        conn = self._conn()
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # Experiments
+
+    def create_experiment(self, exp_type, name, description=None, parameters=None):
+        cur = self._conn().execute(
+            'INSERT INTO experiments (type, name, description, parameters, created_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (exp_type, name, description, json.dumps(parameters or {}), _to_db_time(datetime.now()))
+        )
+        return cur.lastrowid
+
+    def get_experiment(self, experiment_id):
+        row = self._conn().execute(
+            'SELECT id, type, name, description, parameters, created_at FROM experiments WHERE id = ?',
+            (experiment_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'type': row[1],
+            'name': row[2],
+            'description': row[3],
+            'parameters': json.loads(row[4]) if row[4] else None,
+            'created_at': _from_db_time(row[5])
+        }
+
+    # Keys
+
+    def create_keys(self, experiment_id, count, batch_size=None, progress=None):
+        created_at = _to_db_time(datetime.now())
+
+        def insert(conn, keys):
+            # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join clause
+            rows = conn.execute(
+                'INSERT INTO participant_keys (experiment_id, key_value, created_at) '
+                'SELECT ?, value, ? FROM json_each(?) WHERE true '
+                'ON CONFLICT (key_value) DO NOTHING '
+                'RETURNING key_value',
+                (experiment_id, created_at, json.dumps(keys))
+            ).fetchall()
+            return [row[0] for row in rows]
+
+        def write_batch(batch_count):
+            return self._write(lambda conn: generate_unique_keys(lambda keys: insert(conn, keys), batch_count))
+
+        return store_keys_in_batches(experiment_id, count, write_batch, batch_size or KEY_BATCH_SIZE, progress)
+
+    def redeem_key(self, key):
+        # Keys that were never issued are rejected without a database lookup
+        if not is_key_possibly_valid(key):
+            logger.warning(f"Invalid key attempted: {key}")
+            return None
+
+        now = _to_db_time(datetime.now())
+
+        def redeem(conn):
+            row = conn.execute(
+                'SELECT pk.id, pk.experiment_id, e.type, pk.status '
+                'FROM participant_keys pk JOIN experiments e ON e.id = pk.experiment_id '
+                'WHERE pk.key_value = ?',
+                (key,)
+            ).fetchone()
+            if not row:
+                return None
+
+            key_id, experiment_id, experiment_type, status = row
+            participant_id = None
+
+            # The write lock taken by BEGIN IMMEDIATE makes check-and-claim atomic
+            if conn.execute(
+                'UPDATE participant_keys SET status = ?, used_at = ? WHERE id = ? AND status = ?',
+                ('used', now, key_id, 'unused')
+            ).rowcount:
+                participant_id = conn.execute(
+                    'INSERT INTO participants (key_id, experiment_id, joined_at) VALUES (?, ?, ?)',
+                    (key_id, experiment_id, now)
+                ).lastrowid
+                status = 'used'
+
+            return {
+                'id': key_id,
+                'experiment_id': experiment_id,
+                'experiment_type': experiment_type,
+                'status': status,
+                'participant_id': participant_id
+            }
+
+        result = self._write(redeem)
+        if result is None:
+            logger.warning(f"Invalid key attempted: {key}")
+        elif result['participant_id'] is None:
+            logger.warning(f"Used key attempted: {key}")
+        return result
+
+    def revoke_key(self, key):
+        cur = self._conn().execute(
+            'UPDATE participant_keys SET status = ?, revoked_at = ? WHERE key_value = ?',
+            ('revoked', _to_db_time(datetime.now()), key)
+        )
+        return cur.rowcount > 0
+
+    def get_keys(self, experiment_id, status=None, after_id=None, limit=None):
+        # NULL parameters disable their filter, keeping a single cached statement
+        rows = self._conn().execute(
+            'SELECT id, key_value, status, created_at, used_at, revoked_at FROM participant_keys '
+            'WHERE experiment_id = ? AND (? IS NULL OR status = ?) AND id > ? '
+            'ORDER BY id LIMIT ?',
+            (experiment_id, status, status, after_id or 0, -1 if limit is None else limit)
+        ).fetchall()
+        return [
+            {
+                'id': row[0],
+                'key': row[1],
+                'status': row[2],
+                'created_at': _from_db_time(row[3]),
+                'used_at': _from_db_time(row[4]),
+                'revoked_at': _from_db_time(row[5])
+            }
+            for row in rows
+        ]
+
+    def get_key_status_counts(self, experiment_id):
+        counts = {'unused': 0, 'used': 0, 'revoked': 0}
+        for status, count in self._conn().execute(
+            'SELECT status, COUNT(*) FROM participant_keys WHERE experiment_id = ? GROUP BY status',
+            (experiment_id,)
+        ):
+            counts[status] = count
+        counts['total'] = sum(counts.values())
+        return counts
+
+    def count_keys(self, after_id=0):
+        return self._conn().execute(
+            'SELECT COUNT(*), MAX(id) FROM participant_keys WHERE id > ?', (after_id,)
+        ).fetchone()
+
+    def iter_key_values(self, after_id, chunk_size):
+        # One short query per chunk, so no read transaction stays open between them
+        while True:
+            rows = self._conn().execute(
+                'SELECT id, key_value FROM participant_keys WHERE id > ? ORDER BY id LIMIT ?',
+                (after_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+    # Participants
+
+    def get_participant(self, participant_id):
+        row = self._conn().execute(
+            'SELECT id, key_id, experiment_id, joined_at, completed_at FROM participants WHERE id = ?',
+            (participant_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'key_id': row[1],
+            'experiment_id': row[2],
+            'joined_at': _from_db_time(row[3]),
+            'completed_at': _from_db_time(row[4])
+        }
+
+    def complete_participant(self, participant_id):
+        cur = self._conn().execute(
+            'UPDATE participants SET completed_at = ? WHERE id = ?',
+            (_to_db_time(datetime.now()), participant_id)
+        )
+        return cur.rowcount > 0
+
+    # Experiment sessions
+
+    def start_session(self, participant_id, experiment_id, data=None):
+        document, rounds = split_rounds_data(data)
+        cur = self._conn().execute(
+            'INSERT INTO experiment_sessions (participant_id, experiment_id, started_at, data) '
+            'VALUES (?, ?, ?, ?)',
+            (participant_id, experiment_id, _to_db_time(datetime.now()), json.dumps(document))
+        )
+        if rounds:
+            self.update_session(cur.lastrowid, data)
+        return cur.lastrowid
+
+    def get_session(self, session_id):
+        row = self._conn().execute(
+            'SELECT id, participant_id, experiment_id, started_at, completed_at, data '
+            'FROM experiment_session_documents WHERE id = ?',
+            (session_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'participant_id': row[1],
+            'experiment_id': row[2],
+            'started_at': _from_db_time(row[3]),
+            'completed_at': _from_db_time(row[4]),
+            'data': json.loads(row[5]) if row[5] else None
+        }
+
+    def update_session(self, session_id, data):
+        document, rounds = split_rounds_data(data)
+        if rounds is None:
+            cur = self._conn().execute(
+                'UPDATE experiment_sessions SET data = ? WHERE id = ?',
+                (json.dumps(document), session_id)
+            )
+            return cur.rowcount > 0
+
+        now = _to_db_time(datetime.now())
+
+        def update(conn):
+            cur = conn.execute('UPDATE experiment_sessions SET data = ? WHERE id = ?',
+                               (json.dumps(document), session_id))
+            if cur.rowcount == 0:
+                return False
+            conn.executemany(
+                'INSERT INTO experiment_session_rounds (session_id, round_number, data, recorded_at) '
+                'VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (session_id, round_number) DO UPDATE SET data = excluded.data '
+                'WHERE experiment_session_rounds.data IS NOT excluded.data',
+                [(session_id, number, json.dumps(r), now) for number, r in enumerate(rounds, 1)]
+            )
+            conn.execute('DELETE FROM experiment_session_rounds WHERE session_id = ? AND round_number > ?',
+                         (session_id, len(rounds)))
+            return True
+
+        return self._write(update)
+
+    def record_session_round(self, session_id, round_number, data):
+        self._conn().execute(
+            'INSERT INTO experiment_session_rounds (session_id, round_number, data, recorded_at) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (session_id, round_number) DO UPDATE SET data = excluded.data, '
+            'recorded_at = excluded.recorded_at',
+            (session_id, round_number, json.dumps(data), _to_db_time(datetime.now()))
+        )
+
+    def complete_session(self, session_id):
+        cur = self._conn().execute(
+            'UPDATE experiment_sessions SET completed_at = ? WHERE id = ?',
+            (_to_db_time(datetime.now()), session_id)
+        )
+        return cur.rowcount > 0
+
+    # Results
+
+    def record_result(self, participant_id, experiment_id, result_data, session_id=None):
+        cur = self._conn().execute(
+            'INSERT INTO experiment_results (session_id, participant_id, experiment_id, result_data, recorded_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (session_id, participant_id, experiment_id, json.dumps(result_data), _to_db_time(datetime.now()))
+        )
+        return cur.lastrowid
+
+    def get_results(self, experiment_id):
+        rows = self._conn().execute(
+            'SELECT id, session_id, participant_id, result_data, recorded_at '
+            'FROM experiment_results WHERE experiment_id = ? ORDER BY id',
+            (experiment_id,)
+        ).fetchall()
+        return [
+            {
+                'id': row[0],
+                'session_id': row[1],
+                'participant_id': row[2],
+                'result_data': json.loads(row[3]) if row[3] else None,
+                'recorded_at': _from_db_time(row[4])
+            }
+            for row in rows
+        ]
+
+    # Decisions
+
+    def record_decisions(self, decisions):
+        if not decisions:
+            return 0
+
+        rows = [
+            (
+                d['uid'], d['participant_id'], d['experiment_id'], d['round_number'],
+                encode_decision(d['decision']),
+                json.dumps(d['metadata']) if d.get('metadata') is not None else None,
+                _to_db_time(datetime.fromisoformat(d['created_at'])),
+            )
+            for d in decisions
+        ]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO participant_decisions '
+                '(decision_uid, participant_id, experiment_id, round_number, decision, metadata, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            return conn.total_changes - before
+
+        return self._write(insert)
+
+    def get_decisions(self, participant_id):
+        rows = self._conn().execute(
+            'SELECT round_number, decision, metadata, created_at FROM participant_decisions '
+            'WHERE participant_id = ? ORDER BY round_number, id',
+            (participant_id,)
+        ).fetchall()
+        return [
+            {
+                'round_number': row[0],
+                'decision': decode_decision(row[1]),
+                'metadata': json.loads(row[2]) if row[2] else None,
+                'created_at': _from_db_time(row[3]),
+            }
+            for row in rows
+        ]
+
+    def get_decision_counts(self, experiment_id):
+        rows = self._conn().execute(
+            'SELECT round_number, decision, COUNT(*) FROM participant_decisions '
+            'WHERE experiment_id = ? GROUP BY round_number, decision ORDER BY round_number',
+            (experiment_id,)
+        ).fetchall()
+        counts = {}
+        for round_number, code, count in rows:
+            counts.setdefault(round_number, dict.fromkeys(DECISIONS, 0))[decode_decision(code)] = count
+        return counts
+
+    # Participant sessions
+
+    def load_participant_session(self, session_id):
+        row = self._conn().execute(
+            'SELECT data, generation, expires_at FROM participant_sessions '
+            'WHERE id = ? AND expires_at > ?',
+            (session_id, _to_db_time(datetime.now()))
+        ).fetchone()
+        if not row:
+            return None
+        return {'data': row[0], 'generation': row[1], 'expires_at': _from_db_time(row[2])}
+
+    def save_participant_session(self, session_id, data, generation, expires_at):
+        cur = self._conn().execute(
+            'INSERT INTO participant_sessions (id, data, generation, expires_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET data = excluded.data, generation = excluded.generation, '
+            'expires_at = excluded.expires_at, updated_at = excluded.updated_at '
+            'WHERE participant_sessions.generation = excluded.generation - 1',
+            (session_id, data, generation, _to_db_time(expires_at), _to_db_time(datetime.now()))
+        )
+        return cur.rowcount > 0
+
+    def delete_participant_session(self, session_id):
+        cur = self._conn().execute('DELETE FROM participant_sessions WHERE id = ?', (session_id,))
+        return cur.rowcount > 0
+
+    def purge_expired_sessions(self):
+        cur = self._conn().execute(
+            'DELETE FROM participant_sessions WHERE expires_at <= ?', (_to_db_time(datetime.now()),)
+        )
+        return cur.rowcount
+
+    # Administration
+
+    def _iter_rows(self, query, params, chunk_size):
+        """Yield rows from a cursor, fetching ``chunk_size`` at a time."""
+        cur = self._conn().execute(query, params)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cur.close()
+
+    def _user(self, row):
+        if not row:
+            return None
+        return dict(zip(('id', 'username', 'password_hash', 'email', 'role'), row))
+
+    def get_user(self, user_id):
+        return self._user(self._conn().execute(
+            'SELECT id, username, password_hash, email, role FROM users WHERE id = ?',
+            (user_id,)
+        ).fetchone())
+
+    def find_user(self, username=None, email=None):
+        return self._user(self._conn().execute(
+            'SELECT id, username, password_hash, email, role FROM users '
+            'WHERE username = ? OR email = ? LIMIT 1',
+            (username, email)
+        ).fetchone())
+
+    def create_user(self, username, password_hash, email=None, role='researcher'):
+        cur = self._conn().execute(
+            'INSERT INTO users (username, password_hash, email, role, created_at) VALUES (?, ?, ?, ?, ?)',
+            (username, password_hash, email, role, _to_db_time(datetime.now()))
+        )
+        return cur.lastrowid
+
+    def record_login(self, user_id):
+        self._conn().execute(
+            'UPDATE users SET last_login = ? WHERE id = ?', (_to_db_time(datetime.now()), user_id)
+        )
+
+    def get_experiment_overview(self):
+        rows = self._conn().execute(
+            'SELECT e.id, e.type, e.name, e.created_at, '
+            '(SELECT COUNT(*) FROM participants p WHERE p.experiment_id = e.id AND p.completed_at IS NULL) '
+            'FROM experiments e ORDER BY e.created_at DESC, e.id DESC'
+        ).fetchall()
+        return [
+            {
+                'id': row[0],
+                'type': row[1],
+                'name': row[2],
+                'created_at': _from_db_time(row[3]),
+                'active_participants': row[4]
+            }
+            for row in rows
+        ]
+
+    def count_participants(self, experiment_id):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM participants WHERE experiment_id = ?', (experiment_id,)
+        ).fetchone()[0]
+
+    def count_completed_rounds(self, experiment_id):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM experiment_rounds WHERE experiment_id = ? AND status = ?',
+            (experiment_id, 'completed')
+        ).fetchone()[0]
+
+    def iter_rounds(self, experiment_id, chunk_size):
+        rows = self._iter_rows(
+            'SELECT er.id, er.round_number, er.started_at, er.completed_at, rr.results '
+            'FROM experiment_rounds er '
+            'LEFT JOIN round_results rr ON er.id = rr.round_id '
+            'WHERE er.experiment_id = ? '
+            'ORDER BY er.round_number',
+            (experiment_id,), chunk_size
+        )
+        for round_id, round_number, started_at, completed_at, results in rows:
+            yield (
+                round_id, round_number, _from_db_time(started_at), _from_db_time(completed_at),
+                json.loads(results) if results else None
+            )
+
+    def iter_participants(self, experiment_id, chunk_size):
+        rows = self._iter_rows(
+            'SELECT p.id, p.participant_type, p.joined_at, p.completed_at, pk.key_value '
+            'FROM participants p '
+            'JOIN participant_keys pk ON p.key_id = pk.id '
+            'WHERE p.experiment_id = ?',
+            (experiment_id,), chunk_size
+        )
+        for participant_id, participant_type, joined_at, completed_at, key in rows:
+            yield participant_id, participant_type, _from_db_time(joined_at), _from_db_time(completed_at), key
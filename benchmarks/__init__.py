@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Modular Experiment Platform.
+
+These are run manually for capacity planning and are not part of the test suite.
+"""
@@ -0,0 +1,144 @@
+"""
+Fixtures for the key_manager micro-benchmarks.
+
+The benchmarks need pytest-benchmark and a local PostgreSQL database given
+by BENCH_DB_HOST (plus BENCH_DB_NAME, BENCH_DB_USER and BENCH_DB_PASSWORD).
+Table sizes come from BENCH_TABLE_SIZES, a comma-separated list of key
+counts (default: 10000). Seeded experiments are kept between runs, so the
+1M and 10M key tables are only generated once.
+
+Benchmarks that write to a seeded experiment use ``restore_experiment``,
+which undoes their writes afterwards, so that every run (and every
+--benchmark-compare against a saved baseline) measures the same table. An
+experiment that is not in its seeded state, e.g. after an interrupted run,
+is regenerated.
+"""
+
+import os
+
+import pytest
+
+# Key counts of the participant_keys tables the benchmarks run against
+TABLE_SIZES = [int(size) for size in os.getenv('BENCH_TABLE_SIZES', '10000').split(',')]
+
+
+def pytest_generate_tests(metafunc):
+    """Run every benchmark that takes ``table_size`` once per configured size."""
+    if 'table_size' in metafunc.fixturenames:
+        metafunc.parametrize('table_size', TABLE_SIZES, ids=[f'{size}keys' for size in TABLE_SIZES])
+
+
+@pytest.fixture(scope='session')
+def bench_conn():
+    """A connection to the benchmark database with an up-to-date schema."""
+    if not os.getenv('BENCH_DB_HOST'):
+        pytest.skip('BENCH_DB_HOST not set')
+
+    from app.db import pool
+    from app.db.migrations import run_migrations
+
+    pool.close_pool()
+    pool._settings.update(
+        host=os.getenv('BENCH_DB_HOST'),
+        database=os.getenv('BENCH_DB_NAME', 'bench_experiment_db'),
+        user=os.getenv('BENCH_DB_USER', 'user'),
+        password=os.getenv('BENCH_DB_PASSWORD', 'password'),
+    )
+
+    conn = pool.get_db_connection()
+    run_migrations(conn)
+    yield conn
+    conn.close()
+    pool.close_pool()
+
+
+@pytest.fixture(scope='session')
+def seeded_experiments(bench_conn):
+    """Experiments with exactly N keys, keyed by N, created on first use."""
+    experiments = {}
+
+    def get(size):
+        if size not in experiments:
+            experiments[size] = _seed_experiment(bench_conn, size)
+        return experiments[size]
+
+    return get
+
+
+@pytest.fixture
+def experiment(seeded_experiments, table_size):
+    """The seeded experiment for the current table size."""
+    return seeded_experiments(table_size)
+
+
+@pytest.fixture
+def restore_experiment(bench_conn, experiment):
+    """Undo the keys created and the statuses changed by a benchmark."""
+    cur = bench_conn.cursor()
+    cur.execute('SELECT COALESCE(MAX(id), 0) FROM participant_keys')
+    max_id = cur.fetchone()[0]
+
+    yield experiment
+
+    cur.execute('DELETE FROM participant_keys WHERE experiment_id = %s AND id > %s', (experiment, max_id))
+    cur.execute(
+        "UPDATE participant_keys SET status = 'unused', used_at = NULL, revoked_at = NULL "
+        "WHERE experiment_id = %s AND status <> 'unused'",
+        (experiment,)
+    )
+    # Leave no dead tuples behind for the next benchmark to scan past
+    cur.execute('VACUUM ANALYZE participant_keys')
+
+
+@pytest.fixture
+def sample_keys(bench_conn, experiment):
+    """A random sample of (id, key_value) pairs of the current experiment."""
+    cur = bench_conn.cursor()
+    cur.execute(
+        'SELECT id, key_value FROM participant_keys TABLESAMPLE SYSTEM (1) '
+        'WHERE experiment_id = %s LIMIT 1000',
+        (experiment,)
+    )
+    rows = cur.fetchall()
+    if not rows:
+        cur.execute('SELECT id, key_value FROM participant_keys WHERE experiment_id = %s LIMIT 1000',
+                    (experiment,))
+        rows = cur.fetchall()
+    return rows
+
+
+def _seed_experiment(conn, size):
+    """
+    Get or create the benchmark experiment with ``size`` keys.
+
+    Keys are generated server-side with generate_series so that even 10M
+    keys take minutes rather than hours.
+    """
+    name = f'benchmark-{size}'
+    cur = conn.cursor()
+
+    cur.execute('SELECT id FROM experiments WHERE name = %s', (name,))
+    row = cur.fetchone()
+    if row:
+        cur.execute(
+            "SELECT COUNT(*), COUNT(*) FILTER (WHERE status <> 'unused') "
+            'FROM participant_keys WHERE experiment_id = %s',
+            (row[0],)
+        )
+        total, changed = cur.fetchone()
+        if total == size and changed == 0:
+            return row[0]
+        cur.execute('DELETE FROM experiments WHERE id = %s', (row[0],))
+
+    cur.execute(
+        "INSERT INTO experiments (type, name, parameters) VALUES ('benchmark', %s, '{}') RETURNING id",
+        (name,)
+    )
+    experiment_id = cur.fetchone()[0]
+    cur.execute(
+        'INSERT INTO participant_keys (experiment_id, key_value) '
+        "SELECT %s, md5(%s || '-' || i) FROM generate_series(1, %s) AS i",
+        (experiment_id, name, size)
+    )
+    cur.execute('ANALYZE participant_keys')
+    return experiment_id
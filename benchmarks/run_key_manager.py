@@ -0,0 +1,53 @@
+"""
+Run the key_manager micro-benchmarks with baseline tracking.
+
+    python -m benchmarks.run_key_manager --save       # record a new baseline
+    python -m benchmarks.run_key_manager --compare    # fail on regressions
+
+Baselines are stored by pytest-benchmark under benchmarks/baselines. A run
+with --compare fails when the mean of any benchmark is more than
+--threshold percent (default: BENCH_REGRESSION_THRESHOLD or 10) slower
+than in the latest saved baseline.
+"""
+
+import os
+import sys
+import argparse
+
+import pytest
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCHMARK_DIR, 'baselines')
+
+# Allowed slowdown of a benchmark's mean, in percent, before --compare fails
+DEFAULT_THRESHOLD = float(os.getenv('BENCH_REGRESSION_THRESHOLD', 10))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the key_manager micro-benchmarks.')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--save', action='store_true', help='Record the results as the new baseline')
+    mode.add_argument('--compare', action='store_true', help='Compare against the latest baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed regression of the mean, in percent')
+    parser.add_argument('pytest_args', nargs='*', help='Extra arguments passed to pytest')
+    args = parser.parse_args(argv)
+
+    pytest_args = [
+        os.path.join(BENCHMARK_DIR, 'test_key_manager.py'),
+        '-p', 'no:cacheprovider',
+        '--no-cov',
+        '--benchmark-only',
+        f'--benchmark-storage=file://{BASELINE_DIR}',
+        '--benchmark-sort=name',
+    ]
+    if args.save:
+        pytest_args.append('--benchmark-autosave')
+    else:
+        pytest_args += ['--benchmark-compare', f'--benchmark-compare-fail=mean:{args.threshold:g}%']
+
+    return pytest.main(pytest_args + args.pytest_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
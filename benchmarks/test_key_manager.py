@@ -0,0 +1,83 @@
+"""
+Micro-benchmarks for the key_manager functions on the participant hot path.
+
+Run against a local PostgreSQL database (see benchmarks/conftest.py):
+
+    BENCH_DB_HOST=localhost python -m benchmarks.run_key_manager --save
+    BENCH_DB_HOST=localhost python -m benchmarks.run_key_manager --compare
+
+The first command records a baseline under benchmarks/baselines; the second
+runs the suite again and fails if any benchmark's mean regressed by more
+than BENCH_REGRESSION_THRESHOLD percent (default 10).
+"""
+
+import random
+import itertools
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from app.auth.key_manager import (
+    generate_key,
+    create_keys_for_experiment,
+    validate_key,
+    mark_key_as_used,
+    revoke_key,
+    get_keys_for_experiment,
+    get_key_status_counts,
+)
+
+# Keys created per create_keys_for_experiment call
+CREATE_BATCH = 1000
+
+
+def test_generate_key(benchmark):
+    """Cost of generating one key in memory."""
+    key = benchmark(generate_key)
+    assert len(key) == 32
+
+
+def test_create_keys_for_experiment(benchmark, bench_conn, experiment, restore_experiment):
+    """Cost of storing CREATE_BATCH keys next to the existing ones."""
+    keys = benchmark.pedantic(
+        create_keys_for_experiment,
+        args=(experiment, CREATE_BATCH, bench_conn),
+        kwargs={'progress': lambda stored, count: None},
+        rounds=5,
+    )
+    assert len(keys) == CREATE_BATCH
+
+
+def test_validate_key(benchmark, bench_conn, sample_keys):
+    """Cost of looking up one existing key."""
+    keys = itertools.cycle([key for _, key in sample_keys])
+    result = benchmark(lambda: validate_key(next(keys), bench_conn))
+    assert len(result) == 3
+
+
+def test_mark_key_as_used(benchmark, bench_conn, sample_keys, restore_experiment):
+    """Cost of marking one key as used by id."""
+    key_ids = itertools.cycle([key_id for key_id, _ in sample_keys])
+    assert benchmark(lambda: mark_key_as_used(next(key_ids), bench_conn))
+
+
+def test_revoke_key(benchmark, bench_conn, sample_keys, restore_experiment):
+    """Cost of revoking one key by value."""
+    keys = itertools.cycle([key for _, key in sample_keys])
+    assert benchmark(lambda: revoke_key(next(keys), bench_conn))
+
+
+def test_get_keys_for_experiment_page(benchmark, bench_conn, experiment, sample_keys):
+    """Cost of one 100-key page at a random position in the experiment."""
+    after_ids = itertools.cycle(random.sample([key_id for key_id, _ in sample_keys], len(sample_keys)))
+    page = benchmark(
+        lambda: get_keys_for_experiment(experiment, bench_conn, after_id=next(after_ids), limit=100)
+    )
+    assert len(page) <= 100
+
+
+def test_get_key_status_counts(benchmark, bench_conn, experiment, table_size):
+    """Cost of counting an experiment's keys by status."""
+    counts = benchmark(get_key_status_counts, experiment, bench_conn)
+    assert counts['total'] >= table_size
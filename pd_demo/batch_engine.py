@@ -0,0 +1,174 @@
+"""
+Vectorized engine for strategy-vs-strategy matches.
+
+Plays many iterated matches in lockstep with NumPy: the moves of every
+match in a turn are one int8 array, each strategy computes its moves for
+all of its matches at once, and scores come from indexing the payoff
+matrix with the two move arrays. Round-robin tournaments of millions of
+rounds finish in seconds, which makes them a cheap baseline to compare
+the LLM player against.
+"""
+
+import argparse
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from pd_game import STRATEGIES
+
+COOPERATE = 0
+DEFECT = 1
+MOVE_NAMES = ('cooperate', 'defect')
+
+# PAYOFF[my_move, their_move] is my score for the round
+PAYOFF = np.array([[3, 0],
+                   [5, 1]], dtype=np.int16)
+
+# A vectorized rule gets the turn number and, per match, the player's and the
+# opponent's previous moves (undefined on turn 0), and returns the moves
+VectorRule = Callable[[int, np.ndarray, np.ndarray], np.ndarray]
+
+
+def tit_for_tat(turn: int, my_last: np.ndarray, opp_last: np.ndarray) -> np.ndarray:
+    if turn == 0:
+        return np.full(opp_last.shape, COOPERATE, dtype=np.int8)
+    return opp_last.copy()
+
+
+def always_defect(turn: int, my_last: np.ndarray, opp_last: np.ndarray) -> np.ndarray:
+    return np.full(opp_last.shape, DEFECT, dtype=np.int8)
+
+
+def always_cooperate(turn: int, my_last: np.ndarray, opp_last: np.ndarray) -> np.ndarray:
+    return np.full(opp_last.shape, COOPERATE, dtype=np.int8)
+
+
+# Vectorized equivalents of the strategies in pd_game.STRATEGIES
+VECTOR_RULES: Dict[str, VectorRule] = {
+    'TitForTat': tit_for_tat,
+    'AlwaysDefect': always_defect,
+    'AlwaysCooperate': always_cooperate,
+}
+
+
+def play_batch(strategies: Sequence[str], left: np.ndarray, right: np.ndarray, turns: int,
+               noise: float = 0.0, seed: Optional[int] = None, keep_history: bool = False) -> Dict:
+    """
+    Play a batch of matches in lockstep.
+
+    Args:
+        strategies: Strategy names; ``left`` and ``right`` index into it
+        left: Strategy index of the first player of each match
+        right: Strategy index of the second player of each match
+        turns: Rounds per match
+        noise: Probability that any move is flipped (a trembling hand), which
+            makes repetitions of deterministic pairings differ
+        seed: Seed for the noise
+        keep_history: Also return every move, as (turns, matches) int8 arrays
+
+    Returns:
+        Dictionary with per-match 'left_scores' and 'right_scores', and the
+        'left_moves' and 'right_moves' histories if requested
+    """
+    missing = [name for name in strategies if name not in VECTOR_RULES]
+    if missing:
+        raise ValueError(f"Strategy '{missing[0]}' has no vectorized rule")
+
+    left = np.asarray(left)
+    right = np.asarray(right)
+    matches = len(left)
+    rules = [VECTOR_RULES[name] for name in strategies]
+    # Matches grouped by the strategy of each side, computed once
+    left_groups = [(rule, np.flatnonzero(left == i)) for i, rule in enumerate(rules)]
+    right_groups = [(rule, np.flatnonzero(right == i)) for i, rule in enumerate(rules)]
+    left_groups = [(rule, idx) for rule, idx in left_groups if len(idx)]
+    right_groups = [(rule, idx) for rule, idx in right_groups if len(idx)]
+
+    rng = np.random.default_rng(seed)
+    left_last = np.zeros(matches, dtype=np.int8)
+    right_last = np.zeros(matches, dtype=np.int8)
+    left_moves = np.empty(matches, dtype=np.int8)
+    right_moves = np.empty(matches, dtype=np.int8)
+    left_scores = np.zeros(matches, dtype=np.int64)
+    right_scores = np.zeros(matches, dtype=np.int64)
+    if keep_history:
+        left_history = np.empty((turns, matches), dtype=np.int8)
+        right_history = np.empty((turns, matches), dtype=np.int8)
+
+    for turn in range(turns):
+        for rule, idx in left_groups:
+            left_moves[idx] = rule(turn, left_last[idx], right_last[idx])
+        for rule, idx in right_groups:
+            right_moves[idx] = rule(turn, right_last[idx], left_last[idx])
+        if noise:
+            left_moves ^= (rng.random(matches) < noise).astype(np.int8)
+            right_moves ^= (rng.random(matches) < noise).astype(np.int8)
+
+        left_scores += PAYOFF[left_moves, right_moves]
+        right_scores += PAYOFF[right_moves, left_moves]
+        if keep_history:
+            left_history[turn] = left_moves
+            right_history[turn] = right_moves
+        left_last, left_moves = left_moves, left_last
+        right_last, right_moves = right_moves, right_last
+
+    result = {'left_scores': left_scores, 'right_scores': right_scores}
+    if keep_history:
+        result['left_moves'] = left_history
+        result['right_moves'] = right_history
+    return result
+
+
+def round_robin(strategies: Optional[Sequence[str]] = None, turns: int = 200, repetitions: int = 1,
+                noise: float = 0.0, seed: Optional[int] = None) -> Dict:
+    """
+    Play every strategy against every strategy, itself included.
+
+    Args:
+        strategies: Strategy names (default: all of pd_game.STRATEGIES)
+        turns: Rounds per match
+        repetitions: Matches per pairing
+        noise: Probability that any move is flipped
+        seed: Seed for the noise
+
+    Returns:
+        Dictionary with the 'strategies', the 'mean' and 'variance' score
+        matrices (row strategy's score against the column strategy, per
+        match), and the number of 'rounds' played
+    """
+    strategies = list(strategies or STRATEGIES)
+    count = len(strategies)
+    rows, cols = np.meshgrid(np.arange(count), np.arange(count), indexing='ij')
+    left = np.repeat(rows.ravel(), repetitions)
+    right = np.repeat(cols.ravel(), repetitions)
+
+    result = play_batch(strategies, left, right, turns, noise=noise, seed=seed)
+    scores = result['left_scores'].reshape(count, count, repetitions)
+    return {
+        'strategies': strategies,
+        'mean': scores.mean(axis=2),
+        'variance': scores.var(axis=2, ddof=1) if repetitions > 1 else np.zeros((count, count)),
+        'rounds': len(left) * turns,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run a round-robin tournament from the command line."""
+    parser = argparse.ArgumentParser(description='Play a vectorized round-robin tournament')
+    parser.add_argument('--strategies', nargs='+', default=list(VECTOR_RULES))
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--repetitions', type=int, default=1000)
+    parser.add_argument('--noise', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    result = round_robin(args.strategies, args.turns, args.repetitions, args.noise, args.seed)
+    width = max(len(name) for name in result['strategies'])
+    print(f"Mean score per match ({result['rounds']:,} rounds played)")
+    print(' ' * width + ''.join(f"{name:>{width + 2}}" for name in result['strategies']))
+    for name, row in zip(result['strategies'], result['mean']):
+        print(f"{name:<{width}}" + ''.join(f"{score:>{width + 2}.1f}" for score in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+LLM clients for the Prisoner's Dilemma demo.
+
+PDGame asks an LLMClient for each move. OpenAIClient calls the OpenAI API.
+SimulatedClient answers locally from a configurable policy, with
+injectable latency and error rates, so that tournaments, the move cache
+and concurrency settings can be benchmarked without network access or an
+API key.
+"""
+
+import os
+import re
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Round lines of the prompt rendered by PDGame.build_prompt
+_ROUND_LINE = re.compile(r'^Round (\d+): You (cooperate|defect), Opponent (cooperate|defect)$', re.MULTILINE)
+
+
+class LLMClient:
+    """Base class for LLM backends."""
+    name = 'base'
+
+    def complete(self, model: str, temperature: float, system: str, prompt: str) -> str:
+        """
+        Get the LLM's reply to a prompt.
+
+        Args:
+            model: Model to use
+            temperature: Sampling temperature
+            system: System message
+            prompt: User message
+
+        Returns:
+            The reply text
+
+        Raises:
+            Exception: If the request failed
+        """
+        raise NotImplementedError
+
+
+class OpenAIClient(LLMClient):
+    """Calls the OpenAI chat completions API."""
+    name = 'openai'
+
+    def __init__(self, api_key: Optional[str] = None, max_tokens: int = 10):
+        # Imported here so the simulated backend works without the package
+        import openai
+
+        api_key = api_key or os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("OpenAI API key not found in environment variables")
+        self.client = openai.OpenAI(api_key=api_key)
+        self.max_tokens = max_tokens
+
+    def complete(self, model: str, temperature: float, system: str, prompt: str) -> str:
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=temperature,
+            max_tokens=self.max_tokens
+        )
+        return response.choices[0].message.content
+
+
+# Policies of the simulated backend: (recent history, rng) -> move, where the
+# history is the (my_move, opponent_move) pairs shown in the prompt
+
+Policy = Callable[[List[Tuple[str, str]], random.Random], str]
+
+
+def tit_for_tat_policy(history: List[Tuple[str, str]], rng: random.Random) -> str:
+    """Cooperate first, then copy the opponent's last move."""
+    return history[-1][1] if history else 'cooperate'
+
+
+def probability_policy(table: Dict[Optional[str], float]) -> Policy:
+    """
+    Cooperate with a probability that depends on the opponent's last move.
+
+    Args:
+        table: P(cooperate) keyed by the opponent's last move, with the key
+            None for the first round, e.g.
+            {None: 0.9, 'cooperate': 0.9, 'defect': 0.3}
+    """
+    def policy(history: List[Tuple[str, str]], rng: random.Random) -> str:
+        last = history[-1][1] if history else None
+        return 'cooperate' if rng.random() < table.get(last, 0.5) else 'defect'
+    return policy
+
+
+POLICIES: Dict[str, Policy] = {
+    'tit_for_tat': tit_for_tat_policy,
+    'always_cooperate': lambda history, rng: 'cooperate',
+    'always_defect': lambda history, rng: 'defect',
+    'random': probability_policy({}),
+}
+
+
+# Latency distributions: rng -> seconds
+
+Latency = Callable[[random.Random], float]
+
+
+def constant_latency(seconds: float) -> Latency:
+    return lambda rng: seconds
+
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> Latency:
+    """Latency with a long tail, like a real API: half the calls take less than ``median``."""
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+
+class SimulatedError(RuntimeError):
+    """A failure injected by the simulated backend."""
+
+
+class SimulatedClient(LLMClient):
+    """
+    Answers locally from a policy, after a simulated delay.
+
+    The policy only sees the rounds shown in the prompt, like a real model.
+
+    Args:
+        policy: A name from POLICIES, a policy function, or a
+            probability_policy table
+        latency: Seconds per call, or a function drawing them from an rng
+        error_rate: Probability that a call fails with SimulatedError
+        seed: Seed for the policy, latency and errors
+    """
+    name = 'simulated'
+
+    def __init__(self, policy: Union[str, Policy, Dict[Optional[str], float]] = 'tit_for_tat',
+                 latency: Union[float, Latency, None] = None, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        if isinstance(policy, str):
+            if policy not in POLICIES:
+                raise ValueError(f"Policy '{policy}' not found")
+            policy = POLICIES[policy]
+        elif isinstance(policy, dict):
+            policy = probability_policy(policy)
+        if latency is None or isinstance(latency, (int, float)):
+            latency = constant_latency(latency or 0.0)
+
+        self.policy = policy
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_history(prompt: str) -> List[Tuple[str, str]]:
+        """Get the (my_move, opponent_move) pairs shown in a prompt."""
+        return [(mine, theirs) for _, mine, theirs in _ROUND_LINE.findall(prompt)]
+
+    def complete(self, model: str, temperature: float, system: str, prompt: str) -> str:
+        history = self.parse_history(prompt)
+        with self._lock:
+            self.calls += 1
+            delay = self.latency(self._random)
+            failed = self._random.random() < self.error_rate
+            move = None if failed else self.policy(history, self._random)
+            if failed:
+                self.errors += 1
+
+        # Sleep outside the lock, so concurrent calls overlap like real requests
+        time.sleep(delay)
+        if failed:
+            raise SimulatedError("Simulated LLM error")
+        return move
+
+
+def create_client(backend: Optional[str] = None, **options) -> LLMClient:
+    """
+    Create an LLM client by name.
+
+    Args:
+        backend: 'openai' or 'simulated' (default: the LLM_BACKEND
+            environment variable, or 'openai')
+        **options: Arguments for the client
+
+    Returns:
+        The new client
+    """
+    backend = backend or os.getenv('LLM_BACKEND', 'openai')
+    if backend == OpenAIClient.name:
+        return OpenAIClient(**options)
+    if backend == SimulatedClient.name:
+        return SimulatedClient(**options)
+    raise ValueError(f"Unknown LLM backend '{backend}'")
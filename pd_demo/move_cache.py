@@ -0,0 +1,135 @@
+"""
+Response cache for LLM moves.
+
+The prompt only shows the last five rounds and the round number, so the
+number of distinct prompts is small and the same prompts come up again and
+again across matches. This cache stores the moves the LLM answered per
+(model, temperature, prompt hash), in an in-memory LRU backed by an
+optional SQLite file that persists across runs.
+
+At temperature 0 the model is treated as deterministic: the first answer
+is reused. At higher temperatures the cache keeps counts of the observed
+answers. Once a prompt has ``min_samples`` observations, the cache draws
+moves from that empirical distribution instead of calling the API.
+"""
+
+import hashlib
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+MOVES = ('cooperate', 'defect')
+
+
+class MoveCache:
+    """
+    Two-tier cache of LLM moves.
+
+    Args:
+        path: SQLite file for the persistent tier (None: memory only)
+        capacity: Prompts kept in memory
+        min_samples: Observations of a prompt needed before sampling from
+            them at temperature > 0
+        seed: Seed for sampling, for reproducible runs
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 10000, min_samples: int = 5,
+                 seed: Optional[int] = None):
+        self.capacity = capacity
+        self.min_samples = min_samples
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, float, str], Dict[str, int]]' = OrderedDict()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS llm_moves ('
+                'model TEXT NOT NULL, temperature REAL NOT NULL, prompt_hash TEXT NOT NULL, '
+                'cooperate INTEGER NOT NULL DEFAULT 0, defect INTEGER NOT NULL DEFAULT 0, '
+                'PRIMARY KEY (model, temperature, prompt_hash))'
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(model: str, temperature: float, prompt: str) -> Tuple[str, float, str]:
+        """Cache key of a prompt sent to a model at a temperature."""
+        return (model, float(temperature), hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+
+    def _counts(self, key: Tuple[str, float, str]) -> Optional[Dict[str, int]]:
+        """Observed move counts from memory or disk; call with the lock held."""
+        counts = self._entries.get(key)
+        if counts is not None:
+            self._entries.move_to_end(key)
+            return counts
+
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            'SELECT cooperate, defect FROM llm_moves WHERE model = ? AND temperature = ? AND prompt_hash = ?',
+            key
+        ).fetchone()
+        if row is None:
+            return None
+        counts = dict(zip(MOVES, row))
+        self._remember(key, counts)
+        return counts
+
+    def _remember(self, key: Tuple[str, float, str], counts: Dict[str, int]) -> None:
+        self._entries[key] = counts
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, model: str, temperature: float, prompt: str) -> Optional[str]:
+        """
+        Get a move for a prompt without calling the LLM.
+
+        Returns:
+            'cooperate' or 'defect', or None if the LLM has to be asked
+        """
+        key = self.key(model, temperature, prompt)
+        with self._lock:
+            counts = self._counts(key)
+            observed = sum(counts.values()) if counts else 0
+            needed = 1 if temperature == 0 else self.min_samples
+            if observed < needed:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if temperature == 0:
+                return max(MOVES, key=counts.get)
+            return self._random.choices(MOVES, weights=[counts[move] for move in MOVES])[0]
+
+    def record(self, model: str, temperature: float, prompt: str, move: str) -> None:
+        """Record a move the LLM answered to a prompt."""
+        if move not in MOVES:
+            return
+        key = self.key(model, temperature, prompt)
+        with self._lock:
+            counts = self._counts(key)
+            if counts is None:
+                counts = dict.fromkeys(MOVES, 0)
+                self._remember(key, counts)
+            counts[move] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    f'INSERT INTO llm_moves (model, temperature, prompt_hash, {move}) VALUES (?, ?, ?, 1) '
+                    f'ON CONFLICT (model, temperature, prompt_hash) DO UPDATE SET {move} = {move} + 1',
+                    key
+                )
+                self._db.commit()
+
+    def close(self) -> None:
+        """Close the SQLite file."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -2,14 +2,77 @@
 Simplified Prisoner's Dilemma implementation with LLM player.
 """
 
-import os
-import openai
-from typing import List, Dict, Tuple
+from collections.abc import Sequence
+from typing import List, Dict, Optional, Tuple
+
+from llm_clients import LLMClient, create_client
+from move_cache import MoveCache
+
+MOVES = ('cooperate', 'defect')
+_MOVE_CODES = {move: code for code, move in enumerate(MOVES)}
+
+class HistoryView(Sequence):
+    """Read-only view of one player's moves; grows with the match."""
+    def __init__(self, buffer: bytearray):
+        self._buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [MOVES[code] for code in self._buffer[index]]
+        return MOVES[self._buffer[index]]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (HistoryView, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"HistoryView({list(self)!r})"
+
+class MoveHistory:
+    """Append-only record of a match, one byte per move."""
+    def __init__(self):
+        self._mine = bytearray()
+        self._theirs = bytearray()
+        self.mine = HistoryView(self._mine)
+        self.opponent = HistoryView(self._theirs)
+
+    def append(self, my_move: str, opp_move: str) -> None:
+        try:
+            my_code, opp_code = _MOVE_CODES[my_move], _MOVE_CODES[opp_move]
+        except KeyError as e:
+            raise ValueError(f"Invalid move {e}") from None
+        self._mine.append(my_code)
+        self._theirs.append(opp_code)
+
+    def __len__(self) -> int:
+        return len(self._mine)
 
 class Strategy:
-    """Base class for opponent strategies."""
+    """
+    Base class for opponent strategies.
+
+    A match calls next_move() for every turn and then observe() with both
+    moves. By default the moves are kept in a MoveHistory, and next_move()
+    passes a read-only view of the opponent's moves to get_move(), so
+    strategies that only implement get_move(history) keep working without
+    the history being copied every turn. Strategies that only need a little
+    state override observe() and next_move() instead.
+    """
     def __init__(self, name: str):
         self.name = name
+        self.history = MoveHistory()
+
+    def observe(self, my_move: str, opp_move: str) -> None:
+        """Record the moves of the turn just played."""
+        self.history.append(my_move, opp_move)
+
+    def next_move(self) -> str:
+        """Choose the move for the next turn."""
+        return self.get_move(self.history.opponent)
         
     def get_move(self, history: List[str]) -> str:
         raise NotImplementedError
@@ -18,6 +81,13 @@ class TitForTat(Strategy):
     """Implements the Tit-for-Tat strategy."""
     def __init__(self):
         super().__init__("TitForTat")
+        self.last_opponent_move = None
+
+    def observe(self, my_move: str, opp_move: str) -> None:
+        self.last_opponent_move = opp_move
+
+    def next_move(self) -> str:
+        return self.last_opponent_move or 'cooperate'
         
     def get_move(self, history: List[str]) -> str:
         if not history:
@@ -28,6 +98,12 @@ class AlwaysDefect(Strategy):
     """Always defects."""
     def __init__(self):
         super().__init__("AlwaysDefect")
+
+    def observe(self, my_move: str, opp_move: str) -> None:
+        pass
+
+    def next_move(self) -> str:
+        return 'defect'
         
     def get_move(self, history: List[str]) -> str:
         return 'defect'
@@ -36,6 +112,12 @@ class AlwaysCooperate(Strategy):
     """Always cooperates."""
     def __init__(self):
         super().__init__("AlwaysCooperate")
+
+    def observe(self, my_move: str, opp_move: str) -> None:
+        pass
+
+    def next_move(self) -> str:
+        return 'cooperate'
         
     def get_move(self, history: List[str]) -> str:
         return 'cooperate'
@@ -51,32 +133,33 @@ class PDGame:
     Simple implementation of Prisoner's Dilemma game with an LLM player.
     """
     
-    def __init__(self, model: str = "gpt-3.5-turbo", temperature: float = 0.7):
+    SYSTEM_PROMPT = "You are playing Prisoner's Dilemma. Respond only with 'cooperate' or 'defect'."
+
+    def __init__(self, model: str = "gpt-3.5-turbo", temperature: float = 0.7,
+                 cache: Optional[MoveCache] = None, client: Optional[LLMClient] = None):
         """
         Initialize the game with LLM configuration.
         
         Args:
             model: The OpenAI model to use
             temperature: Temperature for LLM responses (0.0 to 1.0)
+            cache: Cache of LLM moves, shared between games (None: no cache)
+            client: LLM backend (default: the one named by LLM_BACKEND)
         """
         self.model = model
         self.temperature = temperature
-        
-        # Set up OpenAI API key
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
-        openai.api_key = api_key
+        self.cache = cache
+        self.client = client or create_client()
 
-    def get_llm_move(self, history: List[Tuple[str, str]]) -> str:
+    def build_prompt(self, history: List[Tuple[str, str]]) -> str:
         """
-        Get the next move from the LLM based on game history.
+        Render the prompt for the next move.
         
         Args:
             history: List of (llm_move, opponent_move) tuples
             
         Returns:
-            'cooperate' or 'defect'
+            The user prompt sent to the LLM
         """
         # Create a simple, focused prompt
         prompt = "You are playing the Prisoner's Dilemma game. For each round, both players choose to either cooperate or defect.\n\n"
@@ -93,27 +176,36 @@ class PDGame:
                 prompt += f"Round {round_num}: You {my_move}, Opponent {opp_move}\n"
         
         prompt += "\nWhat is your next move? Answer with exactly one word: cooperate or defect"
+        return prompt
 
-        try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[{
-                    "role": "system",
-                    "content": "You are playing Prisoner's Dilemma. Respond only with 'cooperate' or 'defect'."
-                }, {
-                    "role": "user",
-                    "content": prompt
-                }],
-                temperature=self.temperature,
-                max_tokens=10
-            )
+    def get_llm_move(self, history: List[Tuple[str, str]]) -> str:
+        """
+        Get the next move from the LLM based on game history.
+        
+        Args:
+            history: List of (llm_move, opponent_move) tuples
             
-            move = response.choices[0].message.content.strip().lower()
-            return 'cooperate' if move not in ['cooperate', 'defect'] else move
+        Returns:
+            'cooperate' or 'defect'
+        """
+        prompt = self.build_prompt(history)
+        if self.cache is not None:
+            move = self.cache.get(self.model, self.temperature, prompt)
+            if move is not None:
+                return move
+
+        try:
+            reply = self.client.complete(self.model, self.temperature, self.SYSTEM_PROMPT, prompt)
+            move = reply.strip().lower()
+            move = 'cooperate' if move not in ['cooperate', 'defect'] else move
             
         except Exception as e:
             print(f"Error getting LLM move: {str(e)}")
-            return 'cooperate'  # Default to cooperation on error
+            return 'cooperate'  # Default to cooperation on error (not cached)
+
+        if self.cache is not None:
+            self.cache.record(self.model, self.temperature, prompt, move)
+        return move
 
     def play_match(self, strategy_name: str = "TitForTat", turns: int = 10) -> Dict:
         """
@@ -143,7 +235,8 @@ class PDGame:
         for turn in range(turns):
             # Get moves from both players
             llm_move = self.get_llm_move(history)
-            strategy_move = strategy.get_move([h[0] for h in history])
+            strategy_move = strategy.next_move()
+            strategy.observe(strategy_move, llm_move)
             
             # Calculate scores
             if llm_move == strategy_move == 'cooperate':
@@ -0,0 +1,264 @@
+"""
+Tournament runner for the Prisoner's Dilemma demo.
+
+Plays a grid of matches (model x temperature x strategy x turns x
+repetition) concurrently. Each match spends almost all of its time waiting
+on the LLM API, so matches run on a bounded thread pool, with an optional
+cap on concurrent matches per model to stay under each model's rate limit.
+Results are yielded as soon as each match finishes, and aggregated into the
+mean and variance of the scores per grid cell.
+"""
+
+import os
+import argparse
+import itertools
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from llm_clients import POLICIES, SimulatedClient, create_client, lognormal_latency
+from move_cache import MoveCache
+from pd_game import PDGame, STRATEGIES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MatchSpec:
+    """One match of a tournament."""
+    model: str
+    temperature: float
+    strategy: str
+    turns: int
+    repetition: int = 0
+
+    @property
+    def cell(self) -> Tuple[str, float, str, int]:
+        """The grid cell this match is a repetition of."""
+        return (self.model, self.temperature, self.strategy, self.turns)
+
+
+@dataclass
+class MatchResult:
+    """The outcome of one match; ``error`` is set if the match failed."""
+    spec: MatchSpec
+    scores: Dict[str, int] = field(default_factory=dict)
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class CellStats:
+    """Running mean and variance of the scores of one grid cell (Welford)."""
+    matches: int = 0
+    errors: int = 0
+    mean: Dict[str, float] = field(default_factory=lambda: {'llm': 0.0, 'strategy': 0.0})
+    _m2: Dict[str, float] = field(default_factory=lambda: {'llm': 0.0, 'strategy': 0.0})
+
+    def add(self, result: MatchResult) -> None:
+        if result.error is not None:
+            self.errors += 1
+            return
+        self.matches += 1
+        for player, score in result.scores.items():
+            delta = score - self.mean[player]
+            self.mean[player] += delta / self.matches
+            self._m2[player] += delta * (score - self.mean[player])
+
+    def variance(self, player: str) -> float:
+        """Sample variance of a player's score (0 for fewer than two matches)."""
+        if self.matches < 2:
+            return 0.0
+        return self._m2[player] / (self.matches - 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            'matches': self.matches,
+            'errors': self.errors,
+            'mean': dict(self.mean),
+            'variance': {player: self.variance(player) for player in self.mean},
+        }
+
+
+def tournament_grid(models: Iterable[str], strategies: Iterable[str], temperatures: Iterable[float] = (0.7,),
+                    turns: Iterable[int] = (10,), repetitions: int = 1) -> List[MatchSpec]:
+    """
+    Build the matches of a tournament.
+
+    Args:
+        models: OpenAI models to play
+        strategies: Names of the opponent strategies
+        temperatures: Temperatures to play each model at
+        turns: Match lengths
+        repetitions: Matches per grid cell
+
+    Returns:
+        List of match specs, repetitions of a cell spread out over the list
+    """
+    strategies = list(strategies)
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Strategy '{unknown[0]}' not found")
+
+    cells = list(itertools.product(models, temperatures, strategies, turns))
+    return [
+        MatchSpec(model, temperature, strategy, match_turns, repetition)
+        for repetition in range(repetitions)
+        for model, temperature, strategy, match_turns in cells
+    ]
+
+
+class Tournament:
+    """
+    Runs matches concurrently and streams their results.
+
+    Args:
+        max_workers: Matches played at the same time
+        per_model_limit: Concurrent matches allowed per model, either one
+            limit for every model or a {model: limit} dict (None: no limit)
+        game_factory: Creates the game for a (model, temperature)
+    """
+
+    def __init__(self, max_workers: int = 8, per_model_limit: Union[int, Dict[str, int], None] = None,
+                 game_factory: Callable[[str, float], PDGame] = PDGame):
+        self.max_workers = max_workers
+        self.per_model_limit = per_model_limit
+        self.game_factory = game_factory
+
+    def _limit(self, model: str) -> int:
+        if isinstance(self.per_model_limit, dict):
+            return self.per_model_limit.get(model, self.max_workers)
+        return self.per_model_limit or self.max_workers
+
+    def play(self, spec: MatchSpec) -> MatchResult:
+        """Play a single match."""
+        try:
+            game = self.game_factory(spec.model, spec.temperature)
+            result = game.play_match(strategy_name=spec.strategy, turns=spec.turns)
+            return MatchResult(spec, result['scores'], result['history'])
+        except Exception as e:
+            logger.error(f"Error playing {spec}: {e}")
+            return MatchResult(spec, error=str(e))
+
+    def run(self, specs: Iterable[MatchSpec]) -> Iterator[MatchResult]:
+        """
+        Play matches, yielding each result as soon as its match finishes.
+
+        A match is only submitted while its model is under its limit, so a
+        slow or rate-limited model never ties up the whole pool.
+
+        Args:
+            specs: Matches to play
+
+        Returns:
+            Iterator of match results in completion order
+        """
+        queued: Dict[str, List[MatchSpec]] = {}
+        for spec in specs:
+            queued.setdefault(spec.model, []).append(spec)
+        for model_specs in queued.values():
+            model_specs.reverse()  # pop() from the end keeps the original order
+
+        running: Dict[str, int] = dict.fromkeys(queued, 0)
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Fill free workers round-robin over the models that have capacity
+                submitted = True
+                while submitted and len(in_flight) < self.max_workers:
+                    submitted = False
+                    for model, model_specs in queued.items():
+                        if len(in_flight) >= self.max_workers:
+                            break
+                        if model_specs and running[model] < self._limit(model):
+                            spec = model_specs.pop()
+                            in_flight[executor.submit(self.play, spec)] = spec
+                            running[model] += 1
+                            submitted = True
+
+                if not in_flight:
+                    return
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    spec = in_flight.pop(future)
+                    running[spec.model] -= 1
+                    yield future.result()
+
+
+def summarize(results: Iterable[MatchResult]) -> Dict[Tuple[str, float, str, int], CellStats]:
+    """
+    Aggregate match results per grid cell.
+
+    Args:
+        results: Match results, e.g. straight from Tournament.run
+
+    Returns:
+        {(model, temperature, strategy, turns): CellStats}
+    """
+    stats: Dict[Tuple[str, float, str, int], CellStats] = {}
+    for result in results:
+        stats.setdefault(result.spec.cell, CellStats()).add(result)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run a tournament from the command line and print the results."""
+    parser = argparse.ArgumentParser(description="Play a Prisoner's Dilemma tournament")
+    parser.add_argument('--models', nargs='+', default=['gpt-3.5-turbo'])
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES))
+    parser.add_argument('--temperatures', nargs='+', type=float, default=[0.7])
+    parser.add_argument('--turns', nargs='+', type=int, default=[10])
+    parser.add_argument('--repetitions', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-model', type=int, default=None, help='concurrent matches per model')
+    parser.add_argument('--cache', default=None, help='SQLite file caching LLM moves across runs')
+    parser.add_argument('--backend', choices=['openai', 'simulated'], default=None,
+                        help='LLM backend (default: LLM_BACKEND or openai)')
+    parser.add_argument('--policy', choices=list(POLICIES), default='tit_for_tat',
+                        help='move policy of the simulated backend')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='median latency of the simulated backend')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='error rate of the simulated backend')
+    args = parser.parse_args(argv)
+
+    specs = tournament_grid(args.models, args.strategies, args.temperatures, args.turns, args.repetitions)
+    if (args.backend or os.getenv('LLM_BACKEND')) == SimulatedClient.name:
+        latency = lognormal_latency(args.latency_ms / 1000) if args.latency_ms else None
+        client = SimulatedClient(args.policy, latency=latency, error_rate=args.error_rate)
+    else:
+        client = create_client(args.backend)
+    cache = MoveCache(args.cache)
+    tournament = Tournament(
+        max_workers=args.workers,
+        per_model_limit=args.per_model,
+        game_factory=lambda model, temperature: PDGame(model, temperature, cache=cache, client=client),
+    )
+
+    started = time.monotonic()
+    stats: Dict[Tuple[str, float, str, int], CellStats] = {}
+    for done, result in enumerate(tournament.run(specs), 1):
+        stats.setdefault(result.spec.cell, CellStats()).add(result)
+        outcome = result.error or f"LLM {result.scores['llm']} - {result.scores['strategy']} {result.spec.strategy}"
+        print(f"[{done}/{len(specs)}] {result.spec.model} t={result.spec.temperature}: {outcome}")
+
+    print()
+    for (model, temperature, strategy, turns), cell in sorted(stats.items()):
+        print(
+            f"{model} t={temperature} vs {strategy} ({turns} turns, {cell.matches} matches): "
+            f"LLM {cell.mean['llm']:.2f} ± {math.sqrt(cell.variance('llm')):.2f}, "
+            f"{strategy} {cell.mean['strategy']:.2f} ± {math.sqrt(cell.variance('strategy')):.2f}"
+        )
+    print(f"\n{len(specs)} matches in {time.monotonic() - started:.1f}s")
+    print(f"LLM move cache: {cache.hits} hits, {cache.misses} API calls")
+    if isinstance(client, SimulatedClient):
+        print(f"Simulated backend: {client.calls} calls, {client.errors} injected errors")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
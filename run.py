@@ -4,10 +4,14 @@ Run script for the Experiment Platform application.
 
 This script initializes and runs the Flask application with the configuration
 specified in environment variables or .env file.
+
+    python run.py          # Werkzeug development server
+    python run.py serve    # multi-process production server (see app/server.py)
 """
 
 import os
 import logging
+import argparse
 from dotenv import load_dotenv
 from app.app import create_app
 
@@ -24,14 +28,75 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-if __name__ == "__main__":
-    # Get configuration from environment variables
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the Experiment Platform.')
+    parser.add_argument('mode', nargs='?', choices=['dev', 'serve'], default='dev',
+                        help='dev: Werkzeug development server; serve: multi-process server')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: WEB_WORKERS or 2 x CPUs + 1)')
+    parser.add_argument('--threads', type=int, help='Threads per worker (default: WEB_THREADS or 4)')
+    parser.add_argument('--max-requests', type=int,
+                        help='Recycle a worker after this many requests (default: WEB_MAX_REQUESTS or 1000)')
+    parser.add_argument('--graceful-timeout', type=int,
+                        help='Seconds workers get to drain on SIGTERM (default: WEB_GRACEFUL_TIMEOUT or 30)')
+    return parser.parse_args()
+
+
+def run_dev_server():
+    """Run the single-process Werkzeug development server."""
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
     host = os.getenv("HOST", "0.0.0.0")
     
-    # Create and run the application
+    # Create the application and open the pooled connections up front
     app = create_app()
     
+    from app.db import warm_pool
+    from app.auth.key_filter import start_key_filter_refresher, warm_key_filter
+    try:
+        warm_pool()
+    except Exception as e:
+        logger.warning(f"Could not pre-warm the database pool: {e}")
+    # Separately, since the filter reads from SQLite without the pool
+    try:
+        warm_key_filter()
+    except Exception as e:
+        logger.warning(f"Could not pre-warm the key filter: {e}")
+    start_key_filter_refresher()
+    
+    # Replay decisions left behind by an earlier run before serving requests
+    from app.storage.decision_log import start_decision_log
+    start_decision_log(app.extensions['storage'])
+    
     logger.info(f"Starting Experiment Platform on {host}:{port} (Debug: {debug})")
-    app.run(host=host, port=port, debug=debug)
\ No newline at end of file
+    app.run(host=host, port=port, debug=debug)
+
+
+def run_server(args):
+    """Run the multi-process server; workers fork from this process."""
+    app = create_app()
+    
+    # Built once here and shared copy-on-write by every worker; the pool it
+    # uses is closed again before the workers fork
+    from app.auth.key_filter import warm_key_filter
+    try:
+        warm_key_filter()
+    except Exception as e:
+        logger.warning(f"Could not pre-warm the key filter: {e}")
+    
+    from app.server import serve
+    serve(
+        app,
+        workers=args.workers,
+        threads=args.threads,
+        max_requests=args.max_requests,
+        graceful_timeout=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == 'serve':
+        run_server(args)
+    else:
+        run_dev_server()
\ No newline at end of file
@@ -13,7 +13,7 @@ from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     """Create and configure a Flask app for testing."""
     # Create a temporary file to use as a database
     db_fd, db_path = tempfile.mkstemp()
@@ -26,6 +26,8 @@ def app():
         'DATABASE_NAME': 'test_experiment_db',
         'DATABASE_USER': 'test_user',
         'DATABASE_PASSWORD': 'test_password',
+        'SESSION_BACKEND': 'cookie',
+        'EXPERIMENT_MANIFEST': str(tmp_path / 'experiment_plugins.json'),
     }
     
     # Create app with test config
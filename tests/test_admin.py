@@ -0,0 +1,209 @@
+"""
+Tests for the admin interface.
+
+This module contains tests for admin API endpoints that do not render templates.
+They run against the embedded SQLite storage backend.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from app.app import create_app
+
+
+@pytest.fixture
+def admin_app(tmp_path):
+    """An app on an embedded SQLite database."""
+    return create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test-key',
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'admin.db'),
+        'SESSION_BACKEND': 'cookie',
+        'EXPERIMENT_MANIFEST': str(tmp_path / 'plugins.json'),
+    })
+
+
+@pytest.fixture
+def storage(admin_app):
+    """The app's SQLite storage backend."""
+    yield admin_app.extensions['storage']
+    admin_app.extensions['storage'].close()
+
+
+@pytest.fixture
+def admin_client(admin_app):
+    """A test client logged in as an admin."""
+    client = admin_app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_id'] = 1
+        sess['admin_role'] = 'admin'
+    return client
+
+
+def add_round(storage, experiment_id, round_number, results=None):
+    """Insert a round, and its results if given, as the legacy round tables hold them."""
+    started = '2024-01-01 12:00:00'
+    conn = storage._conn()
+    round_id = conn.execute(
+        'INSERT INTO experiment_rounds (experiment_id, round_number, status, started_at) VALUES (?, ?, ?, ?)',
+        (experiment_id, round_number, 'completed', started)
+    ).lastrowid
+    if results is not None:
+        conn.execute('INSERT INTO round_results (round_id, results) VALUES (?, ?)', (round_id, json.dumps(results)))
+
+
+@pytest.fixture
+def experiment_id(storage):
+    """An experiment with two rounds and one participant."""
+    experiment_id = storage.create_experiment('prisoners_dilemma', 'PD')
+    add_round(storage, experiment_id, 1, {'score': 3})
+    add_round(storage, experiment_id, 2)
+    key = storage.create_keys(experiment_id, 1)[0]
+    storage.redeem_key(key)
+    storage.key = key
+    return experiment_id
+
+
+def test_results_export_ndjson(admin_client, storage, experiment_id):
+    """Test that results stream as NDJSON."""
+    response = admin_client.get(f'/admin/api/experiments/{experiment_id}/results?format=ndjson')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [line['record'] for line in lines] == ['experiment', 'round', 'round', 'participant']
+    assert lines[0]['name'] == 'PD'
+    assert lines[1]['results'] == {'score': 3}
+    assert lines[1]['started_at'] == '2024-01-01T12:00:00'
+    assert lines[2]['results'] is None
+    assert lines[3]['key'] == storage.key
+
+
+def test_results_export_csv(admin_client, storage, experiment_id, monkeypatch):
+    """Test that a single record type streams as CSV, one chunk per EXPORT_CHUNK_SIZE rows."""
+    monkeypatch.setattr('app.admin.admin_routes.EXPORT_CHUNK_SIZE', 1)
+
+    response = admin_client.get(f'/admin/api/experiments/{experiment_id}/results?format=csv&records=rounds')
+
+    assert response.status_code == 200
+    rows = response.data.decode().splitlines()
+    assert rows[0] == 'id,round_number,started_at,completed_at,results'
+    assert rows[1].endswith(',1,2024-01-01T12:00:00,,"{""score"": 3}"')
+    assert rows[2].endswith(',2,2024-01-01T12:00:00,,')
+    assert len(rows) == 3
+
+
+def test_results_json(admin_client, storage, experiment_id):
+    """Test that the buffered JSON results hold the same records."""
+    response = admin_client.get(f'/admin/api/experiments/{experiment_id}/results')
+
+    assert response.status_code == 200
+    assert response.json['experiment']['type'] == 'prisoners_dilemma'
+    assert [r['round_number'] for r in response.json['rounds']] == [1, 2]
+    assert [p['key'] for p in response.json['participants']] == [storage.key]
+
+
+def test_results_export_missing_experiment(admin_client, storage):
+    """Test that streaming a missing experiment returns 404."""
+    response = admin_client.get('/admin/api/experiments/1/results?format=ndjson')
+    assert response.status_code == 404
+
+
+def test_new_experiment_and_keys(admin_client, storage):
+    """Test that experiments and their keys are created through the storage backend."""
+    response = admin_client.post('/admin/experiments/new', data={
+        'name': 'PD', 'type': 'prisoners_dilemma', 'parameters': '{"rounds": 5}', 'key_count': '3'
+    })
+
+    assert response.status_code == 302
+    experiment_id = int(response.location.rstrip('/').rsplit('/', 1)[1])
+    assert storage.get_experiment(experiment_id)['parameters'] == {'rounds': 5}
+    assert storage.get_key_status_counts(experiment_id)['unused'] == 3
+
+    key = storage.get_keys(experiment_id)[0]['key']
+    admin_client.post(f'/admin/keys/{key}/revoke')
+    assert storage.get_key_status_counts(experiment_id)['revoked'] == 1
+
+
+def test_register_and_login(admin_client, admin_app, storage):
+    """Test that a registered user can log in."""
+    response = admin_client.post('/admin/users/register', data={
+        'username': 'alice', 'password': 'secret', 'email': 'alice@example.org', 'role': 'researcher'
+    })
+    assert response.status_code == 302
+    user = storage.find_user(username='alice')
+    assert user['role'] == 'researcher'
+
+    client = admin_app.test_client()
+    response = client.post('/admin/login', data={'username': 'alice', 'password': 'secret'})
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        assert sess['admin_id'] == user['id']
+        assert sess['admin_role'] == 'researcher'
+
+
+def test_dashboard_stats_cached(storage, monkeypatch):
+    """Test that dashboard statistics come from one query and are cached."""
+    from app.admin import stats
+
+    first_id = storage.create_experiment('pd', 'A')
+    second_id = storage.create_experiment('pd', 'B')
+    storage._conn().executemany(
+        'UPDATE experiments SET created_at = ? WHERE id = ?',
+        [('2024-01-01 12:00:00', first_id), ('2024-01-02 12:00:00', second_id)]
+    )
+    for key in storage.create_keys(first_id, 2):
+        storage.redeem_key(key)
+    monkeypatch.setattr(stats, '_cache', stats.TTLCache(ttl=60))
+    statements = []
+    storage._conn().set_trace_callback(statements.append)
+
+    first = stats.get_dashboard_stats(storage)
+    second = stats.get_dashboard_stats(storage)
+
+    assert first['experiments'][0] == (second_id, 'pd', 'B', datetime(2024, 1, 2, 12, 0))
+    assert [e[0] for e in first['experiments']] == [second_id, first_id]
+    assert first['experiment_count'] == 2
+    assert first['active_participants'] == 2
+    assert second is first
+    assert len(statements) == 1
+
+    stats.invalidate_dashboard_stats()
+    stats.get_dashboard_stats(storage)
+    assert len(statements) == 2
+
+
+def test_ttl_cache_expires():
+    """Test that cache entries are recomputed after the TTL."""
+    from app.admin.stats import TTLCache
+
+    cache = TTLCache(ttl=0)
+    calls = []
+
+    cache.get_or_set('key', lambda: calls.append(1))
+    cache.get_or_set('key', lambda: calls.append(1))
+
+    assert len(calls) == 2
+
+
+def test_ttl_cache_is_bounded():
+    """Test that per-user entries cannot grow the cache without bound."""
+    import time
+    from app.admin.stats import TTLCache
+
+    cache = TTLCache(ttl=60, max_entries=3)
+    for user_id in range(10):
+        cache.get_or_set(('admin_user', user_id), lambda: 'user')
+    assert len(cache) == 3
+
+    # Expired entries are swept before the oldest fresh one
+    cache = TTLCache(ttl=60, max_entries=3)
+    cache.get_or_set('dashboard', lambda: 'stats')
+    cache._entries[('admin_user', 0)] = (time.monotonic() - 1, 'user')
+    cache.get_or_set(('admin_user', 1), lambda: 'user')
+    cache.get_or_set(('admin_user', 2), lambda: 'user')
+
+    assert set(cache._entries) == {'dashboard', ('admin_user', 1), ('admin_user', 2)}
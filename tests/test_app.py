@@ -8,16 +8,22 @@ import pytest
 from app.app import create_app
 
 
-def test_config():
+def test_config(tmp_path, monkeypatch):
     """Test configuration loading."""
+    # Keep the plugin manifest out of the instance folder
+    manifest = str(tmp_path / 'experiment_plugins.json')
+    monkeypatch.setenv('EXPERIMENT_MANIFEST', manifest)
+    
     # Test that default configuration is loaded
     app = create_app()
     assert app.config['SECRET_KEY'] is not None
+    assert app.config['EXPERIMENT_MANIFEST'] == manifest
     
     # Test that test configuration is loaded
     test_config = {
         'TESTING': True,
         'SECRET_KEY': 'test-key',
+        'EXPERIMENT_MANIFEST': manifest,
     }
     app = create_app(test_config)
     assert app.config['TESTING'] is True
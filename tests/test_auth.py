@@ -142,4 +142,277 @@ def test_revoke_key(monkeypatch):
     
     # Check that the correct query was executed
     expected_query = "UPDATE participant_keys SET status = %s, revoked_at = %s, revoked_by = %s WHERE id = %s"
-    assert any(q[0] == expected_query for q in mock_cursor.executed_queries) 
\ No newline at end of file
+    assert any(q[0] == expected_query for q in mock_cursor.executed_queries)
+
+
+# Tests for bulk key generation
+class MockKeyStore:
+    """Cursor that stores keys in memory and reports collisions like ON CONFLICT DO NOTHING."""
+    def __init__(self, existing=()):
+        self.keys = set(existing)
+        self.executed_queries = []
+        self.last_inserted = []
+    
+    def cursor(self):
+        return self
+    
+    def execute(self, query, params=None):
+        self.executed_queries.append((query, params))
+        experiment_id, created_at, keys = params
+        self.last_inserted = [(k,) for k in keys if k not in self.keys]
+        self.keys.update(keys)
+    
+    def fetchall(self):
+        return self.last_inserted
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+    
+    def close(self):
+        pass
+
+
+def test_create_keys_in_batches():
+    """Test that keys are written one statement per batch."""
+    from app.auth import create_keys_for_experiment
+    store = MockKeyStore()
+    progress = []
+    
+    keys = create_keys_for_experiment(1, 25, store, batch_size=10,
+                                      progress=lambda done, total: progress.append((done, total)))
+    
+    assert len(keys) == 25
+    assert len(set(keys)) == 25
+    assert len(store.executed_queries) == 3
+    assert progress == [(10, 25), (20, 25), (25, 25)]
+
+
+def test_create_keys_regenerates_collisions(monkeypatch):
+    """Test that only colliding keys are regenerated."""
+    from app.auth import create_keys_for_experiment
+    candidates = iter(['taken-1', 'new-1', 'new-2', 'new-3'])
+    monkeypatch.setattr('app.auth.key_manager.generate_key', lambda: next(candidates))
+    store = MockKeyStore(existing={'taken-1'})
+    
+    keys = create_keys_for_experiment(1, 3, store, progress=lambda done, total: None)
+    
+    assert sorted(keys) == ['new-1', 'new-2', 'new-3']
+    # First attempt stores two keys, the retry only sends one replacement
+    assert len(store.executed_queries) == 2
+    assert len(store.executed_queries[1][1][2]) == 1
+
+
+# Tests for key redemption
+def test_redeem_key():
+    """Test redeeming an unused key creates a participant in one statement."""
+    from app.auth import redeem_key
+    mock_conn = MockConnection()
+    mock_cursor = mock_conn.cursor_instance
+    mock_cursor.fetchone = lambda: (1, 2, 'prisoners_dilemma', 'unused', 7)
+    
+    result = redeem_key('valid-key-12345', mock_conn)
+    
+    assert len(mock_cursor.executed_queries) == 1
+    assert result == {
+        'id': 1,
+        'experiment_id': 2,
+        'experiment_type': 'prisoners_dilemma',
+        'status': 'used',
+        'participant_id': 7
+    }
+
+
+def test_redeem_key_already_used():
+    """Test that a used key is reported without a participant."""
+    from app.auth import redeem_key
+    mock_conn = MockConnection()
+    mock_conn.cursor_instance.fetchone = lambda: (1, 2, 'prisoners_dilemma', 'used', None)
+    
+    result = redeem_key('used-key-12345', mock_conn)
+    
+    assert result['participant_id'] is None
+    assert result['status'] == 'used'
+
+
+def test_redeem_key_invalid():
+    """Test that an unknown key returns None."""
+    from app.auth import redeem_key
+    mock_conn = MockConnection()
+    
+    assert redeem_key('invalid-key', mock_conn) is None
+
+
+# Tests for key listing
+def test_get_keys_for_experiment_keyset():
+    """Test that key listings page by id with an optional status filter."""
+    from app.auth import get_keys_for_experiment
+    mock_conn = MockConnection()
+    mock_cursor = mock_conn.cursor_instance
+    
+    get_keys_for_experiment(2, mock_conn, status='unused', after_id=100, limit=50)
+    
+    query, params = mock_cursor.executed_queries[-1]
+    assert query == (
+        'SELECT id, key_value, status, created_at, used_at, revoked_at FROM participant_keys '
+        'WHERE experiment_id = %s AND status = %s AND id > %s ORDER BY id LIMIT %s'
+    )
+    assert params == (2, 'unused', 100, 50)
+
+
+def test_get_key_status_counts():
+    """Test that key counts come from a single GROUP BY query."""
+    from app.auth import get_key_status_counts
+    mock_conn = MockConnection()
+    mock_cursor = mock_conn.cursor_instance
+    count_query = (
+        'SELECT status, COUNT(*) FROM participant_keys '
+        'WHERE experiment_id = %s GROUP BY status'
+    )
+    mock_cursor.fetchall_results[count_query] = [('unused', 7), ('used', 3)]
+    
+    counts = get_key_status_counts(2, mock_conn)
+    
+    assert counts == {'unused': 7, 'used': 3, 'revoked': 0, 'total': 10}
+    assert len(mock_cursor.executed_queries) == 1
+
+
+# Tests for the key filter
+def test_bloom_filter_membership():
+    """Test that added keys are always found and the error rate holds."""
+    from app.auth.key_filter import BloomFilter
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    keys = [generate_key() for _ in range(10000)]
+    for key in keys:
+        bloom.add(key)
+    
+    assert all(key in bloom for key in keys)
+    false_positives = sum(generate_key() in bloom for _ in range(10000))
+    assert false_positives < 200  # 1% expected
+    assert bloom.memory_bytes < 10000 * 10 / 8 + 1
+
+
+@pytest.fixture
+def key_storage():
+    """An in-memory SQLite backend with an experiment to hold keys."""
+    from app.storage import SQLiteStorage
+    storage = SQLiteStorage()
+    storage.init_schema()
+    storage.experiment_id = storage.create_experiment('prisoners_dilemma', 'PD')
+    yield storage
+    storage.close()
+
+
+def insert_keys(storage, rows):
+    """Insert (id, key_value) rows as another worker would."""
+    storage._conn().executemany(
+        'INSERT INTO participant_keys (id, experiment_id, key_value) VALUES (?, ?, ?)',
+        [(key_id, storage.experiment_id, key_value) for key_id, key_value in rows]
+    )
+
+
+def test_filter_rejects_unknown_key_without_db(key_storage, monkeypatch):
+    """Test that keys ruled out by the filter never reach the database, with either backend."""
+    from app.auth import key_filter as key_filter_module
+    from app.auth.key_filter import KeyFilter
+    from app.auth.key_manager import redeem_key as redeem_postgres_key
+    issued = key_storage.create_keys(key_storage.experiment_id, 3)
+    key_filter = KeyFilter()
+    key_filter.source = key_storage
+    key_filter.build()
+    monkeypatch.setattr(key_filter_module, 'key_filter', key_filter)
+    
+    def no_connection():
+        raise AssertionError('database connection opened')
+    monkeypatch.setattr('app.auth.key_manager.get_db_connection', no_connection)
+    statements = []
+    key_storage._conn().set_trace_callback(statements.append)
+    
+    for attempt in range(100):
+        assert key_storage.redeem_key(f'never-issued-{attempt}') is None
+        assert redeem_postgres_key(f'never-issued-{attempt}') is None
+        assert validate_key(f'never-issued-{attempt}') == (False, None, None)
+    assert statements == []
+    
+    assert key_storage.redeem_key(issued[0])['participant_id'] is not None
+    assert statements
+
+
+def test_filter_refresh_loads_new_and_late_committed_keys(key_storage):
+    """Test that a refresh picks up keys from other workers, including lower ids that committed late."""
+    from app.auth.key_filter import KeyFilter
+    insert_keys(key_storage, [(1, 'a'), (3, 'c')])
+    key_filter = KeyFilter()
+    key_filter.source = key_storage
+    key_filter.build()
+    assert key_filter.max_id == 3
+    assert key_filter.refresh()
+    
+    # Nothing changed: only the count of the overlap range is read
+    statements = []
+    key_storage._conn().set_trace_callback(statements.append)
+    assert not key_filter.refresh()
+    assert len(statements) == 1
+    key_storage._conn().set_trace_callback(None)
+    
+    # Id 2 belongs to a batch that committed after the one holding id 3
+    insert_keys(key_storage, [(2, 'b'), (4, 'd')])
+    assert not key_filter.might_contain('b')
+    assert key_filter.refresh()
+    assert key_filter.might_contain('b') and key_filter.might_contain('d')
+    assert key_filter.max_id == 4
+    assert key_filter.bloom.count == 4
+
+
+def test_filter_refresher_thread(key_storage):
+    """Test that the background refresher loads keys created elsewhere."""
+    import time
+    from app.auth.key_filter import KeyFilter
+    insert_keys(key_storage, [(1, 'a')])
+    key_filter = KeyFilter()
+    key_filter.source = key_storage
+    key_filter.build()
+    
+    key_filter.start_refresher(interval=0.01)
+    try:
+        insert_keys(key_storage, [(2, 'other-worker-key')])
+        deadline = time.monotonic() + 5
+        while not key_filter.might_contain('other-worker-key') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert key_filter.might_contain('other-worker-key')
+    finally:
+        key_filter.stop_refresher()
+
+
+def test_bloom_filter_concurrent_adds():
+    """Test that keys added from several threads are all found."""
+    import threading
+    from app.auth.key_filter import BloomFilter
+    bloom = BloomFilter(capacity=40000, error_rate=0.01)
+    batches = [[generate_key() for _ in range(5000)] for _ in range(8)]
+    threads = [threading.Thread(target=lambda b=batch: [bloom.add(key) for key in b]) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert all(key in bloom for batch in batches for key in batch)
+    # Keys that are false positives when added count as already present
+    assert 40000 * 0.99 <= bloom.count <= 40000
+
+
+def test_filter_snapshot_roundtrip(tmp_path):
+    """Test that a saved filter loads back with the same keys."""
+    from app.auth.key_filter import KeyFilter, BloomFilter
+    key_filter = KeyFilter()
+    key_filter.bloom = BloomFilter(capacity=100)
+    key_filter.add_keys(['a', 'b'])
+    key_filter.max_id = 42
+    key_filter.save(str(tmp_path / 'filter.bin'))
+    
+    loaded = KeyFilter()
+    assert loaded.load(str(tmp_path / 'filter.bin'))
+    assert loaded.max_id == 42
+    assert 'a' in loaded.bloom and 'b' in loaded.bloom
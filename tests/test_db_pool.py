@@ -0,0 +1,120 @@
+"""
+Tests for the database connection pool.
+
+This module contains tests for pooled checkout, health checks and the
+request-scoped connection bound to Flask's ``g``. The pool holds psycopg2
+connections, so the tests run against the PostgreSQL test database when
+TEST_DB_HOST is set (TEST_DB_NAME, TEST_DB_USER and TEST_DB_PASSWORD
+configure the rest), like the PostgreSQL storage backend tests.
+"""
+
+import os
+
+import pytest
+from flask import Flask
+from psycopg2 import extensions
+
+from app.db import pool as db_pool
+
+
+@pytest.fixture
+def make_pool():
+    """Create pools on the test database, closing them after the test."""
+    if not os.getenv('TEST_DB_HOST'):
+        pytest.skip('TEST_DB_HOST not set')
+    settings = {
+        'host': os.getenv('TEST_DB_HOST'),
+        'database': os.getenv('TEST_DB_NAME', 'test_experiment_db'),
+        'user': os.getenv('TEST_DB_USER', 'test_user'),
+        'password': os.getenv('TEST_DB_PASSWORD', 'test_password'),
+    }
+    pools = []
+
+    def make(**kwargs):
+        pool = db_pool.ConnectionPool(**kwargs, **settings)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.closeall()
+
+
+def test_pool_reuses_connections(make_pool):
+    """Test that a returned connection is handed out again."""
+    pool = make_pool(minconn=0, maxconn=2)
+
+    conn = pool.getconn()
+    assert conn.autocommit is True
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert pool.stats()['opened'] == 1
+
+
+def test_pool_warm_opens_minconn(make_pool):
+    """Test that warming opens the minimum number of connections."""
+    pool = make_pool(minconn=3, maxconn=5)
+
+    assert pool.warm() == 3
+    assert pool.stats() == {'size': 3, 'idle': 3, 'in_use': 0, 'opened': 3, 'min': 3, 'max': 5}
+
+    # Warming an already warm pool opens nothing
+    assert pool.warm() == 0
+
+
+def test_pool_exhausted_times_out(make_pool):
+    """Test that checkout fails after the timeout when the pool is full."""
+    pool = make_pool(minconn=0, maxconn=1, timeout=0.01)
+    conn = pool.getconn()
+
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.getconn()
+    pool.putconn(conn)
+
+
+def test_pool_discards_broken_connections(make_pool):
+    """Test that closed or failed connections are not handed out again."""
+    pool = make_pool(minconn=0, maxconn=2)
+
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.close()
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert pool.stats()['size'] == 1
+    pool.putconn(replacement)
+
+
+def test_pool_rolls_back_open_transactions(make_pool):
+    """Test that a connection left in a transaction is cleaned up on return."""
+    pool = make_pool(minconn=0, maxconn=1)
+
+    conn = pool.getconn()
+    conn.autocommit = False
+    with conn.cursor() as cur:
+        cur.execute('SELECT 1')
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    assert conn.autocommit is True
+
+
+def test_request_scoped_connection(make_pool, monkeypatch):
+    """Test that a request reuses one connection and releases it on teardown."""
+    pool = make_pool(minconn=0, maxconn=2)
+    monkeypatch.setattr(db_pool, 'get_pool', lambda: pool)
+
+    app = Flask(__name__)
+    app.teardown_appcontext(db_pool.release_db_connection)
+
+    with app.app_context():
+        first = db_pool.get_db_connection()
+        first.close()  # no-op for request-scoped connections
+        second = db_pool.get_db_connection()
+        assert first is second
+        assert pool.stats()['in_use'] == 1
+
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0, 'opened': 1, 'min': 0, 'max': 2}
@@ -0,0 +1,170 @@
+"""
+Tests for the write-behind decision log.
+"""
+
+import os
+import time
+
+import pytest
+
+from app.storage.decision_log import DecisionLog, read_segment
+
+
+class RecordingWriter:
+    """
+    Collects flushed decisions; fails while ``failing`` is set, and rejects
+    any batch containing a UID in ``rejected``.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+        self.rejected = set()
+        self.calls = 0
+
+    def __call__(self, decisions):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError('database unavailable')
+        if any(d['uid'] in self.rejected for d in decisions):
+            raise LookupError('violates foreign key constraint')
+        self.batches.append(list(decisions))
+        return len(decisions)
+
+    @property
+    def decisions(self):
+        return [d for batch in self.batches for d in batch]
+
+
+@pytest.fixture
+def writer():
+    return RecordingWriter()
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.jsonl'))
+
+
+def test_flush_writes_in_bulk_and_removes_segments(tmp_path, writer):
+    """Test that buffered decisions are stored in one batch."""
+    log = DecisionLog(writer, str(tmp_path), flush_ms=60000)
+    for round_number in range(1, 4):
+        log.append(1, 2, round_number, 'cooperate', {'opponent': 'defect'})
+
+    assert writer.batches == []
+    assert log.flush() == 3
+    assert len(writer.batches) == 1
+    assert [d['round_number'] for d in writer.decisions] == [1, 2, 3]
+    assert writer.decisions[0]['metadata'] == {'opponent': 'defect'}
+
+    # Only the fresh, empty segment is left
+    assert len(_segments(tmp_path)) == 1
+    log.close()
+    assert _segments(tmp_path) == []
+
+
+def test_flusher_runs_when_enough_rows_are_buffered(tmp_path, writer):
+    """Test that reaching flush_rows triggers a flush before the interval."""
+    log = DecisionLog(writer, str(tmp_path), flush_ms=60000, flush_rows=5).start()
+    for round_number in range(5):
+        log.append(1, 2, round_number, 'defect')
+
+    deadline = time.monotonic() + 5
+    while not writer.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(writer.decisions) == 5
+    log.close()
+
+
+def test_failed_flush_is_retried(tmp_path, writer):
+    """Test that decisions stay on disk and are retried after a failed flush."""
+    log = DecisionLog(writer, str(tmp_path), flush_ms=60000)
+    log.append(1, 2, 1, 'cooperate')
+
+    writer.failing = True
+    assert log.flush() == 0
+    assert len(_segments(tmp_path)) == 2
+
+    writer.failing = False
+    log.append(1, 2, 2, 'defect')
+    assert log.flush() == 2
+    assert [d['round_number'] for d in writer.decisions] == [1, 2]
+    log.close()
+
+
+def test_append_rejects_values_that_do_not_fit(tmp_path, writer):
+    """Test that decisions outside the column ranges never reach the log."""
+    log = DecisionLog(writer, str(tmp_path), flush_ms=60000)
+
+    for args in [(1, 2, 40000, 'cooperate'), (1, 2, -1, 'cooperate'), ('1', 2, 1, 'cooperate'),
+                 (True, 2, 1, 'cooperate'), (1, 2, 1, 'betray')]:
+        with pytest.raises(ValueError):
+            log.append(*args)
+
+    assert log.flush() == 0
+    log.close()
+
+
+def test_poison_decision_is_dead_lettered(tmp_path, writer):
+    """Test that a decision storage rejects is set aside instead of blocking the log."""
+    log = DecisionLog(writer, str(tmp_path), flush_ms=60000)
+    uids = [log.append(1, 2, round_number, 'cooperate') for round_number in range(8)]
+    writer.rejected.add(uids[5])
+
+    assert log.flush() == 7
+    assert [d['uid'] for d in writer.decisions] == uids[:5] + uids[6:]
+
+    dead = read_segment(log.dead_letter_path)
+    assert [d['uid'] for d in dead] == [uids[5]]
+    assert 'foreign key' in dead[0]['error']
+
+    # The bad decision is not retried, and later decisions flow
+    calls = writer.calls
+    log.append(1, 2, 8, 'defect')
+    assert log.flush() == 1
+    assert writer.calls == calls + 1
+    log.close()
+    assert _segments(tmp_path) == [os.path.basename(log.dead_letter_path)]
+
+
+def test_recover_replays_segments_of_dead_processes(tmp_path, writer):
+    """Test that a new process replays what a crashed one never flushed."""
+    crashed = DecisionLog(RecordingWriter(), str(tmp_path), flush_ms=60000)
+    uid = crashed.append(1, 2, 1, 'cooperate')
+    with open(crashed._segment.path, 'a') as f:
+        f.write('{"uid": "torn')
+    crashed.abandon()  # releases its locks like a dead process would
+
+    live = DecisionLog(RecordingWriter(), str(tmp_path), flush_ms=60000)
+    live.append(1, 2, 2, 'defect')
+
+    restarted = DecisionLog(writer, str(tmp_path), flush_ms=60000)
+    assert restarted.recover() == 1
+    assert [d['uid'] for d in writer.decisions] == [uid]
+
+    # The live process's segment is locked and left alone
+    assert any(read_segment(os.path.join(tmp_path, name)) for name in _segments(tmp_path))
+    live.close()
+    restarted.close()
+
+
+def test_only_startup_replays_old_segments(tmp_path, writer, monkeypatch):
+    """Test that recovery runs in start_decision_log(), never on a request's first log_decision()."""
+    from app.storage import decision_log
+
+    crashed = DecisionLog(RecordingWriter(), str(tmp_path), flush_ms=60000)
+    uid = crashed.append(1, 2, 1, 'cooperate')
+    crashed.abandon()
+
+    storage = type('Storage', (), {'record_decisions': staticmethod(writer), 'transient_errors': ()})()
+    monkeypatch.setattr(decision_log, 'DECISION_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(decision_log, '_log', None)
+    try:
+        decision_log.get_decision_log(storage)
+        assert writer.calls == 0
+
+        decision_log.start_decision_log(storage)
+        assert [d['uid'] for d in writer.decisions] == [uid]
+    finally:
+        decision_log.close_decision_log()
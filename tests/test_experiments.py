@@ -0,0 +1,146 @@
+"""
+Tests for experiment module discovery and lazy loading.
+"""
+
+import sys
+import textwrap
+
+import pytest
+
+from app import experiments
+from app.experiments import manifest
+from app.experiments.manifest import load_manifest, scan_builtin
+
+PLUGIN_SOURCE = textwrap.dedent('''
+    from flask import Blueprint, session, url_for
+
+    EXPERIMENT_TYPE = 'demo_game'
+    URL_PREFIX = '/demo'
+
+    def register_blueprint():
+        bp = Blueprint('demo_game', __name__, url_prefix=URL_PREFIX)
+
+        @bp.route('/')
+        def start():
+            return f"participant {session.get('participant_id')}"
+
+        @bp.route('/links')
+        def links():
+            return ' '.join([url_for('.start'), url_for('home'), url_for('home', _external=True)])
+
+        return bp
+''')
+
+
+@pytest.fixture
+def plugin_package(tmp_path, monkeypatch):
+    """A package with one experiment module, importable as lazy_plugins."""
+    package = tmp_path / 'lazy_plugins'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'demo.py').write_text(PLUGIN_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(experiments, '_plugins', {})
+    monkeypatch.setattr(experiments, '_experiments', {})
+    yield package
+    sys.modules.pop('lazy_plugins.demo', None)
+    sys.modules.pop('lazy_plugins', None)
+
+
+@pytest.fixture
+def lazy_app(app, plugin_package):
+    """The test app with the plugin registered lazily."""
+    app.config['EXPERIMENT_LOADING'] = 'lazy'
+    experiments.register_experiment_routes(app, scan_builtin(str(plugin_package), 'lazy_plugins'))
+    return app
+
+
+def test_read_plugin_metadata(plugin_package):
+    """Test that metadata is read from the source without importing it."""
+    metadata = experiments.read_plugin_metadata(str(plugin_package / 'demo.py'), 'lazy_plugins')
+
+    assert metadata == {
+        'experiment_type': 'demo_game',
+        'url_prefix': '/demo',
+        'module_name': 'lazy_plugins.demo',
+    }
+    assert 'lazy_plugins.demo' not in sys.modules
+
+
+def test_plugin_loads_on_first_request(lazy_app):
+    """Test that the module is imported by the first request under its prefix."""
+    client = lazy_app.test_client()
+    assert 'lazy_plugins.demo' not in sys.modules
+
+    with client.session_transaction() as sess:
+        sess['participant_id'] = 7
+    response = client.get('/demo/')
+
+    assert response.status_code == 200
+    assert response.data == b'participant 7'
+    assert 'lazy_plugins.demo' in sys.modules
+    assert 'demo_game' in experiments.get_available_experiments()
+
+
+def test_lazy_plugin_builds_platform_urls(lazy_app):
+    """Test that a lazily loaded experiment can url_for() the platform's endpoints."""
+    client = lazy_app.test_client()
+
+    response = client.get('/demo/links')
+
+    assert response.status_code == 200
+    assert response.data.decode().split() == ['/demo/', '/', 'http://localhost/']
+
+
+def test_experiment_start_redirects_to_lazy_plugin(lazy_app):
+    """Test that experiment_start resolves the start URL of a lazy plugin."""
+    client = lazy_app.test_client()
+    with client.session_transaction() as sess:
+        sess['participant_id'] = 7
+
+    response = client.get('/experiment/start/demo_game')
+
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/demo/'
+
+
+def test_manifest_is_cached_until_packages_change(plugin_package, tmp_path_factory, monkeypatch):
+    """Test that the manifest is reused until the fingerprint changes."""
+    path = str(tmp_path_factory.mktemp('instance') / 'plugins.json')
+    scans = []
+    real_scan = manifest.scan_builtin
+    monkeypatch.setattr(manifest, 'scan_builtin', lambda *args: scans.append(1) or real_scan(*args))
+
+    first = load_manifest(path, str(plugin_package), 'lazy_plugins')
+    second = load_manifest(path, str(plugin_package), 'lazy_plugins')
+    assert [p['experiment_type'] for p in first['plugins']] == ['demo_game']
+    assert second == first
+    assert len(scans) == 1
+
+    (plugin_package / 'other.py').write_text('EXPERIMENT_TYPE = "other"')
+    third = load_manifest(path, str(plugin_package), 'lazy_plugins')
+    assert len(scans) == 2
+    assert [p['experiment_type'] for p in third['plugins']] == ['demo_game', 'other']
+
+
+def test_entry_point_plugins(plugin_package, monkeypatch):
+    """Test that installed entry points are listed with their distribution."""
+    class Dist:
+        version = '1.2.0'
+        metadata = {'Name': 'umdad-demo'}
+
+    class EntryPoint:
+        name = 'public_goods'
+        value = 'lazy_plugins.goods'
+        dist = Dist()
+
+    (plugin_package / 'goods.py').write_text('def register_blueprint():\n    pass\n')
+    monkeypatch.setattr(manifest, '_entry_points', lambda: [EntryPoint()])
+
+    assert manifest.scan_entry_points() == [{
+        'experiment_type': 'public_goods',
+        'url_prefix': '/public_goods',
+        'module_name': 'lazy_plugins.goods',
+        'version': '1.2.0',
+        'distribution': 'umdad-demo',
+    }]
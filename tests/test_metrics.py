@@ -0,0 +1,135 @@
+"""
+Tests for the request metrics middleware and the /admin/metrics endpoint.
+"""
+
+from flask import g
+
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test that histogram buckets are cumulative and end with +Inf."""
+    registry = Registry()
+    histogram = registry.register(Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1)))
+    histogram.observe(0.05, '/a')
+    histogram.observe(0.5, '/a')
+    histogram.observe(5, '/a')
+
+    text = registry.render()
+
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{route="/a"} 5.55' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+
+
+def test_counter_escapes_label_values():
+    """Test that quotes in label values are escaped."""
+    registry = Registry()
+    counter = registry.register(Counter('requests_total', 'Requests.', ('route',)))
+    counter.inc(2, 'say "hi"')
+
+    assert 'requests_total{route="say \\"hi\\""} 2' in registry.render()
+
+
+def test_instrumented_cursor_counts_queries(app):
+    """Test that queries are added to the request's totals."""
+    from app.db.cursor import _record_query
+
+    with app.test_request_context('/'):
+        _record_query(0.25)
+        _record_query(0.5)
+        assert g.db_queries == 2
+        assert g.db_time == 0.75
+
+
+def test_metrics_requires_admin(client):
+    """Test that the metrics endpoint is admin-protected."""
+    response = client.get('/admin/metrics')
+    assert response.status_code == 302
+    assert '/admin/login' in response.headers['Location']
+
+
+def test_metrics_records_requests(client):
+    """Test that handled requests appear in the exposition."""
+    with client.session_transaction() as sess:
+        sess['admin_id'] = 1
+
+    client.get('/admin/metrics')
+    response = client.get('/admin/metrics')
+    text = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'umdad_http_requests_total{route="/admin/metrics",method="GET",status="200"}' in text
+    assert 'umdad_db_queries_per_request_count{route="/admin/metrics"}' in text
+    assert '# TYPE umdad_db_connections_opened_total counter' in text
+
+
+def test_normalize_sql():
+    """Test that literals, placeholders and value lists are normalized."""
+    from app.db.cursor import normalize_sql
+
+    query = """SELECT id FROM participant_keys
+               WHERE key_value = %s AND status IN ('used', 'revoked') LIMIT 100"""
+
+    assert normalize_sql(query) == 'SELECT id FROM participant_keys WHERE key_value = ? AND status IN (...) LIMIT ?'
+    assert normalize_sql('INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)') == 'INSERT INTO t (a, b) VALUES (...)'
+
+
+def test_query_log_top_and_ring_buffer():
+    """Test that totals cover every query while the buffer keeps the latest."""
+    from app.db.cursor import QueryLog
+
+    log = QueryLog(size=2)
+    log.record('SELECT ?', 1, 0.1, 1)
+    log.record('SELECT ?', 1, 0.3, 1)
+    log.record('UPDATE t SET a = ?', 1, 0.25, 5)
+
+    top = log.top(1)
+    assert top[0]['sql'] == 'SELECT ?'
+    assert top[0]['calls'] == 2
+    assert top[0]['max_time'] == 0.3
+    assert log.top(order_by='mean_time')[0]['sql'] == 'UPDATE t SET a = ?'
+    assert [record.sql for record in log.recent] == ['SELECT ?', 'UPDATE t SET a = ?']
+
+    log.reset()
+    assert log.top() == []
+
+
+def test_query_stats_page(client, monkeypatch):
+    """Test the admin query page in JSON and HTML form."""
+    from app.db.cursor import QueryLog
+
+    log = QueryLog()
+    log.record('SELECT * FROM experiments ORDER BY created_at DESC', 0, 0.5, 10)
+    monkeypatch.setattr('app.admin.admin_routes.query_log', log)
+    with client.session_transaction() as sess:
+        sess['admin_id'] = 1
+
+    data = client.get('/admin/queries?format=json').get_json()
+    assert data['queries'][0]['calls'] == 1
+    assert data['recent'][0]['rows'] == 10
+
+    response = client.get('/admin/queries?order=calls')
+    assert response.status_code == 200
+    assert b'SELECT * FROM experiments ORDER BY created_at DESC' in response.data
+
+
+def test_query_stats_limit_is_at_least_one(client, monkeypatch):
+    """Test that ?n= below 1 shows one query instead of the whole buffer."""
+    from app.db.cursor import QueryLog
+
+    log = QueryLog()
+    for rows in range(5):
+        log.record(f'SELECT * FROM t{rows}', 0, 0.1, rows)
+    monkeypatch.setattr('app.admin.admin_routes.query_log', log)
+    with client.session_transaction() as sess:
+        sess['admin_id'] = 1
+
+    for n in ('0', '-2'):
+        data = client.get(f'/admin/queries?format=json&n={n}').get_json()
+        assert len(data['queries']) == 1
+        assert [record['rows'] for record in data['recent']] == [4]
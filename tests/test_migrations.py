@@ -0,0 +1,65 @@
+"""
+Tests for the schema migration runner.
+
+This module contains tests for migration ordering and version tracking.
+"""
+
+from app.db.migrations import MIGRATIONS, run_migrations
+
+
+class MockCursor:
+    def __init__(self, applied):
+        self.applied = set(applied)
+        self.executed_queries = []
+
+    def execute(self, query, params=None):
+        self.executed_queries.append((query, params))
+        if query.startswith('INSERT INTO schema_migrations'):
+            self.applied.add(params[0])
+
+    def fetchall(self):
+        return [(version,) for version in self.applied]
+
+
+class MockConnection:
+    def __init__(self, applied=()):
+        self.cursor_instance = MockCursor(applied)
+        self.autocommit = True
+        self.commits = 0
+
+    def cursor(self):
+        return self.cursor_instance
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_migration_versions_are_unique_and_ordered():
+    """Test that migration versions are unique and listed in order."""
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_run_migrations_applies_pending():
+    """Test that only migrations not yet recorded are applied."""
+    conn = MockConnection(applied={1})
+    migrations = [
+        (1, 'first', ['CREATE TABLE a (id INTEGER)']),
+        (3, 'third', ['CREATE TABLE c (id INTEGER)']),
+        (2, 'second', ['CREATE TABLE b (id INTEGER)']),
+    ]
+
+    assert run_migrations(conn, migrations) == [2, 3]
+    assert conn.commits == 2
+    assert conn.autocommit is True
+
+    executed = [q for q, _ in conn.cursor_instance.executed_queries]
+    assert 'CREATE TABLE a (id INTEGER)' not in executed
+    assert executed.index('CREATE TABLE b (id INTEGER)') < executed.index('CREATE TABLE c (id INTEGER)')
+
+    # A second run has nothing left to do
+    assert run_migrations(conn, migrations) == []
@@ -0,0 +1,58 @@
+"""
+Tests for the Prisoner's Dilemma demo's vectorized batch engine.
+
+The demo is a flat directory of modules rather than a package, so it is
+added to the end of sys.path (its app.py must not shadow the platform's app
+package). The engine is checked against PDGame playing SimulatedClient.
+"""
+
+import os
+import sys
+
+import pytest
+
+PD_DEMO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pd_demo')
+if PD_DEMO not in sys.path:
+    sys.path.append(PD_DEMO)
+
+from llm_clients import SimulatedClient
+from pd_game import PDGame
+
+# Simulated policies that play like the pd_game strategies
+POLICY_OF_STRATEGY = {
+    'TitForTat': 'tit_for_tat',
+    'AlwaysDefect': 'always_defect',
+    'AlwaysCooperate': 'always_cooperate',
+}
+
+
+@pytest.mark.parametrize('left_name', list(POLICY_OF_STRATEGY))
+def test_play_batch_matches_play_match(left_name):
+    """Test the vectorized engine against PDGame, move by move."""
+    np = pytest.importorskip('numpy')
+    from batch_engine import MOVE_NAMES, play_batch, round_robin
+
+    strategies = list(POLICY_OF_STRATEGY)
+    turns = 12
+    left = np.full(len(strategies), strategies.index(left_name))
+    right = np.arange(len(strategies))
+
+    batch = play_batch(strategies, left, right, turns, keep_history=True)
+
+    game = PDGame(client=SimulatedClient(POLICY_OF_STRATEGY[left_name]))
+    for match, right_name in enumerate(strategies):
+        expected = game.play_match(right_name, turns=turns)
+        history = [
+            (MOVE_NAMES[batch['left_moves'][turn, match]], MOVE_NAMES[batch['right_moves'][turn, match]])
+            for turn in range(turns)
+        ]
+        assert history == expected['history']
+        assert batch['left_scores'][match] == expected['scores']['llm']
+        assert batch['right_scores'][match] == expected['scores']['strategy']
+
+    # Deterministic pairings repeat exactly
+    result = round_robin(strategies, turns=turns, repetitions=3)
+    row = strategies.index(left_name)
+    assert list(result['mean'][row]) == list(batch['left_scores'])
+    assert not result['variance'].any()
+    assert result['rounds'] == len(strategies) ** 2 * 3 * turns
@@ -0,0 +1,197 @@
+"""
+Tests for the Prisoner's Dilemma demo: the strategy interface of pd_game and
+the tournament runner.
+
+The demo is a flat directory of modules rather than a package, so it is
+added to the end of sys.path (its app.py must not shadow the platform's app
+package). Every game here plays against SimulatedClient, so no API key or
+network access is needed.
+"""
+
+import os
+import sys
+import statistics
+import threading
+from collections import Counter, defaultdict
+
+import pytest
+
+PD_DEMO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pd_demo')
+if PD_DEMO not in sys.path:
+    sys.path.append(PD_DEMO)
+
+from llm_clients import SimulatedClient
+from pd_game import STRATEGIES, HistoryView, MoveHistory, PDGame, Strategy
+from tournament import CellStats, MatchResult, MatchSpec, Tournament, summarize, tournament_grid
+
+
+class ConcurrencyTrackingClient(SimulatedClient):
+    """A simulated client that records the most calls in flight per model."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = defaultdict(int)
+        self.max_in_flight = defaultdict(int)
+        self._tracking_lock = threading.Lock()
+
+    def complete(self, model, temperature, system, prompt):
+        with self._tracking_lock:
+            self.in_flight[model] += 1
+            self.max_in_flight[model] = max(self.max_in_flight[model], self.in_flight[model])
+        try:
+            return super().complete(model, temperature, system, prompt)
+        finally:
+            with self._tracking_lock:
+                self.in_flight[model] -= 1
+
+
+class Grudger(Strategy):
+    """A strategy written against the old interface: only get_move(history)."""
+
+    def __init__(self):
+        super().__init__("Grudger")
+        self.seen = []
+
+    def get_move(self, history):
+        self.seen.append(list(history))
+        return 'defect' if 'defect' in history else 'cooperate'
+
+
+def test_legacy_strategy_gets_the_opponent_moves(monkeypatch):
+    """Test that a strategy implementing only get_move(history) sees the LLM's moves so far."""
+    strategies = []
+
+    def make_grudger():
+        strategies.append(Grudger())
+        return strategies[-1]
+
+    monkeypatch.setitem(STRATEGIES, 'Grudger', make_grudger)
+    game = PDGame(client=SimulatedClient('random', seed=3))
+
+    result = game.play_match('Grudger', turns=20)
+
+    llm_moves = [llm for llm, _ in result['history']]
+    assert 'defect' in llm_moves
+    assert strategies[0].seen == [llm_moves[:turn] for turn in range(20)]
+    first_defection = llm_moves.index('defect')
+    assert [move for _, move in result['history']] == (
+        ['cooperate'] * (first_defection + 1) + ['defect'] * (19 - first_defection)
+    )
+
+
+def test_history_view_is_read_only():
+    """Test that strategies get a read-only view of the history, which slices to lists."""
+    history = MoveHistory()
+    for my_move, opp_move in [('cooperate', 'defect'), ('defect', 'defect'), ('defect', 'cooperate')]:
+        history.append(my_move, opp_move)
+
+    view = history.opponent
+    assert isinstance(view, HistoryView)
+    assert len(history) == len(view) == 3
+    assert view == ['defect', 'defect', 'cooperate']
+    assert view[-1] == 'cooperate'
+    assert view[1:] == ['defect', 'cooperate']
+    assert isinstance(view[:2], list)
+    assert history.mine[::2] == ['cooperate', 'defect']
+    with pytest.raises(TypeError):
+        view[0] = 'cooperate'
+    assert not hasattr(view, 'append')
+
+    # The view grows with the match rather than being a copy
+    history.append('cooperate', 'cooperate')
+    assert view[-1] == 'cooperate' and len(view) == 4
+
+
+@pytest.mark.parametrize('my_move, opp_move', [('cooperate', 'maybe'), ('Defect', 'cooperate'), (None, 'defect')])
+def test_move_history_rejects_invalid_moves(my_move, opp_move):
+    """Test that an invalid move raises and leaves the history unchanged."""
+    history = MoveHistory()
+    history.append('cooperate', 'cooperate')
+
+    with pytest.raises(ValueError):
+        history.append(my_move, opp_move)
+    assert len(history) == 1
+    assert history.mine == history.opponent == ['cooperate']
+
+
+@pytest.mark.parametrize('strategy', ['TitForTat', 'AlwaysDefect', 'AlwaysCooperate', 'Grudger'])
+def test_long_match(strategy, monkeypatch):
+    """Smoke test a long match, including a legacy strategy reading the whole history every turn."""
+    monkeypatch.setitem(STRATEGIES, 'Grudger', Grudger)
+    turns = 1000
+
+    result = PDGame(client=SimulatedClient('random', seed=7)).play_match(strategy, turns=turns)
+
+    assert len(result['history']) == turns
+    payoffs = {('cooperate', 'cooperate'): (3, 3), ('defect', 'defect'): (1, 1),
+               ('cooperate', 'defect'): (0, 5), ('defect', 'cooperate'): (5, 0)}
+    expected = [payoffs[moves] for moves in result['history']]
+    assert result['scores'] == {'llm': sum(e[0] for e in expected), 'strategy': sum(e[1] for e in expected)}
+    if strategy == 'TitForTat':
+        assert [move for _, move in result['history'][1:]] == [llm for llm, _ in result['history'][:-1]]
+
+
+def test_tournament_respects_per_model_limit():
+    """Test that no model has more matches in flight than its limit, and that results aggregate per cell."""
+    client = ConcurrencyTrackingClient('tit_for_tat', latency=0.002)
+    specs = tournament_grid(['model-a', 'model-b'], ['TitForTat', 'AlwaysDefect'], turns=(3,), repetitions=3)
+    tournament = Tournament(
+        max_workers=6,
+        per_model_limit={'model-a': 1, 'model-b': 2},
+        game_factory=lambda model, temperature: PDGame(model, temperature, client=client),
+    )
+
+    results = list(tournament.run(specs))
+
+    assert len(results) == len(specs) == 12
+    assert Counter(r.spec for r in results) == Counter(specs)
+    assert client.max_in_flight['model-a'] == 1
+    assert client.max_in_flight['model-b'] <= 2
+
+    stats = summarize(results)
+    assert len(stats) == 4
+    tit_for_tat = stats[('model-a', 0.7, 'TitForTat', 3)]
+    assert tit_for_tat.matches == 3
+    assert tit_for_tat.mean == {'llm': 9, 'strategy': 9}
+    # Cooperate into a defection once, then mutual defection
+    always_defect = stats[('model-b', 0.7, 'AlwaysDefect', 3)].to_dict()
+    assert always_defect['mean'] == {'llm': 2, 'strategy': 7}
+    assert always_defect['variance'] == {'llm': 0, 'strategy': 0}
+
+
+def test_tournament_grid_rejects_unknown_strategies():
+    """Test that a typo in a strategy name fails before any match is played."""
+    with pytest.raises(ValueError):
+        tournament_grid(['model'], ['TitForTwoTats'])
+
+
+def test_tournament_logs_failed_matches(caplog):
+    """Test that a failing match is logged and returned as an error result."""
+    def broken_game(model, temperature):
+        raise RuntimeError('no client')
+
+    tournament = Tournament(max_workers=1, game_factory=broken_game)
+    spec = MatchSpec('model', 0.7, 'TitForTat', 3)
+
+    with caplog.at_level('ERROR', logger='tournament'):
+        result = tournament.play(spec)
+
+    assert result.error == 'no client'
+    assert f'Error playing {spec}: no client' in caplog.text
+
+
+def test_cell_stats_match_the_sample_mean_and_variance():
+    """Test the running (Welford) aggregate against the statistics module."""
+    spec = MatchSpec('model', 0.7, 'TitForTat', 10)
+    scores = [(27, 32), (30, 30), (14, 39), (22, 27)]
+    cell = CellStats()
+    for llm, strategy in scores:
+        cell.add(MatchResult(spec, {'llm': llm, 'strategy': strategy}))
+    cell.add(MatchResult(spec, error='timeout'))
+
+    assert (cell.matches, cell.errors) == (4, 1)
+    for player, column in (('llm', 0), ('strategy', 1)):
+        values = [score[column] for score in scores]
+        assert cell.mean[player] == pytest.approx(statistics.mean(values))
+        assert cell.variance(player) == pytest.approx(statistics.variance(values))
+    assert CellStats().variance('llm') == 0.0
@@ -0,0 +1,48 @@
+"""
+Tests for the Prisoner's Dilemma demo's simulated LLM backend.
+
+The demo is a flat directory of modules rather than a package, so it is
+added to the end of sys.path (its app.py must not shadow the platform's app
+package).
+"""
+
+import os
+import sys
+
+import pytest
+
+PD_DEMO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pd_demo')
+if PD_DEMO not in sys.path:
+    sys.path.append(PD_DEMO)
+
+from llm_clients import SimulatedClient, SimulatedError
+from pd_game import PDGame
+
+
+def test_simulated_client_parses_prompt_history():
+    """Test that the simulated backend sees exactly the rounds in the prompt."""
+    game = PDGame(client=SimulatedClient())
+    history = [('cooperate', 'cooperate'), ('defect', 'cooperate'), ('cooperate', 'defect'),
+               ('defect', 'defect'), ('cooperate', 'cooperate'), ('cooperate', 'defect'),
+               ('defect', 'cooperate')]
+
+    assert SimulatedClient.parse_history(game.build_prompt([])) == []
+    assert SimulatedClient.parse_history(game.build_prompt(history)) == history[-5:]
+
+    # tit_for_tat answers with the opponent's last move shown
+    assert game.get_llm_move(history) == 'cooperate'
+    assert game.get_llm_move(history[:-1]) == 'defect'
+    assert game.get_llm_move([]) == 'cooperate'
+
+
+def test_simulated_client_injects_errors():
+    """Test that injected errors are raised and counted, and games fall back to cooperating."""
+    client = SimulatedClient('always_defect', error_rate=1.0, seed=1)
+
+    with pytest.raises(SimulatedError):
+        client.complete('model', 0.7, PDGame.SYSTEM_PROMPT, 'prompt')
+    assert PDGame(client=client).get_llm_move([]) == 'cooperate'
+    assert (client.calls, client.errors) == (2, 2)
+
+    with pytest.raises(ValueError):
+        SimulatedClient('no_such_policy')
@@ -0,0 +1,59 @@
+"""
+Tests for the Prisoner's Dilemma demo's LLM move cache.
+
+The demo is a flat directory of modules rather than a package, so it is
+added to the end of sys.path (its app.py must not shadow the platform's app
+package). Games play against SimulatedClient, so no API key is needed.
+"""
+
+import os
+import sys
+
+PD_DEMO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pd_demo')
+if PD_DEMO not in sys.path:
+    sys.path.append(PD_DEMO)
+
+from llm_clients import SimulatedClient
+from move_cache import MoveCache
+from pd_game import PDGame
+
+
+def test_move_cache_round_trip(tmp_path):
+    """Test that moves persist across cache instances and are reused per temperature."""
+    path = str(tmp_path / 'moves.db')
+    cache = MoveCache(path, min_samples=3, seed=1)
+
+    # Temperature 0: one observation is enough
+    assert cache.get('model', 0, 'prompt') is None
+    cache.record('model', 0, 'prompt', 'defect')
+    assert cache.get('model', 0, 'prompt') == 'defect'
+
+    # Above 0: sampled once min_samples answers were seen
+    for move in ('cooperate', 'cooperate'):
+        cache.record('model', 0.7, 'prompt', move)
+    assert cache.get('model', 0.7, 'prompt') is None
+    cache.record('model', 0.7, 'prompt', 'defect')
+    cache.record('model', 0.7, 'prompt', 'maybe')  # not a move, ignored
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+    reopened = MoveCache(path, min_samples=3, seed=2)
+    assert reopened.get('model', 0, 'prompt') == 'defect'
+    assert reopened.get('model', 0.0, 'other prompt') is None
+    sampled = {reopened.get('model', 0.7, 'prompt') for _ in range(200)}
+    assert sampled == {'cooperate', 'defect'}
+    reopened.close()
+
+
+def test_cached_game_skips_repeated_prompts():
+    """Test that a second match with the same prompts makes no LLM calls."""
+    client = SimulatedClient('tit_for_tat')
+    game = PDGame('model', 0, cache=MoveCache(), client=client)
+
+    first = game.play_match('AlwaysDefect', turns=6)
+    calls = client.calls
+    second = game.play_match('AlwaysDefect', turns=6)
+
+    assert calls == 6
+    assert client.calls == calls
+    assert second == first
@@ -0,0 +1,50 @@
+"""
+Tests for the multi-process server configuration.
+"""
+
+import pytest
+
+pytest.importorskip('gunicorn')
+
+from app import server
+
+
+def test_server_config(app):
+    """Test that the app is preloaded and threads select the threaded worker."""
+    platform = server.PlatformServer(app, {'bind': '127.0.0.1:0', 'workers': 3, 'threads': 4,
+                                           'max_requests': 500, 'max_requests_jitter': 50})
+
+    assert platform.load() is app
+    assert platform.cfg.preload_app is True
+    assert platform.cfg.workers == 3
+    assert platform.cfg.worker_class_str == 'gthread'
+    assert platform.cfg.max_requests == 500
+    assert platform.cfg.post_fork is server.post_fork
+
+
+def test_post_fork_replaces_inherited_pool(monkeypatch):
+    """Test that a forked worker drops the master's pool and opens its own."""
+    from app.db import pool
+
+    class InheritedPool:
+        pid = -1
+        closed = False
+
+        def closeall(self):
+            raise AssertionError('the master owns these connections')
+
+    warmed, refreshers = [], []
+    monkeypatch.setattr(pool, '_pool', InheritedPool())
+    monkeypatch.setattr('app.db.warm_pool', lambda: warmed.append(True))
+    monkeypatch.setattr('app.auth.key_filter.start_key_filter_refresher', lambda: refreshers.append(True))
+    logs = []
+    monkeypatch.setattr('app.storage.decision_log.start_decision_log', logs.append)
+    storage = object()
+    platform = type('Platform', (), {'application': type('App', (), {'extensions': {'storage': storage}})})
+
+    server.post_fork(None, type('Worker', (), {'pid': 1, 'app': platform})())
+
+    assert pool._pool is None
+    assert warmed == [True]
+    assert refreshers == [True]
+    assert logs == [storage]
@@ -0,0 +1,195 @@
+"""
+Tests for the server-side session interface.
+"""
+
+import pytest
+from flask import session
+
+from app.app import create_app
+from app.sessions import ServerSessionInterface
+
+
+@pytest.fixture
+def server_app(tmp_path):
+    """An app with server-side sessions on an embedded SQLite database."""
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test-key',
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp_path / 'sessions.db'),
+        'SESSION_BACKEND': 'server',
+        'EXPERIMENT_MANIFEST': str(tmp_path / 'plugins.json'),
+    })
+
+    @app.route('/test/round', methods=['POST'])
+    def play_round():
+        data = session.setdefault('experiment_data', {'rounds_data': []})
+        data['rounds_data'].append({'decision': 'cooperate'})
+        session['round'] = len(data['rounds_data'])
+        return str(session['round'])
+
+    @app.route('/test/round')
+    def current_round():
+        return str(session.get('round'))
+
+    @app.route('/test/login', methods=['POST'])
+    def login():
+        session['participant_id'] = 7
+        return ''
+
+    @app.route('/test/clear', methods=['POST'])
+    def clear():
+        session.clear()
+        return ''
+
+    yield app
+    app.extensions['storage'].close()
+
+
+@pytest.fixture
+def saves(server_app, monkeypatch):
+    """Session IDs written to storage, in order."""
+    storage = server_app.extensions['storage']
+    calls = []
+    save = storage.save_participant_session
+
+    def recording_save(session_id, data, generation, expires_at):
+        calls.append((session_id, generation))
+        return save(session_id, data, generation, expires_at)
+
+    monkeypatch.setattr(storage, 'save_participant_session', recording_save)
+    return calls
+
+
+def test_cookie_holds_only_an_id(server_app, saves):
+    """Test that session data is stored server-side behind an opaque cookie."""
+    client = server_app.test_client()
+    for _ in range(50):
+        client.post('/test/round')
+
+    cookie = client.get_cookie('session').value
+    sid, generation = cookie.split('.')
+    assert generation == '50'
+    assert len(cookie) < 64
+    stored = server_app.extensions['storage'].load_participant_session(sid)
+    assert stored['generation'] == 50
+    assert stored['data'].count('cooperate') == 50
+
+
+def test_unchanged_session_is_not_written(server_app, saves):
+    """Test that reading a session never writes it back."""
+    client = server_app.test_client()
+    client.post('/test/round')
+
+    response = client.get('/test/round')
+
+    assert response.data == b'1'
+    assert len(saves) == 1
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_stale_worker_cache_is_not_served(server_app, saves):
+    """Test that a worker reloads a session another worker has changed."""
+    client = server_app.test_client()
+    worker_a = server_app.session_interface
+    worker_b = ServerSessionInterface()
+
+    client.post('/test/round')
+    assert client.get('/test/round').data == b'1'
+
+    server_app.session_interface = worker_b
+    client.post('/test/round')
+
+    server_app.session_interface = worker_a
+    assert client.get('/test/round').data == b'2'
+
+
+def test_cleared_session_is_deleted(server_app):
+    """Test that clearing the session deletes it and its cookie."""
+    client = server_app.test_client()
+    client.post('/test/round')
+    sid = client.get_cookie('session').value.split('.')[0]
+
+    client.post('/test/clear')
+
+    assert client.get_cookie('session') is None
+    assert server_app.extensions['storage'].load_participant_session(sid) is None
+
+
+def test_unknown_cookie_starts_a_new_session(server_app):
+    """Test that forged or expired session IDs are ignored."""
+    client = server_app.test_client()
+    client.set_cookie('session', 'no-such-session.3')
+
+    assert client.get('/test/round').data == b'None'
+
+
+def test_session_id_rotates_when_identity_changes(server_app):
+    """Test that a session gets a new ID, and the old one dies, on key redemption."""
+    client = server_app.test_client()
+    client.post('/test/round')
+    planted = client.get_cookie('session').value
+    old_sid = planted.split('.')[0]
+
+    client.post('/test/login')
+
+    new_sid = client.get_cookie('session').value.split('.')[0]
+    assert new_sid != old_sid
+    assert server_app.extensions['storage'].load_participant_session(old_sid) is None
+
+    # Another browser holding the planted cookie gets nothing of the participant's
+    attacker = server_app.test_client()
+    attacker.set_cookie('session', planted)
+    assert attacker.get('/test/round').data == b'None'
+
+    # Writes that keep the identity keep the ID
+    client.post('/test/round')
+    assert client.get_cookie('session').value.split('.')[0] == new_sid
+
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_stale_cookie_loads_the_stored_session(server_app, cached):
+    """Test that a cookie behind storage (a second tab, a lost response) keeps the participant logged in."""
+    client = server_app.test_client()
+    client.post('/test/round')
+    stale = client.get_cookie('session').value
+    sid = stale.split('.')[0]
+    client.post('/test/round')
+
+    other_tab = server_app.test_client()
+    other_tab.set_cookie('session', stale)
+    if not cached:
+        server_app.session_interface.cache.discard(sid)
+
+    assert other_tab.get('/test/round').data == b'2'
+    assert other_tab.get_cookie('session').value == f'{sid}.2'
+
+    # A write from the stale tab builds on the stored generation
+    assert other_tab.post('/test/round').data == b'3'
+    assert client.get('/test/round').data == b'3'
+
+
+def test_concurrent_write_does_not_overwrite(server_app, monkeypatch):
+    """Test that of two requests that loaded the same generation, only the first write lands."""
+    client = server_app.test_client()
+    client.post('/test/round')
+    cookie = client.get_cookie('session').value
+    sid = cookie.split('.')[0]
+    storage = server_app.extensions['storage']
+    save = storage.save_participant_session
+
+    # Another request saves the session while this one is handling its round
+    def racing_save(session_id, data, generation, expires_at):
+        monkeypatch.setattr(storage, 'save_participant_session', save)
+        stored = storage.load_participant_session(session_id)
+        assert save(session_id, stored['data'], generation, expires_at)
+        return save(session_id, data, generation, expires_at)
+
+    monkeypatch.setattr(storage, 'save_participant_session', racing_save)
+    response = client.post('/test/round')
+
+    assert 'Set-Cookie' not in response.headers
+    assert storage.load_participant_session(sid)['generation'] == 2
+    # The concurrent write stands: still one round
+    assert client.get('/test/round').data == b'1'
+    assert client.get_cookie('session').value == f'{sid}.2'
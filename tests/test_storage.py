@@ -0,0 +1,283 @@
+"""
+Tests for the storage backends.
+
+Every test runs against each backend: the embedded SQLite backend always,
+and the PostgreSQL backend when TEST_DB_HOST points at a test database
+(TEST_DB_NAME, TEST_DB_USER and TEST_DB_PASSWORD configure the rest).
+"""
+
+import os
+import threading
+
+import pytest
+
+from app.storage import PostgresStorage, SQLiteStorage, create_storage
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def storage(request, tmp_path):
+    """A storage backend with an empty schema."""
+    if request.param == 'sqlite':
+        backend = SQLiteStorage(str(tmp_path / 'test.db'))
+    else:
+        if not os.getenv('TEST_DB_HOST'):
+            pytest.skip('TEST_DB_HOST not set')
+        from app.db import pool
+        pool.close_pool()
+        pool._settings.update(
+            host=os.getenv('TEST_DB_HOST'),
+            database=os.getenv('TEST_DB_NAME', 'test_experiment_db'),
+            user=os.getenv('TEST_DB_USER', 'test_user'),
+            password=os.getenv('TEST_DB_PASSWORD', 'test_password'),
+        )
+        backend = PostgresStorage()
+
+    backend.init_schema()
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def experiment_id(storage):
+    """An experiment to attach keys and participants to."""
+    return storage.create_experiment('prisoners_dilemma', 'Test experiment', parameters={'rounds': 3})
+
+
+def test_create_storage_rejects_unknown_backend():
+    """Test that an unknown backend name is an error."""
+    with pytest.raises(ValueError):
+        create_storage('mysql')
+
+
+def test_experiment_roundtrip(storage, experiment_id):
+    """Test that experiments are stored and read back."""
+    experiment = storage.get_experiment(experiment_id)
+
+    assert experiment['type'] == 'prisoners_dilemma'
+    assert experiment['parameters'] == {'rounds': 3}
+    assert storage.get_experiment(experiment_id + 1000) is None
+
+
+def test_create_keys(storage, experiment_id):
+    """Test bulk key creation and listing."""
+    progress = []
+    keys = storage.create_keys(experiment_id, 25, batch_size=10,
+                               progress=lambda done, total: progress.append(done))
+
+    assert len(set(keys)) == 25
+    assert progress == [10, 20, 25]
+    assert sorted(k['key'] for k in storage.get_keys(experiment_id)) == sorted(keys)
+    assert storage.get_key_status_counts(experiment_id) == {
+        'unused': 25, 'used': 0, 'revoked': 0, 'total': 25
+    }
+
+
+def test_create_keys_adds_to_key_filter(storage, experiment_id, monkeypatch):
+    """Test that created keys are added to the key filter on every backend."""
+    from app.auth import key_manager
+    added = []
+    monkeypatch.setattr(key_manager.key_filter, 'add_keys', added.extend)
+
+    keys = storage.create_keys(experiment_id, 7, batch_size=3)
+    assert sorted(added) == sorted(keys)
+
+
+def test_key_values_stream_in_id_order(storage, experiment_id):
+    """Test the key counts and chunks the key filter is built from."""
+    keys = storage.create_keys(experiment_id, 7, batch_size=3)
+    ids = [k['id'] for k in storage.get_keys(experiment_id)]
+
+    assert storage.count_keys() == (7, ids[-1])
+    assert storage.count_keys(ids[-1]) == (0, None)
+    chunks = list(storage.iter_key_values(0, 3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    rows = [row for chunk in chunks for row in chunk]
+    assert [key_id for key_id, _ in rows] == ids
+    assert sorted(key for _, key in rows) == sorted(keys)
+    assert list(storage.iter_key_values(ids[-1], 3)) == []
+
+
+def test_redeem_key_consults_key_filter(storage, experiment_id, monkeypatch):
+    """Test that every backend rejects a key the key filter rules out."""
+    from app.auth import key_filter
+    key = storage.create_keys(experiment_id, 1)[0]
+    monkeypatch.setattr(key_filter, 'KEY_FILTER_ENABLED', True)
+    monkeypatch.setattr(key_filter.key_filter, 'might_contain', lambda key: False)
+
+    assert storage.redeem_key(key) is None
+    assert storage.get_key_status_counts(experiment_id)['unused'] == 1
+
+
+def test_get_keys_pagination(storage, experiment_id):
+    """Test keyset pagination and status filtering."""
+    storage.create_keys(experiment_id, 5)
+    first_page = storage.get_keys(experiment_id, limit=3)
+    second_page = storage.get_keys(experiment_id, after_id=first_page[-1]['id'], limit=3)
+
+    assert len(first_page) == 3
+    assert len(second_page) == 2
+    assert first_page[-1]['id'] < second_page[0]['id']
+
+    assert storage.revoke_key(first_page[0]['key'])
+    revoked = storage.get_keys(experiment_id, status='revoked')
+    assert [k['key'] for k in revoked] == [first_page[0]['key']]
+    assert revoked[0]['revoked_at'] is not None
+    assert first_page[1]['revoked_at'] is None
+
+
+def test_redeem_key(storage, experiment_id):
+    """Test that a key can be redeemed exactly once."""
+    key = storage.create_keys(experiment_id, 1)[0]
+
+    redemption = storage.redeem_key(key)
+    assert redemption['experiment_id'] == experiment_id
+    assert redemption['experiment_type'] == 'prisoners_dilemma'
+    assert redemption['participant_id'] is not None
+
+    participant = storage.get_participant(redemption['participant_id'])
+    assert participant['experiment_id'] == experiment_id
+    assert participant['completed_at'] is None
+
+    again = storage.redeem_key(key)
+    assert again['participant_id'] is None
+    assert again['status'] == 'used'
+
+    assert storage.redeem_key('no-such-key') is None
+
+
+def test_redeem_key_concurrently(storage, experiment_id):
+    """Test that concurrent redemptions of one key create one participant."""
+    key = storage.create_keys(experiment_id, 1)[0]
+    results = []
+
+    def redeem():
+        results.append(storage.redeem_key(key))
+
+    threads = [threading.Thread(target=redeem) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(r['participant_id'] is not None for r in results) == 1
+
+
+def test_sessions_and_results(storage, experiment_id):
+    """Test experiment sessions, completion and results."""
+    key = storage.create_keys(experiment_id, 1)[0]
+    participant_id = storage.redeem_key(key)['participant_id']
+
+    session_id = storage.start_session(participant_id, experiment_id, {'round': 1})
+    assert storage.update_session(session_id, {'round': 2})
+    assert storage.get_session(session_id)['data'] == {'round': 2}
+
+    assert storage.complete_session(session_id)
+    assert storage.complete_participant(participant_id)
+    assert storage.get_session(session_id)['completed_at'] is not None
+    assert storage.get_participant(participant_id)['completed_at'] is not None
+
+    storage.record_result(participant_id, experiment_id, {'score': 9}, session_id)
+    results = storage.get_results(experiment_id)
+    assert [r['result_data'] for r in results] == [{'score': 9}]
+
+
+def test_session_rounds(storage, experiment_id):
+    """Test that round rows are rebuilt into the session document."""
+    key = storage.create_keys(experiment_id, 1)[0]
+    participant_id = storage.redeem_key(key)['participant_id']
+    session_id = storage.start_session(participant_id, experiment_id, {'round': 0})
+
+    storage.record_session_round(session_id, 2, {'choice': 'defect'})
+    storage.record_session_round(session_id, 1, {'choice': 'cooperate'})
+    assert storage.get_session(session_id)['data'] == {
+        'round': 0,
+        'rounds_data': [{'choice': 'cooperate'}, {'choice': 'defect'}],
+    }
+
+    # A whole document replaces the round rows
+    assert storage.update_session(session_id, {'round': 1, 'rounds_data': [{'choice': 'defect'}]})
+    assert storage.get_session(session_id)['data'] == {'round': 1, 'rounds_data': [{'choice': 'defect'}]}
+    assert not storage.update_session(session_id + 1, {'rounds_data': []})
+
+
+def test_participant_sessions(storage):
+    """Test storing, replacing, expiring and deleting participant sessions."""
+    from datetime import datetime, timedelta
+
+    expires_at = datetime.now() + timedelta(hours=1)
+    assert storage.save_participant_session('sid-1', '{"round": 1}', 1, expires_at)
+    assert storage.save_participant_session('sid-1', '{"round": 2}', 2, expires_at)
+    assert storage.save_participant_session('sid-2', '{}', 1, datetime.now() - timedelta(seconds=1))
+
+    # A second write from generation 1 lost the race and is not applied
+    assert not storage.save_participant_session('sid-1', '{"round": 3}', 2, expires_at)
+
+    stored = storage.load_participant_session('sid-1')
+    assert stored['data'] == '{"round": 2}'
+    assert stored['generation'] == 2
+    assert storage.load_participant_session('sid-2') is None
+
+    assert storage.purge_expired_sessions() == 1
+    assert storage.delete_participant_session('sid-1')
+    assert storage.load_participant_session('sid-1') is None
+
+
+def test_record_decisions_is_idempotent(storage, experiment_id):
+    """Test that decisions already stored are skipped when replayed."""
+    import uuid
+    from datetime import datetime
+
+    key = storage.create_keys(experiment_id, 1)[0]
+    participant_id = storage.redeem_key(key)['participant_id']
+    decisions = [
+        {
+            'uid': str(uuid.uuid4()),
+            'participant_id': participant_id,
+            'experiment_id': experiment_id,
+            'round_number': round_number,
+            'decision': decision,
+            'metadata': {'opponent': 'cooperate'} if round_number == 1 else None,
+            'created_at': datetime.now().isoformat(),
+        }
+        for round_number, decision in [(1, 'cooperate'), (2, 'defect')]
+    ]
+
+    assert storage.record_decisions(decisions) == 2
+    assert storage.record_decisions(decisions) == 0
+
+    stored = storage.get_decisions(participant_id)
+    assert [(d['round_number'], d['decision']) for d in stored] == [(1, 'cooperate'), (2, 'defect')]
+    assert stored[0]['metadata'] == {'opponent': 'cooperate'}
+
+
+def test_decision_counts(storage, experiment_id):
+    """Test per-round decision counts and rejection of unknown decisions."""
+    import uuid
+    from datetime import datetime
+
+    def decision(participant_id, round_number, choice):
+        return {
+            'uid': str(uuid.uuid4()),
+            'participant_id': participant_id,
+            'experiment_id': experiment_id,
+            'round_number': round_number,
+            'decision': choice,
+            'metadata': None,
+            'created_at': datetime.now().isoformat(),
+        }
+
+    keys = storage.create_keys(experiment_id, 2)
+    first, second = (storage.redeem_key(key)['participant_id'] for key in keys)
+    storage.record_decisions([
+        decision(first, 1, 'cooperate'),
+        decision(second, 1, 'defect'),
+        decision(first, 2, 'defect'),
+        decision(second, 2, 'defect'),
+    ])
+
+    assert storage.get_decision_counts(experiment_id) == {
+        1: {'cooperate': 1, 'defect': 1},
+        2: {'cooperate': 0, 'defect': 2},
+    }
+    with pytest.raises(ValueError):
+        storage.record_decisions([decision(first, 3, 'abstain')])